@@ -1,26 +1,33 @@
-import traceback
-from collections import defaultdict
-from itertools import islice
+import time
+from collections import defaultdict, Counter
+from itertools import islice, groupby
 from pathlib import Path
+from queue import Queue
 
-import pandas as pd
-from pygount import SourceAnalysis
-from django.db.models import Max, F
+from django.conf import settings
+from django.db.models import Max, Min, F, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.timezone import make_aware, is_aware
 from pygount.analysis import SourceState
 
-from analytics.blames import calc_total_blame, update_blame_object
+from analytics.blames import calc_blame_loc, update_blame_statistics
 from analytics.bulk import BulkCreateManager, BulkUpdateManager
 from authentication.models import User
-from commits.models import Commit, CommitBlame
+from commits.models import Commit, CommitBlame, BranchCommit, BranchOwnership
 from developers.models import Developer, Blame
-from files.models import File, FilePath, FileChange, FileBlame, FileKnowledge
+from files.models import File, FilePath, FileChange, FileBlame, FileKnowledge, FileCoupling
+from git_interface.gitblame import BlameService
 from git_interface.gitobjects import GitRepository
-from analytics.complexity import calculate_complexity_in
+from git_interface.gitpaths import PathFilter
+from analytics.metrics import measure_file, measure_files, create_metrics_executor, close_readers, ERROR_STATE, \
+    SKIPPED_STATE
+from analytics.metrics_cache import MetricsCache
+from analytics.coupling import CoChangeMatrix
+from analytics.ownership import LineOwnership, OwnershipMatrix, OwnershipState
+from analytics.pipeline import Producer, Consumer, StageCounter, END, drain, timed_put
 from repos.models import Repository, Branch
 import logging
 
-from tools.encoding import detect_encoding
 
 _log_pygount = logging.getLogger('pygount')
 _log_pygount.disabled = True
@@ -37,11 +44,73 @@ def process_repo_objects(repo: Repository):
     analyzer.process()
 
 
+def update_repo_objects(repo: Repository):
+    logger.info("updating repo: {}".format(repo))
+    analyzer = RepoAnalyzer(repo)
+    analyzer.update()
+
+
+def start_repo_analysis(repo: Repository, fetch=False):
+    """mark a repository as being analyzed, :return the names of the branches to analyze"""
+    analyzer = RepoAnalyzer(repo)
+    if fetch:
+        analyzer.git_repo.fetch()
+    return analyzer.start()
+
+
+def analyze_repo_branch(repo: Repository, branch_name: str, update=False):
+    """analyze a single branch, branches of the same repository don't share state so they can run in parallel"""
+    logger.info("{} branch {} of repo: {}".format('updating' if update else 'processing', branch_name, repo))
+    analyzer = RepoAnalyzer(repo)
+    try:
+        if update:
+            analyzer.update_branch(branch_name)
+        else:
+            analyzer.process_branch(branch_name)
+    finally:
+        close_readers()
+
+
+def partition_repo_branch(repo: Repository, branch_name: str):
+    """prepare the analysis of a long branch by many workers
+
+    :return (head, ranges) with the (skip, max_count) of every range of commits to ingest,
+    None if the branch doesn't exist or its history is short enough for a single worker
+    """
+    analyzer = RepoAnalyzer(repo)
+    try:
+        return analyzer.partition_branch(branch_name, settings.CODICE_PARTITION_COMMITS)
+    finally:
+        close_readers()
+
+
+def ingest_repo_range(repo: Repository, branch_name: str, head: str, skip: int, max_count: int):
+    """create the commits and file changes of a range of the history of a partitioned branch"""
+    logger.info("ingesting commits {}-{} of branch {} of repo: {}".format(skip, skip + max_count, branch_name, repo))
+    RepoAnalyzer(repo).ingest_range(branch_name, head, skip, max_count)
+
+
+def merge_repo_branch(repo: Repository, branch_name: str, head: str):
+    """finish a partitioned branch once all of its ranges are ingested"""
+    logger.info("merging branch {} of repo: {}".format(branch_name, repo))
+    RepoAnalyzer(repo).merge_branch(branch_name, head)
+
+
+def in_chunks(iterable, size):
+    """:return the items of iterable in lists of at most size items"""
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
 BULK_SIZE = 500
 
+COMMIT_CHUNK_SIZE = 1000
+
+FILE_METRIC_FIELDS = ['language', 'code', 'doc', 'blanks', 'empty', 'strings', 'binary', 'exists', 'is_code',
+                      'indent_complexity', 'lines']
+
 
 class RepoAnalyzer(object):
-    count_change_status = 0
 
     def __init__(self, repo: Repository):
         self.repo: Repository = repo
@@ -49,268 +118,768 @@ class RepoAnalyzer(object):
         self.filepath_cache = dict()
         self.file_cache = dict()
         self.git_repo = GitRepository(self.repo.base_directory)
+        self.blame_service = BlameService(self.repo.base_directory, settings.CODICE_BLAME_WORKERS)
         self.developer_cache = dict()
-        self.count_change_status = 0
-        self.dict_change_status = dict()
-
-        rbts = self.repo.branches_to_track.strip()
-        if rbts == '':
-            self.remote_branches_to_track = [self.repo.default_branch if self.repo.default_branch else 'master']
-        else:
-            self.remote_branches_to_track = rbts.replace(';', ',').replace(' ', ',').split(',')
+        self.principals = None
+        self.changed_files = set()
+        self.stale_files = set()
+        # commits of previous runs whose blames were dropped by an update
+        self.unblamed_commits = set()
+        self.file_metrics = dict()
+        self.metrics_cache = None
+        self.head = None
+        self.tree_dirs = set()
+
+        self.remote_branches_to_track = self.repo.get_branches_to_track()
+        # the analysis window, as git log options
+        self.since = self.repo.analysis_since.isoformat() if self.repo.analysis_since else None
+        self.max_commits = self.repo.analysis_max_commits or None
 
         self.current_branch = self.repo.default_branch
 
-    def process(self):
+    def start(self):
+        """:return the branches to analyze"""
         self.repo.status = Repository.Status.ANALYZING
+        if self.repo.default_branch == '' and self.remote_branches_to_track:
+            self.repo.default_branch = self.remote_branches_to_track[0]
         self.repo.save()
-        self.file_cache = dict()
-        self.dict_change_status = dict()
-        for branch in self.remote_branches_to_track:
-            if self.repo.default_branch == '':
-                self.repo.default_branch = branch
-                self.repo.save()
+        return self.remote_branches_to_track
 
+    def process(self):
+        self.file_cache = dict()
+        for branch in self.start():
             self.process_branch(branch)
+        close_readers()
 
-        if self.repo.default_branch > '':
-            self.git_repo.checkout(self.repo.default_branch)
+    def update(self):
+        """fetch the remote and analyze only the commits added since the last run of each branch"""
+        self.file_cache = dict()
+        self.git_repo.fetch()
+        for branch in self.start():
+            self.update_branch(branch)
+        close_readers()
 
     def process_branch(self, branch_name: str):
-        logger.info("CHECKOUT BRANCH {}".format(branch_name))
-        if not self.git_repo.checkout(branch_name):
+        logger.info("BRANCH {}".format(branch_name))
+        ref = self.git_repo.resolve_branch(branch_name)
+        if ref is None:
             return None
 
         branch, created = Branch.objects.get_or_create(name=branch_name, repository=self.repo)
         logger.info('BRANCH %s CREATED: %s', branch_name, created)
 
+        self.changed_files = set()
+        self.stale_files = set()
+        self.start_tree(ref)
         self.create_commits(branch)
+        self.process_history(branch)
+        return branch
+
+    def update_branch(self, branch_name: str):
+        logger.info("UPDATE BRANCH {}".format(branch_name))
+        branch = Branch.objects.filter(name=branch_name, repository=self.repo).first()
+        if branch is None:
+            return self.process_branch(branch_name)
+        if branch.last_commit == '':
+            # a previous analysis died partway, its rows are dropped instead of being added to again
+            logger.info('BRANCH %s ANALYSIS UNFINISHED, FULL ANALYSIS', branch_name)
+            return self.reset_branch(branch)
+
+        ref = self.git_repo.resolve_branch(branch_name)
+        if ref is None:
+            return None
+
+        if branch.window != self.repo.get_analysis_window() or branch.path_rules != self.repo.get_path_rules():
+            logger.info('BRANCH %s ANALYSIS WINDOW OR PATH RULES CHANGED, FULL ANALYSIS', branch_name)
+            return self.reset_branch(branch)
+
+        head = self.git_repo.head_commit(ref)
+        if head == branch.last_commit:
+            logger.info('BRANCH %s UP TO DATE', branch_name)
+            return branch
+
+        if not self.git_repo.is_ancestor(branch.last_commit, head):
+            logger.info('BRANCH %s HISTORY REWRITTEN, FULL ANALYSIS', branch_name)
+            return self.reset_branch(branch)
+
+        self.load_branch_cache(branch)
+        self.start_tree(ref)
+        new_commits = self.create_commits(branch, since=branch.last_commit)
+        self.refresh_files(branch, self.changed_files & self.stale_files)
+        self.process_history(branch, new_commits)
+        return branch
+
+    def reset_branch(self, branch: Branch):
+        """delete the analysis of a branch and analyze it again"""
+        commit_ids = list(branch.commits.values_list('id', flat=True))
+        branch.delete()
+        # commits stay stored while another branch still has them
+        Commit.objects.filter(id__in=commit_ids, branches=None).delete()
+        return self.process_branch(branch.name)
+
+    def partition_branch(self, branch_name: str, size: int):
+        """create the branch and every file of its history, :return (head, ranges) of commits to ingest"""
+        if size <= 0:
+            return None
+        ref = self.git_repo.resolve_branch(branch_name)
+        if ref is None:
+            return None
+        head = self.git_repo.head_commit(ref)
+        count = self.git_repo.count_commits(head, since=self.since)
+        if self.max_commits is not None:
+            count = min(count, self.max_commits)
+        if count <= size:
+            return None
+
+        branch, created = Branch.objects.get_or_create(name=branch_name, repository=self.repo)
+        logger.info('BRANCH %s CREATED: %s, %s COMMITS IN RANGES OF %s', branch_name, created, count, size)
+        self.start_tree(ref)
+        self.create_history_files(branch)
+        return head, [(skip, min(size, count - skip)) for skip in range(0, count, size)]
+
+    def create_history_files(self, branch: Branch):
+        """create the files changed by any commit of the branch, so the ranges don't race to create them"""
+        logger.info("BEGIN HISTORY FILES")
+        filenames = dict()
+        for commit in self.git_repo.log(self.head, max_count=self.max_commits, numstat=False, since=self.since):
+            if self.has_too_many_files(commit):
+                continue
+            for fn in commit.files.keys():
+                filenames[fn] = None
+        self.create_filepaths(branch, filenames.keys())
+        self.measure_uncached(filenames.keys())
+        with BulkCreateManager(File) as bulk:
+            for fn in filenames.keys():
+                file, created = self.create_file(fn, branch)
+                bulk.add(file)
+        logger.info("END HISTORY FILES")
+
+    def ingest_range(self, branch_name: str, head: str, skip: int, max_count: int):
+        """create the commits of a range of the history, the files were created by partition_branch
+
+        File.changes is left to merge_branch, so ranges never update the same rows
+        """
+        branch = Branch.objects.get(name=branch_name, repository=self.repo)
+        self.set_head(head)
+        self.load_branch_cache(branch)
+        logger.info('BEGIN COMMIT RANGE %s-%s', skip, skip + max_count)
+        history = self.git_repo.log(head, skip=skip, max_count=max_count, since=self.since)
+        for git_commits in in_chunks(history, COMMIT_CHUNK_SIZE):
+            commit_dict = self.create_commit_dict(git_commits)
+            self.save_commits(commit_dict.values(), branch)
+            self.file_change_creation(commit_dict, branch)
+        logger.info('END COMMIT RANGE %s-%s', skip, skip + max_count)
+
+    def merge_branch(self, branch_name: str, head: str):
+        """count the changes of every file and compute the history of a branch ingested by ranges"""
+        logger.info("MERGE BRANCH {}".format(branch_name))
+        branch = Branch.objects.get(name=branch_name, repository=self.repo)
+        self.set_head(head)
+        changes = FileChange.objects.filter(file=OuterRef('pk')).order_by().values('file')\
+            .annotate(count=Count('id')).values('count')
+        File.objects.filter(repository=self.repo, branch=branch).update(changes=Coalesce(Subquery(changes), 0))
+        authors = Commit.objects.filter(repository=self.repo, branches=branch).values('original_author')
+        for author in Developer.objects.filter(id__in=authors):
+            self.developer_cache[(author.email, self.owner)] = author
+        self.process_history(branch)
+        return branch
+
+    def start_tree(self, ref):
+        """analyze the commit ref points to now, its files are read from the object database"""
+        self.set_head(self.git_repo.head_commit(ref))
+        blobs = self.git_repo.tree_blobs(self.head)
+        self.tree_dirs = {str(parent) for path in blobs.keys() for parent in Path(path).parents}
+        self.metrics_cache = MetricsCache(blobs, settings.CODICE_INDENT_WIDTHS)
+
+    def set_head(self, head):
+        """analyze the history of head, leaving out the paths excluded by the repository or by its .gitattributes"""
+        self.head = head
+        self.git_repo.path_filter = PathFilter(self.repo.get_include_paths(), self.repo.get_exclude_paths(),
+                                               self.git_repo.read_attributes(head))
+
+    def load_branch_cache(self, branch: Branch):
+        """load files and paths already analyzed for a branch, so new commits update them"""
+        self.changed_files = set()
+        self.stale_files = set()
+        self.unblamed_commits = set()
+        for file in File.objects.filter(repository=self.repo, branch=branch):
+            key = self.get_file_key(file.filename, branch)
+            self.file_cache[key] = file
+            self.stale_files.add(key)
+
+        for file_path in FilePath.objects.filter(repository=self.repo, branch=branch):
+            self.filepath_cache[self.get_filepath_key(file_path.path, branch)] = file_path
+
+    def refresh_files(self, branch: Branch, keys):
+        """analyze again the files of previous runs changed by new commits"""
+        logger.info("REFRESH FILES")
+        removed = []
+        files = [self.file_cache[key] for key in keys]
+        self.measure_uncached(file.filename for file in files)
+        with BulkUpdateManager(File, FILE_METRIC_FIELDS) as bulk:
+            for file in files:
+                analyzed = self.analyze_file(file.filename, branch, None, file.name)
+                for field in FILE_METRIC_FIELDS:
+                    setattr(file, field, getattr(analyzed, field))
+                bulk.add(file)
+                if not file.exists:
+                    removed.append(file.id)
+        # knowledge and blames are only kept for existing files
+        FileKnowledge.objects.filter(file_id__in=removed).delete()
+        blames = FileBlame.objects.filter(file_id__in=removed)
+        self.unblamed_commits.update(blames.values_list('commit_id', flat=True))
+        blames.delete()
+
+    def measure_uncached(self, filenames):
+        """measure in batches the files whose content is not in the metrics cache yet"""
+        to_measure = [(filename, self.metrics_cache.blobs[filename]) for filename in filenames
+                      if not self.metrics_cache.get(filename)[0]]
+        batch_size = settings.CODICE_METRICS_BATCH_SIZE
+        batches = [to_measure[i:i + batch_size] for i in range(0, len(to_measure), batch_size)]
+        if batches:
+            with create_metrics_executor(settings.CODICE_METRICS_WORKERS) as executor:
+                measured = executor.map(measure_files, [self.repo.base_directory] * len(batches),
+                                        [self.repo.name] * len(batches), batches,
+                                        [settings.CODICE_INDENT_WIDTHS] * len(batches),
+                                        [settings.CODICE_MAX_FILE_SIZE] * len(batches))
+                for ((filename, blob), metrics) in zip(to_measure, (m for (seconds, batch) in measured for m in batch)):
+                    self.metrics_cache.add(filename, metrics)
+            self.metrics_cache.save()
+
+    def process_history(self, branch: Branch, new_commits=None):
+        """compute hotspots, knowledge and blames, new_commits limits the work to an incremental update"""
         self.__process_files_hotspot_weight(branch)
+        with_blame = set(Blame.objects.filter(repository=self.repo, branch=branch).values_list('author', flat=True))
         with BulkCreateManager(Blame) as blames:
             for author in self.developer_cache.values():
-                blames.add(Blame(author=author, repository=self.repo, branch=branch, loc=0))
-        self.process_fileknowledge(branch)
-        self.process_blames(branch)
-        return branch
-
-    def create_commits(self, branch: Branch):
-        commit_history = self.git_repo.get_commits(branch=branch.name)
+                if author.id not in with_blame:
+                    blames.add(Blame(author=author, repository=self.repo, branch=branch, loc=0))
+        self.process_fileknowledge(branch, new_commits)
+        self.process_ownership(branch, new_commits)
+        self.process_blames(branch, new_commits)
+        branch.last_commit = self.head
+        branch.window = self.repo.get_analysis_window()
+        branch.path_rules = self.repo.get_path_rules()
+        branch.window_start = Commit.objects.filter(repository=self.repo, branches=branch)\
+            .aggregate(start=Min('date'))['start'] if branch.window else None
+        branch.save()
+
+    def create_commits(self, branch: Branch, since=None):
+        """create the commits of a branch, or only those after since, return the set of created hexsha"""
+        if since is None:
+            commit_history = self.git_repo.log(self.head, max_count=self.max_commits, since=self.since)
+        else:
+            # updates add every new commit, the window only limits how far back the history goes
+            commit_history = self.git_repo.log('{}..{}'.format(since, self.head), since=self.since)
+        if settings.CODICE_PIPELINE:
+            return self.create_commits_pipelined(branch, commit_history)
 
         logger.info('BEGIN COMMIT HISTORY')
-        commit_dict = {}
-        with BulkCreateManager(Commit, chunk_size=1000) as bulk:
-            for commit in commit_history:
-                author_email = commit.author.email
-                author = self.__get_or_create_author(author_email, commit.author.name)
-                c = self.create_commit(commit, author, branch)
-                commit_dict[commit] = c
-                if bulk.add(c):
-                    self.file_creation(commit_dict, branch)
-                    commit_dict = {}
-        self.file_creation(commit_dict, branch)
+        created = set()
+        for git_commits in in_chunks(commit_history, COMMIT_CHUNK_SIZE):
+            commit_dict = self.create_commit_dict(git_commits)
+            created.update(c.hexsha for c in commit_dict.values())
+            self.write_commits(commit_dict, branch)
         logger.info("END COMMIT HISTORY")
+        return created
+
+    def create_commits_pipelined(self, branch: Branch, commit_history):
+        """create commits with the git reader, the file metrics and the database writer working at the same time
+
+        the stages are connected by bounded queues, so a slow stage blocks the ones feeding it
+        """
+        logger.info('BEGIN COMMIT HISTORY PIPELINE')
+        records = Queue(maxsize=settings.CODICE_PIPELINE_QUEUE_SIZE)
+        batches = Queue(maxsize=2)
+        reader = Producer('reader', commit_history, records)
+        writer = Consumer('writer', lambda commit_dict: self.write_commits(commit_dict, branch), batches)
+        parser = StageCounter('parser')
+        metrics = StageCounter('metrics')
+
+        created = set()
+        git_commits = []
+        to_measure = []
+        with create_metrics_executor(settings.CODICE_METRICS_WORKERS) as executor:
+            reader.start()
+            writer.start()
+            try:
+                for commit in drain(records, parser):
+                    if writer.error is not None:
+                        # the commits of the rest of the history could never be written
+                        raise writer.error
+                    start = time.perf_counter()
+                    git_commits.append(commit)
+                    # the files of a skipped commit are never measured
+                    files = commit.files.keys() if not self.has_too_many_files(commit) else ()
+                    for fn in files:
+                        key = self.get_file_key(fn, branch)
+                        if key not in self.file_cache and key not in self.file_metrics \
+                                and not self.metrics_cache.get(fn)[0]:
+                            self.file_metrics[key] = None
+                            to_measure.append((key, fn))
+                    if len(to_measure) >= settings.CODICE_METRICS_BATCH_SIZE:
+                        self.submit_metrics(executor, to_measure, metrics)
+                        to_measure = []
+                    if len(git_commits) >= COMMIT_CHUNK_SIZE:
+                        # the writer needs the metrics of every file of the batch
+                        self.submit_metrics(executor, to_measure, metrics)
+                        to_measure = []
+                        commit_dict = self.create_commit_dict(git_commits)
+                        created.update(c.hexsha for c in commit_dict.values())
+                        git_commits = []
+                        parser.add(time.perf_counter() - start)
+                        timed_put(batches, commit_dict, parser)
+                    else:
+                        parser.add(time.perf_counter() - start)
+                self.submit_metrics(executor, to_measure, metrics)
+                if git_commits:
+                    commit_dict = self.create_commit_dict(git_commits)
+                    created.update(c.hexsha for c in commit_dict.values())
+                    timed_put(batches, commit_dict, parser)
+            except BaseException:
+                # the writer drops its pending batches and the reader stops git, so no thread is left blocked
+                reader.stop()
+                writer.stop()
+                raise
+            finally:
+                batches.put(END)
+                writer.join()
+                reader.join()
+        self.file_metrics = dict()
+
+        for counter in (reader.counter, parser, metrics, writer.counter):
+            logger.info('PIPELINE %s', counter)
+        for stage in (reader, writer):
+            if stage.error is not None:
+                raise stage.error
+        logger.info("END COMMIT HISTORY PIPELINE")
+        return created
+
+    def submit_metrics(self, executor, to_measure, counter):
+        """measure a batch of (key, filename) in the executor, self.file_metrics keeps the future of each key"""
+        if not to_measure:
+            return
+        future = executor.submit(measure_files, self.repo.base_directory, self.repo.name,
+                                 [(fn, self.metrics_cache.blobs.get(fn)) for (key, fn) in to_measure],
+                                 settings.CODICE_INDENT_WIDTHS, settings.CODICE_MAX_FILE_SIZE)
+        future.add_done_callback(lambda f: f.exception() or counter.add(f.result()[0], items=len(to_measure)))
+        for (position, (key, fn)) in enumerate(to_measure):
+            self.file_metrics[key] = (future, position)
+
+    def write_commits(self, commit_dict, branch: Branch):
+        self.save_commits(commit_dict.values(), branch)
+        self.file_creation(commit_dict, branch)
+
+    def save_commits(self, commits, branch: Branch):
+        """store the commits not stored yet by another branch and add all of them to the branch, setting their ids
+
+        branches analyzed at the same time may store the same commit, the conflicting insert is ignored
+        """
+        commits = list(commits)
+        if not commits:
+            return
+        hexshas = [c.hexsha for c in commits]
+        ids = dict(Commit.objects.filter(repository=self.repo, hexsha__in=hexshas).values_list('hexsha', 'id'))
+        new_commits = [c for c in commits if c.hexsha not in ids]
+        if new_commits:
+            Commit.objects.bulk_create(new_commits, batch_size=BULK_SIZE, ignore_conflicts=True)
+            ids.update(Commit.objects.filter(repository=self.repo, hexsha__in=[c.hexsha for c in new_commits])
+                       .values_list('hexsha', 'id'))
+        with BulkCreateManager(BranchCommit, chunk_size=len(commits), use_copy=True) as bulk:
+            for c in commits:
+                c.id = ids[c.hexsha]
+                bulk.add(BranchCommit(branch=branch, commit_id=c.id))
 
     def file_creation(self, commit_dict, branch):
         logger.info("BEGIN FILE CREATION")
+        self.create_filepaths(branch, (fn for git_commit in commit_dict.keys() for fn in git_commit.files.keys()))
         for git_commit in commit_dict.keys():
-            self.create_files(branch, git_commit.stats.files)
+            self.create_files(branch, git_commit.files)
+            for source in git_commit.renamed_from.values():
+                key = self.get_file_key(source, branch)
+                if key in self.file_cache:
+                    self.changed_files.add(key)
         logger.info("END FILE CREATION")
 
+        self.metrics_cache.save()
+        self.file_change_creation(commit_dict, branch)
+
+    def file_change_creation(self, commit_dict, branch):
         logger.info("BEGIN FILE CHANGES CREATION")
-        with BulkCreateManager(FileChange) as bulk:
-            with BulkCreateManager(FileBlame) as blames:
-                for (git_commit, commit) in commit_dict.items():
-                    self.create_file_changes(branch, git_commit.stats.files, commit, git_commit, bulk, blames)
+        to_blame = []
+        with BulkCreateManager(FileChange, use_copy=True) as bulk:
+            for (git_commit, commit) in commit_dict.items():
+                to_blame.extend(self.create_file_changes(branch, git_commit.files, commit, bulk))
         logger.info("END FILE CHANGES CREATION")
 
+        if settings.CODICE_OWNERSHIP == 'blame':
+            logger.info("BEGIN FILE BLAMES CREATION")
+            self.create_file_blames(to_blame)
+            logger.info("END FILE BLAMES CREATION")
+
     def create_files(self, branch, files):
         with BulkCreateManager(File) as cf:
             with BulkUpdateManager(File, ['changes']) as uf:
                 for fn in files.keys():
                     file, created = self.create_file(fn, branch)
                     file.changes += 1
+                    self.changed_files.add(self.get_file_key(fn, branch))
                     if created:
                         cf.add(file)
                     else:
                         uf.add(file)
 
-    def create_file_changes(self, branch, files, commit, git_commit, bulk, blames):
+    def create_file_changes(self, branch, files, commit, bulk):
+        """:return the (filename, commit, file) tuples to blame"""
+        to_blame = []
         for fn in files.keys():
             file = self.file_cache[self.get_file_key(fn, branch)]
-            fc = self.create_file_change_object(commit, file, files[fn], git_commit)
+            fc = self.create_file_change_object(commit, file, files[fn])
             bulk.add(fc)
-            if file.exists and file.is_code and fc.change_type in ['A', 'M'] or fc.change_type == '':
-                blame = self.create_file_blame_object(fn, commit, file)
+            # files longer than CODICE_MAX_BLAME_LINES are never blamed
+            if (file.exists and file.is_code and fc.change_type in ['A', 'M'] or fc.change_type == '') \
+                    and not 0 < settings.CODICE_MAX_BLAME_LINES < file.lines:
+                to_blame.append((fn, commit, file))
+        return to_blame
+
+    def create_file_blames(self, to_blame):
+        counts = self.blame_service.count_lines_of_all([(commit.hexsha, fn) for (fn, commit, file) in to_blame])
+        with BulkCreateManager(FileBlame, use_copy=True) as blames:
+            for ((fn, commit, file), lines_by_author) in zip(to_blame, counts):
+                blame = self.create_file_blame_object(commit, file, lines_by_author)
                 if blame:
                     blames.add(blame)
 
-    def process_fileknowledge(self, branch: Branch):
+    def process_fileknowledge(self, branch: Branch, new_commits=None):
         logger.info("FILE KNOWLEDGE PROCESSING")
 
-        index = list(File.objects.filter(repository=self.repo, branch=branch).values_list('id', flat=True))
-        authors_id = set(Commit.objects.order_by('author').values_list('author', flat=True).distinct())
-        df = pd.DataFrame(0, index=index, columns=list(authors_id))
-
         file_knowledge_dict = dict()
         sum_file_knowledge_dict = defaultdict(int)
 
+        if new_commits is not None:
+            for fk in FileKnowledge.objects.filter(file__repository=self.repo, file__branch=branch):
+                file_knowledge_dict[(fk.file_id, fk.author_id)] = fk
+                sum_file_knowledge_dict[fk.file_id] += (fk.added + fk.deleted)
+
+        with BulkCreateManager(FileKnowledge, use_copy=True) as bulk_fk:
+            for c in Commit.objects.filter(branches=branch, repository=self.repo).select_related("author").order_by("date"):
+                if c.is_merge or (new_commits is not None and c.hexsha not in new_commits):
+                    continue
+                author = c.author
+                for fc in c.filechange_set.filter(branch=branch).select_related("file"):
+                    if fc.change_type == 'D' or not fc.file.exists:
+                        continue
+                    sum_file_knowledge_dict[fc.file.id] += (fc.insertions + fc.deletions)
+                    k_index = (fc.file_id, author.id)
+
+                    if k_index in file_knowledge_dict:
+                        fk = file_knowledge_dict[k_index]
+                        fk.added += fc.insertions
+                        fk.deleted += fc.deletions
+                    else:
+                        fk = FileKnowledge(
+                            author=author,
+                            file=fc.file,
+                            added=fc.insertions,
+                            deleted=fc.deletions,
+                            knowledge=0
+                        )
+                        file_knowledge_dict[k_index] = fk
+                        bulk_fk.add(fk)
+
+        logger.info("FILE KNOWLEDGE POST PROCESSING")
+        # adjust knowledge factor
+        with BulkUpdateManager(FileKnowledge, ['added', 'deleted', 'knowledge']) as bulk:
+            for fk in file_knowledge_dict.values():
+                k_total = sum_file_knowledge_dict[fk.file_id]
+                fk.knowledge = min(1.0, (fk.added + fk.deleted) / k_total if k_total else 0.0)
+                bulk.add(fk)
+
+        self.process_coupling(branch, new_commits)
+
+    def process_coupling(self, branch: Branch, new_commits=None):
+        """temporal coupling of every file of the branch, from one pass over its file changes
+
+        with new_commits only the files changed by them, and the files sharing a commit with those, are coupled again
+        """
+        logger.info("FILE COUPLING")
+        matrix = CoChangeMatrix(settings.CODICE_COUPLING_MAX_FILES)
+        branch_changes = FileChange.objects.filter(repository=self.repo, branch=branch)
+        changes = branch_changes
+        files = File.objects.filter(repository=self.repo, branch=branch)
+        if new_commits is not None:
+            changed = branch_changes.filter(commit_id__in=self.get_commit_ids(new_commits)).values('file_id')
+            coupled = branch_changes.filter(commit_id__in=branch_changes.filter(file_id__in=changed)
+                                            .values('commit_id')).values('file_id')
+            changes = branch_changes.filter(commit_id__in=branch_changes.filter(file_id__in=coupled)
+                                            .values('commit_id'))
+            files = files.filter(id__in=coupled)
+        for (commit_id, group) in groupby(changes.order_by('commit_id').values_list('commit_id', 'file_id')
+                                          .iterator(), key=lambda change: change[0]):
+            matrix.add_commit(file_id for (_, file_id) in group)
+        if new_commits is not None:
+            # the changes read are every change of the files coupled again, not of the files coupled with them
+            matrix.revisions = self.count_revisions(branch_changes)
+
+        FileCoupling.objects.filter(file__in=files).delete()
+        files = files.only('id', 'coupled_files', 'soc')
+        with BulkCreateManager(FileCoupling, use_copy=True) as couplings:
+            with BulkUpdateManager(File, ['coupled_files', 'soc']) as bulk:
+                for file in files:
+                    coupled_files = matrix.coupled_files(file.id, settings.CODICE_COUPLING_MIN_SHARED)
+                    for (other_id, shared, degree) in coupled_files[:settings.CODICE_COUPLING_TOP]:
+                        couplings.add(FileCoupling(file_id=file.id, coupled_file_id=other_id,
+                                                   shared_commits=shared, degree=degree))
+                    file.coupled_files = len(coupled_files)
+                    file.soc = matrix.soc(file.id)
+                    bulk.add(file)
+        logger.info("END FILE COUPLING")
+
+    @staticmethod
+    def count_revisions(changes):
+        """:return the commits changing every file, leaving out those changing too many files to be coupled"""
+        if settings.CODICE_COUPLING_MAX_FILES:
+            coupled_commits = changes.order_by().values('commit_id').annotate(files=Count('id'))\
+                .filter(files__lte=settings.CODICE_COUPLING_MAX_FILES).values('commit_id')
+            changes = changes.filter(commit_id__in=coupled_commits)
+        return Counter(dict(changes.order_by().values('file_id').annotate(n=Count('id'))
+                            .values_list('file_id', 'n').iterator()))
+
+    def get_commit_ids(self, hexshas):
+        ids = []
+        for chunk in in_chunks(hexshas, COMMIT_CHUNK_SIZE):
+            ids.extend(Commit.objects.filter(repository=self.repo, hexsha__in=chunk).values_list('id', flat=True))
+        return ids
+
+    def process_ownership(self, branch: Branch, new_commits=None):
+        if settings.CODICE_OWNERSHIP == 'blame':
+            self.process_ownership_matrix(branch, new_commits)
+        else:
+            self.process_ownership_history(branch, new_commits)
+
+    def process_ownership_history(self, branch: Branch, new_commits=None):
+        """exact line ownership, from one pass over the hunks of the history
+
+        the owners of the lines at the head are stored, so an update only reads the hunks of the new commits
+        """
+        logger.info("OWNERSHIP PROCESSING")
+        commits = dict()
+        for (commit_id, hexsha, author_id, date) in Commit.objects.filter(branches=branch, repository=self.repo)\
+                .values_list('id', 'hexsha', 'author_id', 'date'):
+            commits[hexsha] = (commit_id, author_id, date)
+        files = dict()
+        for (file_id, filename) in File.objects.filter(repository=self.repo, branch=branch, exists=True, is_code=True)\
+                .values_list('id', 'filename'):
+            files[filename] = file_id
+        owners = {hexsha: author_id for (hexsha, (commit_id, author_id, date)) in commits.items()}
+        (parents, states) = self.get_ownership_history(branch, new_commits)
+        children = defaultdict(int)
+        for commit_parents in parents.values():
+            for parent in commit_parents:
+                children[parent] += 1
+        # the state of the head is kept to be stored
+        children[self.head] += 1
+        ownership = LineOwnership(owners, children, self.git_repo.diff_hunks, states)
+
+        with BulkCreateManager(CommitBlame, use_copy=True) as bulk:
+            with BulkCreateManager(FileBlame, use_copy=True) as blames:
+                revs = [self.head] + ['^' + hexsha for hexsha in states.keys()]
+                for result in ownership.process(self.git_repo.log_patches(*revs)):
+                    if result.is_merge or result.hexsha not in commits:
+                        continue
+                    if new_commits is not None and result.hexsha not in new_commits:
+                        continue
+                    (commit_id, author_id, date) = commits[result.hexsha]
+                    bulk.add(CommitBlame(
+                        commit_id=commit_id,
+                        loc=result.loc,
+                        add_others=result.add_others,
+                        add_self=result.add_self,
+                        del_others=result.del_others,
+                        del_self=result.del_self,
+                        author_id=author_id,
+                        branch=branch,
+                        date=date
+                    ))
+                    for (filename, loc) in result.file_lines.items():
+                        if filename in files:
+                            blames.add(FileBlame(file_id=files[filename], commit_id=commit_id, author_id=author_id,
+                                                 loc=loc))
+        if self.head in ownership.states:
+            BranchOwnership.objects.update_or_create(branch=branch, defaults={
+                'hexsha': self.head, 'state': ownership.states[self.head].to_bytes()})
+        logger.info("END OWNERSHIP PROCESSING")
+
+    def get_ownership_history(self, branch: Branch, new_commits=None):
+        """:return the parents of every commit whose hunks are read and the ownership states the history starts from
+
+        an update starts from the state stored at the last analyzed commit, unless it merges commits older than it.
+        a window starts from the trees of the commits before it, their lines have no owner as in the whole history
+        """
+        if new_commits is not None:
+            stored = BranchOwnership.objects.filter(branch=branch, hexsha=branch.last_commit).first()
+            if stored is not None:
+                parents = self.git_repo.rev_parents('{}..{}'.format(branch.last_commit, self.head), since=self.since)
+                if self.get_history_start(parents) <= {branch.last_commit}:
+                    return parents, {branch.last_commit: OwnershipState.from_bytes(stored.state)}
+                logger.info('BRANCH %s MERGES COMMITS OLDER THAN ITS LAST ANALYSIS, OWNERSHIP OF THE WHOLE HISTORY',
+                            branch.name)
+        parents = self.git_repo.rev_parents(self.head, max_count=self.max_commits, since=self.since)
+        return parents, {hexsha: OwnershipState.from_tree(self.git_repo.tree_lines(hexsha))
+                         for hexsha in self.get_history_start(parents)}
+
+    @staticmethod
+    def get_history_start(parents):
+        """:return the parents of the commits of a history that are not in it"""
+        return {parent for commit_parents in parents.values() for parent in commit_parents if parent not in parents}
+
+    def process_ownership_matrix(self, branch: Branch, new_commits=None):
+        """approximate line ownership, from the insertions and deletions of every file change"""
+        logger.info("OWNERSHIP PROCESSING")
+
+        matrix = OwnershipMatrix()
         file_owners = dict()
-        with BulkCreateManager(CommitBlame) as bulk:
-            for c in Commit.objects.filter(branch=branch, repository=self.repo).select_related("author").order_by("date"):
+        with BulkCreateManager(CommitBlame, use_copy=True) as bulk:
+            for c in Commit.objects.filter(branches=branch, repository=self.repo).select_related("author").order_by("date"):
                 if c.is_merge:
                     continue
                 author = c.author
+                # commits of previous runs only rebuild the ownership matrix
+                replay = new_commits is not None and c.hexsha not in new_commits
 
                 add_others = 0
                 add_self = 0
                 del_self = 0
                 del_others = 0
 
-                with BulkCreateManager(FileKnowledge) as bulk_fk:
-                    for fc in c.filechange_set.select_related("file"):
-                        if fc.change_type == 'D' or not fc.file.exists:
-                            continue
-                        sum_file_knowledge_dict[fc.file.id] += (fc.insertions + fc.deletions)
-                        k_index = (fc.file_id, author.id)
-
-                        if k_index in file_knowledge_dict:
-                            fk = file_knowledge_dict[k_index]
-                            fk.added += fc.insertions
-                            fk.deleted += fc.deletions
-                        else:
-                            fk = FileKnowledge(
-                                author=author,
-                                file=fc.file,
-                                added=fc.insertions,
-                                deleted=fc.deletions,
-                                knowledge=0
-                            )
-                            file_knowledge_dict[k_index] = fk
-                            bulk_fk.add(fk)
-
-                        if fc.file.id in file_owners:
-                            file_owner = file_owners[fc.file.id]
-                        else:
-                            file_owner = author.id
-                        if author.id == file_owner:
-                            add_self += fc.insertions
-                            del_self += fc.deletions
-                        else:
-                            add_others += fc.insertions
-                            del_others += fc.deletions
-
-                        if author.id == file_owner:
-                            add_self += fc.insertions
-                            del_self += fc.deletions
-                        else:
-                            add_others += fc.insertions
-                            del_others += fc.deletions
-
-                        val = df.at[fc.file.id, author.id]
-                        df.at[fc.file.id, author.id] = val + fc.insertions
-
-                        deletions = fc.deletions
-                        r = df.loc[fc.file.id]
-
-                        while deletions > 0:
-                            imax = r.idxmax()
-                            v = df.at[fc.file.id, imax]
-                            if v >= deletions:
-                                df.at[fc.file.id, imax] = v - deletions
-                                deletions = 0
-                            else:
-                                if v <= 0:
-                                    break
-                                deletions -= v
-                                df.at[fc.file.id, imax] = 0
-
-                        imax = r.idxmax()
-                        if df.at[fc.file.id, imax] > 0:
-                            file_owners[fc.file.id] = imax
+                for fc in c.filechange_set.filter(branch=branch).select_related("file"):
+                    if fc.change_type == 'D' or not fc.file.exists:
+                        continue
+
+                    if fc.file.id in file_owners:
+                        file_owner = file_owners[fc.file.id]
+                    else:
+                        file_owner = author.id
+                    if author.id == file_owner:
+                        add_self += fc.insertions
+                        del_self += fc.deletions
+                    else:
+                        add_others += fc.insertions
+                        del_others += fc.deletions
+
+                    if author.id == file_owner:
+                        add_self += fc.insertions
+                        del_self += fc.deletions
+                    else:
+                        add_others += fc.insertions
+                        del_others += fc.deletions
+
+                    matrix.add(fc.file.id, author.id, fc.insertions)
+                    matrix.delete(fc.file.id, fc.deletions)
+                    owner = matrix.owner(fc.file.id)
+                    if owner is not None:
+                        file_owners[fc.file.id] = owner
 
+                if replay:
+                    continue
                 cblame = CommitBlame(
                     commit=c,
-                    loc=df[author.id].sum(),
+                    loc=matrix.totals[author.id],
                     add_others=add_others,
                     add_self=add_self,
                     del_others=del_others,
                     del_self=del_self,
                     author=author,
+                    branch=branch,
                     date=c.date
                 )
                 bulk.add(cblame)
+        logger.info("END OWNERSHIP PROCESSING")
 
-        logger.info("FILE KNOWLEDGE POST PROCESSING")
-        # adjust knowledge factor
-        with BulkUpdateManager(FileKnowledge, ['knowledge']) as bulk:
-            for fk in file_knowledge_dict.values():
-                k_total = sum_file_knowledge_dict[fk.file_id]
-                fk.knowledge = min(1.0, (fk.added + fk.deleted) / k_total if k_total else 0.0)
-                bulk.add(fk)
-
-        logger.info("FILE OWNERS")
-        with BulkUpdateManager(File, ['coupled_files', 'soc']) as bulk:
-            for file in self.file_cache.values():
-                file.coupled_files = file.calc_temporal_coupling(file.commits)
-                file.soc = file.calc_soc(file.commits)
-                bulk.add(file)
-        logger.info("END FILE OWNERS")
-
-    def process_blames(self, branch: Branch):
+    def process_blames(self, branch: Branch, new_commits=None):
         blames = Blame.objects.filter(repository=self.repo, branch=branch)
-        with BulkUpdateManager(FileBlame, ['loc']) as bulk:
+        blame_loc = calc_blame_loc(self.repo, branch)
+        with BulkUpdateManager(Blame, ['loc']) as bulk:
             for blame in blames:
-                commits = Commit.objects.filter(
-                    branch=branch,
-                    repository=self.repo,
-                    author=blame.author
-                ).order_by("date")
-
-                file_blames = FileBlame.objects.filter(author=blame.author, commit__in=commits)
-                fd = dict()
-                for fb in file_blames:
-                    if fb.file not in fd:
-                        fd[fb.file] = (fb.loc, fb.commit.date)
-                    else:
-                        (loc, date) = fd[fb.file]
-                        if date < fb.commit.date:
-                            fd[fb.file] = (fb.loc, fb.commit.date)
-                blame.loc = sum([loc for (loc, d) in fd.values()])
+                blame.loc = blame_loc.get(blame.author_id, 0)
                 bulk.add(blame)
 
-        (total_blame, total_insertions, total_deletions) = calc_total_blame(self.repo, branch)
-        for blame in blames:
-            commits = Commit.objects.filter(
-                branch=branch,
-                repository=self.repo,
-                author=blame.author
-            ).order_by("date")
-            update_blame_object(blame, blame.author, commits, total_blame, total_insertions, total_deletions)
-
-    def __get_or_create_author(self, email, name):
-        cache_key = (email, self.owner)
-        if cache_key not in self.developer_cache:
-            dev, created = Developer.objects.get_or_create(email=email, owner=self.owner, defaults={'name': name})
-            self.developer_cache[cache_key] = dev
-            dev.repos.add(self.repo)
-            return dev
-        return self.developer_cache[cache_key]
-
-    def create_commit(self, git_commit, author, branch):
+        if new_commits is None:
+            update_blame_statistics(self.repo, branch)
+        else:
+            update_blame_statistics(self.repo, branch, set(self.get_commit_ids(new_commits)), self.unblamed_commits)
+
+    def resolve_authors(self, git_commits):
+        """:return the developer of the author of every commit
+
+        the authors not seen before are read with one query, the new ones are created in bulk and every one
+        of them is added to the developers of the repository in bulk
+        """
+        names = dict()
+        for git_commit in git_commits:
+            if (git_commit.author_email, self.owner) not in self.developer_cache:
+                names.setdefault(git_commit.author_email, git_commit.author_name)
+        if names:
+            developers = {dev.email: dev for dev in Developer.objects.filter(owner=self.owner, email__in=names.keys())}
+            new = [Developer(email=email, name=name, owner=self.owner)
+                   for (email, name) in names.items() if email not in developers]
+            if new:
+                # the analysis of another range may create the same developers, so they are read again
+                Developer.objects.bulk_create(new, ignore_conflicts=True)
+                developers.update((dev.email, dev) for dev in
+                                  Developer.objects.filter(owner=self.owner, email__in=[dev.email for dev in new]))
+            repo_developer = Developer.repos.through
+            repo_developer.objects.bulk_create([repo_developer(developer_id=dev.id, repository_id=self.repo.id)
+                                                for dev in developers.values()], ignore_conflicts=True)
+            for dev in developers.values():
+                self.developer_cache[(dev.email, self.owner)] = dev
+        return [self.developer_cache[(git_commit.author_email, self.owner)] for git_commit in git_commits]
+
+    def get_principal(self, author: Developer):
+        """:return the developer author is an alias of, following the aliases of the owner loaded once"""
+        if self.principals is None:
+            aliases = dict(Developer.objects.filter(owner=self.owner, is_alias_of__isnull=False)
+                           .values_list('id', 'is_alias_of_id'))
+            targets = {dev.id: dev for dev in Developer.objects.filter(id__in=set(aliases.values()))}
+            self.principals = dict()
+            for alias_id in aliases.keys():
+                principal_id = alias_id
+                seen = set()
+                while principal_id in aliases and principal_id not in seen:
+                    seen.add(principal_id)
+                    principal_id = aliases[principal_id]
+                self.principals[alias_id] = targets[principal_id]
+        return self.principals.get(author.id, author)
+
+    def create_commit_dict(self, git_commits):
+        """:return a dict with the Commit of every git commit, their authors are resolved together"""
+        authors = self.resolve_authors(git_commits)
+        return {git_commit: self.create_commit(git_commit, author)
+                for (git_commit, author) in zip(git_commits, authors)}
+
+    @staticmethod
+    def has_too_many_files(git_commit):
+        return 0 < settings.CODICE_MAX_COMMIT_FILES < len(git_commit.files)
+
+    def create_commit(self, git_commit, author):
+        """a commit changing more than CODICE_MAX_COMMIT_FILES files is skipped, it keeps its totals but the
+        changes of its files are dropped from git_commit, so no file is measured, changed or blamed for it"""
         hexsha = git_commit.hexsha
         date = git_commit.authored_datetime
         msg = git_commit.message
         is_merge = len(git_commit.parents) > 1
-        stats = git_commit.stats.total
+        stats = git_commit.total
         ins = int(stats['insertions']) if not is_merge else 0
         dels = int(stats['deletions']) if not is_merge else 0
         lines = int(stats['lines']) if not is_merge else 0
         net = int(ins - dels) if not is_merge else 0
-        real_author = author.get_principal()
+        real_author = self.get_principal(author)
+        skipped = self.has_too_many_files(git_commit)
+        if skipped:
+            git_commit.keep_files(lambda filename: False)
         return Commit(
             hexsha=hexsha,
             repository=self.repo,
-            branch=branch,
             date=make_aware(date) if not is_aware(date) else date,
             message=msg,
             insertions=ins,
@@ -319,40 +888,30 @@ class RepoAnalyzer(object):
             net=net,
             is_merge=is_merge,
             author=real_author,
-            original_author=author
+            original_author=author,
+            skipped=skipped
         )
 
     def get_file_key(self, filename, branch):
         pkey = str(Path(self.repo.base_directory) / Path(filename))
         return pkey + '@' + branch.name
 
-    def create_file_change_object(self, commit: Commit, file: File, fc, git_commit):
+    def create_file_change_object(self, commit: Commit, file: File, fc):
         ins = int(fc['insertions'])
         dels = int(fc['deletions'])
-        change_type = self.__det_change_status(git_commit, git_commit.parents)
+        change_type = fc['change_type']
         return FileChange(
             file=file,
             commit=commit,
             repository=commit.repository,
-            branch=commit.branch,
+            branch_id=file.branch_id,
             insertions=ins,
             deletions=dels,
             change_type=change_type
         )
 
-    def __det_change_status(self, commit, parents):
-        for parent in parents:
-            key = (str(commit), str(parent))
-            if key in self.dict_change_status:
-                return self.dict_change_status[key]
-            for change in parent.diff(commit):
-                self.dict_change_status[key] = change.change_type
-                return change.change_type
-        return ""
-
     def create_file(self, filename, branch):
-        pkey = str(Path(self.repo.base_directory) / Path(filename))
-        key = pkey + '@' + branch.name
+        key = self.get_file_key(filename, branch)
         if key in self.file_cache:
             file = self.file_cache[key]
             return self.file_cache[key], file.id is None
@@ -363,56 +922,57 @@ class RepoAnalyzer(object):
         if parent == name:
             parent = ''
         file_path = self.get_or_create_filepath(branch, parent)
-        try:
-            path = Path(pkey)
-            exists = path.is_file()
-
-            if not exists:
-                file = self.create_file_object(filename, branch, file_path, name, False)
-            else:
-                try:
-                    analysis = SourceAnalysis.from_file(pkey, self.repo.name)
-                    empty = analysis.state == SourceState.empty.name
-                    binary = analysis.state == SourceState.binary.name
-                    indent_complexity = calculate_complexity_in(pkey) if not empty and not binary else 0
-                    is_code = (not binary) and (not empty) and language_is_code(analysis.language)
-                    lines = 0
-                    if not binary:
-                        encoding = detect_encoding(path)
-                        with open(path, "r", newline='', encoding=encoding, errors='ignore') as fd:
-                            lines = sum(1 for _ in fd)
-                    file = File(
-                        filename=filename,
-                        repository=self.repo,
-                        branch=branch,
-                        path=file_path,
-                        name=name,
-                        language=analysis.language,
-                        code=analysis.code,
-                        doc=analysis.documentation,
-                        blanks=analysis.empty,
-                        empty=empty,
-                        strings=analysis.string,
-                        binary=binary,
-                        exists=True,
-                        is_code=is_code,
-                        indent_complexity=indent_complexity,
-                        lines=lines
-                    )
-                except Exception as e:
-                    file = self.create_file_object(filename, branch, file_path, name, True)
-                    logger.info('error on {}'.format(pkey))
-                    tb = traceback.format_exc(e)
-                    logger.info(tb)
-
-            self.file_cache[key] = file
-        except Exception as e:
-            tb = traceback.format_exc(e)
-            logger.info(tb)
-            file = self.create_file_object(filename, branch, file_path, name, False)
-            self.file_cache[key] = file
+        if self.file_metrics.get(key) is not None:
+            # measured by the metrics stage of the pipeline
+            (future, position) = self.file_metrics[key]
+            metrics = future.result()[1][position]
+            self.metrics_cache.add(filename, metrics)
+            self.file_cache[key] = self.file_from_metrics(filename, branch, file_path, name, metrics)
+        else:
+            self.file_cache[key] = self.analyze_file(filename, branch, file_path, name)
         return self.file_cache[key], True
 
+    def analyze_file(self, filename, branch, file_path, name):
+        (found, metrics) = self.metrics_cache.get(filename)
+        if not found:
+            metrics = measure_file(self.repo.base_directory, self.repo.name, filename,
+                                   self.metrics_cache.blobs.get(filename), settings.CODICE_INDENT_WIDTHS,
+                                   settings.CODICE_MAX_FILE_SIZE)
+            self.metrics_cache.add(filename, metrics)
+        return self.file_from_metrics(filename, branch, file_path, name, metrics)
+
+    def file_from_metrics(self, filename, branch, file_path, name, metrics):
+        """:return a File with the metrics returned by measure_file"""
+        if metrics is None:
+            return self.create_file_object(filename, branch, file_path, name, False)
+        (language, code, doc, blanks, strings, state, indent_complexity, lines, encoding) = metrics
+        if state == ERROR_STATE:
+            return self.create_file_object(filename, branch, file_path, name, True)
+        if state == SKIPPED_STATE:
+            file = self.create_file_object(filename, branch, file_path, name, True)
+            file.skipped = True
+            return file
+        empty = state == SourceState.empty.name
+        binary = state == SourceState.binary.name
+        return File(
+            filename=filename,
+            repository=self.repo,
+            branch=branch,
+            path=file_path,
+            name=name,
+            language=language,
+            code=code,
+            doc=doc,
+            blanks=blanks,
+            empty=empty,
+            strings=strings,
+            binary=binary,
+            exists=True,
+            is_code=(not binary) and (not empty) and language_is_code(language),
+            indent_complexity=indent_complexity,
+            lines=lines
+        )
+
     def create_file_object(self, filename, branch, file_path, name, exists):
         return File(
             filename=filename,
@@ -434,9 +994,57 @@ class RepoAnalyzer(object):
             indent_complexity=0
         )
 
-    def get_or_create_filepath(self, branch: Branch, path):
+    def get_filepath_key(self, path, branch: Branch):
         pkey = str(Path(self.repo.base_directory) / Path(path))
-        cache_key = pkey + '@' + branch.name
+        return pkey + '@' + branch.name
+
+    def create_filepaths(self, branch: Branch, filenames, chunk_size=1000):
+        """create the FilePath of the directories of filenames and of their parents, with a bulk create by level,
+        so the ids of the parents are known. Rows of previous runs are reused"""
+        missing = set()
+        for fn in filenames:
+            for directory in Path(fn).parents:
+                if self.get_filepath_key(directory, branch) in self.filepath_cache or str(directory) in missing:
+                    break
+                missing.add(str(directory))
+        if not missing:
+            return
+        missing = list(missing)
+        for i in range(0, len(missing), chunk_size):
+            for file_path in FilePath.objects.filter(repository=self.repo, branch=branch,
+                                                     path__in=missing[i:i + chunk_size]):
+                self.filepath_cache[self.get_filepath_key(file_path.path, branch)] = file_path
+
+        levels = defaultdict(list)
+        for directory in missing:
+            if self.get_filepath_key(directory, branch) not in self.filepath_cache:
+                levels[0 if directory == '.' else len(Path(directory).parts)].append(Path(directory))
+        for depth in sorted(levels.keys()):
+            created = []
+            with BulkCreateManager(FilePath, chunk_size=chunk_size) as bulk:
+                for directory in levels[depth]:
+                    file_path = FilePath(
+                        path=str(directory),
+                        branch=branch,
+                        repository=self.repo,
+                        name=directory.name,
+                        exists=str(directory) in self.tree_dirs,
+                        parent=self.filepath_cache[self.get_filepath_key(directory.parent, branch)] if depth else None
+                    )
+                    created.append(file_path)
+                    bulk.add(file_path)
+            if any(file_path.id is None for file_path in created):
+                # databases that don't return the ids of a bulk create
+                ids = dict(FilePath.objects.filter(repository=self.repo, branch=branch,
+                                                   path__in=[file_path.path for file_path in created])
+                           .values_list('path', 'id'))
+                for file_path in created:
+                    file_path.id = ids[file_path.path]
+            for file_path in created:
+                self.filepath_cache[self.get_filepath_key(file_path.path, branch)] = file_path
+
+    def get_or_create_filepath(self, branch: Branch, path):
+        cache_key = self.get_filepath_key(path, branch)
 
         if cache_key not in self.filepath_cache:
             path_obj = Path(path)
@@ -452,7 +1060,7 @@ class RepoAnalyzer(object):
                 repository=self.repo,
                 defaults=dict(
                     name=path_obj.name,
-                    exists=Path(pkey).exists(),
+                    exists=str(path_obj) in self.tree_dirs,
                     parent=parent
                 )
             )
@@ -461,16 +1069,10 @@ class RepoAnalyzer(object):
 
         return self.filepath_cache[cache_key]
 
-    def create_file_blame_object(self, filename, commit: Commit, file: File):
-        if not file.exists:
-            return None
-        blames = self.git_repo.blame(commit.hexsha, filename)
-        if not blames:
+    def create_file_blame_object(self, commit: Commit, file: File, lines_by_author):
+        if not file.exists or not lines_by_author:
             return None
-        loc = 0
-        for b in blames:
-            if b[0].author.email == commit.author.email:
-                loc = loc + len(b[1])
+        loc = lines_by_author.get(commit.author.email, 0)
         return FileBlame(file=file, commit=commit, author=commit.author, loc=loc)
 
     def __process_files_hotspot_weight(self, branch: Branch):
@@ -1,185 +1,331 @@
+import operator
+from functools import reduce
+
 import numpy
-from django.db.models import Sum, Count
-from commits.models import Commit, CommitStatistic
+from django.db import connection
+from django.db.models import Sum, Count, Q, F
+from analytics.bulk import BulkCreateManager, BulkUpdateManager
+from commits.models import Commit, CommitStatistic, CommitBlame
 from developers.models import Blame
+from files.models import FileChange, FileBlame
 
 
 def calc_total_blame(repository, branch):
     """return the total blame for a repository"""
     blames = Blame.objects.filter(repository=repository, branch=branch)\
         .aggregate(total=Sum('loc'))
-    commits = Commit.objects.filter(repository=repository, branch=branch)\
+    commits = Commit.objects.filter(repository=repository, branches=branch)\
         .aggregate(insertions=Sum('insertions'), deletions=Sum('deletions'))
     return blames['total'], commits['insertions'], commits['deletions']
 
 
+# the last blame of every author on every existing file of the branch, in commits of that author
+BLAME_LOC_SQL = """
+SELECT author_id, SUM(loc) FROM (
+    SELECT fb.author_id, fb.loc,
+           ROW_NUMBER() OVER (PARTITION BY fb.author_id, fb.file_id ORDER BY c.date DESC, fb.id DESC) AS position
+    FROM codice_fileblame fb
+    JOIN codice_commit c ON c.id = fb.commit_id
+    JOIN codice_file f ON f.id = fb.file_id
+    WHERE c.repository_id = %s AND f.branch_id = %s AND c.author_id = fb.author_id AND f.exists
+) last_blames
+WHERE position = 1
+GROUP BY author_id
+"""
+
+
+def calc_blame_loc(repository, branch):
+    """:return a dict with the lines of code of every author, from the last blame of each file"""
+    with connection.cursor() as cursor:
+        cursor.execute(BLAME_LOC_SQL, [repository.id, branch.id])
+        return {author_id: int(loc) for (author_id, loc) in cursor.fetchall()}
+
+
+RAW_FACTOR = 0.4
+SELF_FACTOR = 0.6
+
+COMMIT_STATISTIC_FIELDS = ['date', 'ownership', 'changes', 'raw_throughput', 'raw_churn', 'impact', 'log_impact',
+                           'acum_lines', 'acum_insertions', 'acum_deletions', 'blame_loc', 'net_result', 'add_self',
+                           'del_self', 'add_others', 'del_others', 'self_churn', 'self_throughput', 'churn',
+                           'throughput', 'work_self', 'work_others']
+
+BLAME_FIELDS = ['impact', 'log_impact', 'ownership', 'lines', 'insertions', 'deletions', 'add_self', 'add_others',
+                'del_self', 'del_others', 'net', 'work_self', 'work_others', 'self_throughput', 'self_churn',
+                'net_avg', 'raw_throughput', 'raw_churn', 'churn', 'throughput', 'commits', 'changes',
+                'analyzed_commits', 'edited', 'files_changed', 'files_added', 'files_removed', 'interesting_lines']
+
+# totals of the commits of every author kept in its Blame, updates add those of the new commits
+TOTAL_FIELDS = ['analyzed_commits', 'lines', 'insertions', 'deletions', 'net', 'changes', 'edited', 'files_changed',
+                'files_added', 'files_removed', 'interesting_lines', 'add_self', 'add_others', 'del_self', 'del_others']
+
+ACUM_FIELDS = ['acum_lines', 'acum_insertions', 'acum_deletions', 'net_result']
+
+
+def divide(numerator, denominator, default):
+    """element wise numerator / denominator, default where denominator is 0"""
+    result = numpy.full(len(numerator), default, dtype=float)
+    numpy.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def last_of_groups(groups, values, mask, size):
+    """the value of the last row of every group where mask is set, 0 for groups without such rows"""
+    last = numpy.full(size, -1)
+    numpy.maximum.at(last, groups[mask], numpy.flatnonzero(mask))
+    return numpy.where(last >= 0, values[last], 0)
+
+
+def sum_of_groups(groups, values, size):
+    return numpy.bincount(groups, weights=values, minlength=size)
+
+
+def group_cumsum(groups, values):
+    """running sum of values inside each group, rows of a group must be contiguous"""
+    if len(values) == 0:
+        return values
+    total = numpy.cumsum(values)
+    starts = numpy.flatnonzero(numpy.r_[True, groups[1:] != groups[:-1]])
+    offsets = numpy.repeat(total[starts] - values[starts], numpy.diff(numpy.r_[starts, len(values)]))
+    return total - offsets
+
+
+class CommitColumns(object):
+
+    """Columns of the non merge commits of the given authors in a branch, ordered by author and date
+
+    starts limits the commits of every author to those from a (date, id) on
+    """
+    def __init__(self, repository, branch, authors, starts=None):
+        commits = Commit.objects.filter(repository=repository, branches=branch, author_id__in=authors,
+                                        is_merge=False)
+        self.partial = starts is not None
+        if self.partial:
+            commits = commits.filter(reduce(operator.or_, (
+                Q(author_id=author_id) & (Q(date__gt=date) | Q(date=date, id__gte=commit_id))
+                for (author_id, (date, commit_id)) in starts.items()), Q(pk__in=[])))
+        rows = list(commits.order_by('author_id', 'date', 'id')
+                    .values_list('id', 'author_id', 'date', 'lines', 'insertions', 'deletions', 'net'))
+        self.size = len(rows)
+        self.dates = [row[2] for row in rows]
+        columns = numpy.array([row[:2] + row[3:] for row in rows], dtype=numpy.int64).reshape(-1, 6)
+        (self.ids, self.authors, self.lines, self.insertions, self.deletions, self.net) = columns.T
+        self.index = {commit_id: position for (position, commit_id) in enumerate(self.ids.tolist())}
+
+    def positions(self, commit_ids):
+        return numpy.array([self.index.get(commit_id, -1) for commit_id in commit_ids], dtype=numpy.int64)
+
+    def load_file_changes(self, repository, branch):
+        """files changed, added and removed and the edited, added and removed lines of every commit"""
+        changes = FileChange.objects.filter(repository=repository, branch=branch)
+        if self.partial:
+            changes = changes.filter(commit_id__in=self.ids.tolist())
+        rows = list(changes.order_by('commit_id', 'id')
+                    .values_list('commit_id', 'change_type', 'insertions', 'deletions'))
+        positions = self.positions([row[0] for row in rows])
+        known = positions >= 0
+        positions = positions[known]
+        change_types = numpy.array([row[1] for row in rows], dtype=object)[known]
+        insertions = numpy.array([row[2] for row in rows], dtype=numpy.int64)[known]
+        deletions = numpy.array([row[3] for row in rows], dtype=numpy.int64)[known]
+
+        is_added = (change_types == 'A') | (change_types == 'C')
+        is_edited = change_types == 'M'
+        is_removed = change_types == 'D'
+        is_other = ~(is_added | is_edited | is_removed)
+
+        self.changes = numpy.bincount(positions, minlength=self.size)
+        self.files_added = numpy.bincount(positions[is_added], minlength=self.size)
+        self.files_changed = numpy.bincount(positions[is_edited], minlength=self.size)
+        self.files_removed = numpy.bincount(positions[is_removed], minlength=self.size)
+        self.edited = numpy.bincount(positions[is_edited], weights=(insertions + deletions)[is_edited],
+                                     minlength=self.size).astype(numpy.int64)
+        # added and removed lines are those of the last file added or removed, not a sum
+        self.added = last_of_groups(positions, insertions, is_added | is_other, self.size)
+        self.removed = last_of_groups(positions, deletions, is_removed | is_other, self.size)
+
+    def load_file_blames(self, repository, branch):
+        """lines blamed in every commit and the number of file blames of its author"""
+        self.total_blame = numpy.zeros(self.size, dtype=numpy.int64)
+        self.blame_loc = numpy.zeros(self.size, dtype=numpy.int64)
+        blames = FileBlame.objects.filter(file__repository=repository, file__branch=branch)
+        if self.partial:
+            blames = blames.filter(commit_id__in=self.ids.tolist())
+        rows = blames.values('commit_id')\
+            .annotate(total=Sum('loc'), own=Count('loc', filter=Q(author_id=F('commit__author_id'))))\
+            .values_list('commit_id', 'total', 'own')
+        for (commit_id, total, own) in rows:
+            if commit_id in self.index:
+                self.total_blame[self.index[commit_id]] = total or 0
+                self.blame_loc[self.index[commit_id]] = own or 0
+
+    def load_commit_blames(self, branch):
+        self.add_self = numpy.zeros(self.size, dtype=numpy.int64)
+        self.add_others = numpy.zeros(self.size, dtype=numpy.int64)
+        self.del_self = numpy.zeros(self.size, dtype=numpy.int64)
+        self.del_others = numpy.zeros(self.size, dtype=numpy.int64)
+        rows = CommitBlame.objects.filter(branch=branch, commit_id__in=self.ids.tolist()).values('commit_id')\
+            .annotate(add_self=Sum('add_self'), add_others=Sum('add_others'),
+                      del_self=Sum('del_self'), del_others=Sum('del_others'))\
+            .values_list('commit_id', 'add_self', 'add_others', 'del_self', 'del_others')
+        for (commit_id, add_self, add_others, del_self, del_others) in rows:
+            position = self.index[commit_id]
+            self.add_self[position] = add_self
+            self.add_others[position] = add_others
+            self.del_self[position] = del_self
+            self.del_others[position] = del_others
+
+
 # see https://git-scm.com/docs/git-diff
 # see https://github.com/rbanks54/GitStats/blob/master/GitStats.Console/ImpactAnalyser.cs
-def update_blame_object(blame: Blame, dev, commits, total_blame, total_insertions, total_deletions):
-    """update a blame object, useful for statistics or when an alias is updated"""
-    commits_by_dev = [c for c in commits if c.author.id == dev.id]
-    commits_by_dev.sort(key=lambda x: x.date, reverse=False)
-    lines = 0
-    insertions = 0
-    deletions = 0
-    net = 0
-    commits = 0
-    changes = 0
-    add_self = 0
-    add_others = 0
-    del_self = 0
-    del_others = 0
-    total_files_changed = 0
-    total_files_added = 0
-    total_files_removed = 0
-    total_interesting_lines = 0
-    total_added = 0
-    total_removed = 0
-    total_edited = 0
-    n = 0
-    raw_factor = 0.4
-    self_factor = 0.6
-    for com in commits_by_dev:
-        commits += 1
-        if com.is_merge:
-            continue
-        n += 1
-        files_changed = 0
-        files_added = 0
-        files_removed = 0
-        edited = 0
-        added = 0
-        removed = 0
-        for fc in com.filechange_set.all():
-            if fc.change_type == 'A' or fc.change_type == 'C':
-                added = fc.insertions
-                files_added += 1
-            elif fc.change_type == 'M':
-                edited += fc.insertions + fc.deletions
-                files_changed += 1
-            elif fc.change_type == 'D':
-                removed = fc.deletions
-                files_removed += 1
-            else:
-                removed = fc.deletions
-                added = fc.insertions
-            changes += 1
-
-        total_edited += edited
-        total_added += added
-        total_removed += removed
-        total_lines = edited + added + removed
-        interesting_lines = edited + added
-        old_code_weighting = edited / total_lines if total_lines else 0.0
-        base_score = 10.0 * files_changed + 3.0 * files_added + files_removed + interesting_lines
-        impact = base_score + base_score * old_code_weighting
-
-        total_files_changed += files_changed
-        total_files_removed += files_removed
-        total_files_added += files_added
-        total_interesting_lines += interesting_lines
-        lines = lines + com.lines
-        insertions = insertions + com.insertions
-        deletions = deletions + com.deletions
-        net = net + com.net
-        commit_total_blame = com.fileblame_set.aggregate(total=Sum('loc'))['total'] or 0
-        nc = com.filechange_set.count()
-        bloc = com.fileblame_set.filter(author=com.author).aggregate(loc=Count('loc'))['loc'] or 0
-        delta_loc = 0
-        delta_ins = 0
-        if com.insertions > bloc:
-            delta_ins = com.insertions - bloc
-
-        deno = com.insertions + bloc
-        raw_churn = (delta_loc + delta_ins) / deno if deno else 0
-        log_impact = numpy.ma.sqrt(impact) if impact > 0.0 else 0.0
-        ownership = bloc / commit_total_blame if commit_total_blame else 0.0
-        raw_throughput = abs(com.net) / com.lines if com.lines else 1.0
-
-        rcb = com.commitblame_set.aggregate(sum_add_self=Sum('add_self'), sum_add_others=Sum('add_others'),
-                                            sum_del_self=Sum('del_self'), sum_del_others=Sum('del_others'))
-        sum_add_self = rcb['sum_add_self']
-        sum_del_self = rcb['sum_del_self']
-        sum_add_others = rcb['sum_add_others']
-        sum_del_others = rcb['sum_del_others']
-        add_self += sum_add_self
-        add_others += sum_add_others
-        del_self += sum_del_self
-        del_others += sum_del_others
-
-        dsc = sum_add_self+sum_add_others+sum_del_others+sum_del_self
-        nsc = sum_add_self+sum_add_others+sum_del_others
-        self_throughput = nsc / dsc if dsc else 1.0
-        self_churn = sum_del_self / dsc if dsc else 0.0
-
-        work_self = (sum_add_self+sum_del_self) / dsc if dsc > 0 else 1.0
-        work_others = 1.0 - work_self
-        try:
-            cs = CommitStatistic.objects.get(commit=com)
-            cs.raw_throughput = raw_throughput
-            cs.raw_churn = raw_churn
-            cs.impact = impact
-            cs.log_impact = log_impact
-            cs.acum_lines = lines
-            cs.acum_insertions = insertions
-            cs.acum_deletions = deletions
-            cs.blame_loc = bloc
-            cs.net_result = net
-            cs.add_self = sum_add_self
-            cs.del_self = sum_del_self
-            cs.add_others = sum_add_others
-            cs.del_others = sum_del_others
-            cs.self_churn = self_churn
-            cs.self_throughput = self_throughput
-            cs.work_self = work_self
-            cs.work_others = work_others
-            cs.churn = (0.3*cs.raw_churn + 0.7*cs.self_churn)
-            cs.throughput = (0.3*cs.raw_throughput + 0.7*cs.self_throughput)
-
-        except CommitStatistic.DoesNotExist:
-            CommitStatistic.objects.create(commit=com, date=com.date, ownership=ownership, changes=nc,
-                                           raw_throughput=raw_throughput, raw_churn=raw_churn, impact=impact,
-                                           log_impact=log_impact, acum_lines=lines, acum_insertions=insertions,
-                                           acum_deletions=deletions, blame_loc=bloc, net_result=net,
-                                           add_self=sum_add_self, del_self=sum_del_self, add_others=sum_add_others,
-                                           del_others=sum_del_others, self_churn=self_churn,
-                                           self_throughput=self_throughput,
-                                           churn=(raw_factor*raw_churn + self_factor*self_churn),
-                                           throughput=(raw_factor*raw_throughput+self_factor*self_throughput),
-                                           work_self=work_self,
-                                           work_others=work_others)
-
-    total_lines = total_insertions + total_deletions
-    old_code_weighting = total_edited / total_lines if total_lines else 0.0
-    base_score = 10.0 * total_files_changed + 3.0 * total_files_added + total_files_removed + total_interesting_lines
+def update_blame_statistics(repository, branch, new_commit_ids=None, changed_commit_ids=()):
+    """compute the statistics of all the commits of a branch and the blames of its authors in a few queries
+
+    with new_commit_ids only the statistics of the new commits, of the changed_commit_ids whose file blames changed
+    and of the later commits of their authors, whose running totals move, are computed. The totals of the blames are
+    their stored ones plus those of the new commits
+    """
+    blames = list(Blame.objects.filter(repository=repository, branch=branch))
+    if new_commit_ids is not None and not has_stored_totals(repository, branch, blames, new_commit_ids):
+        new_commit_ids = None
+    (total_blame, total_insertions, total_deletions) = calc_total_blame(repository, branch)
+    authors = [blame.author_id for blame in blames]
+    starts = None if new_commit_ids is None else first_commits(authors, new_commit_ids | set(changed_commit_ids))
+    c = CommitColumns(repository, branch, authors, starts)
+    c.load_file_changes(repository, branch)
+    c.load_file_blames(repository, branch)
+    c.load_commit_blames(branch)
+
+    total_lines = c.edited + c.added + c.removed
+    interesting_lines = c.edited + c.added
+    old_code_weighting = divide(c.edited, total_lines, 0.0)
+    base_score = 10.0 * c.files_changed + 3.0 * c.files_added + c.files_removed + interesting_lines
     impact = base_score + base_score * old_code_weighting
-    blame.impact = impact
-    blame.log_impact = numpy.ma.sqrt(impact)
-    blame.ownership = blame.loc / total_blame if total_blame > 0.0 else 0.0
-    blame.lines = lines
-    blame.insertions = insertions
-    blame.deletions = deletions
-    blame.add_self = add_self
-    blame.add_others = add_others
-    blame.del_self = del_self
-    blame.del_others = del_others
-    blame.net = net
-    dws = blame.add_self+blame.add_others+blame.del_self+blame.del_others
-    blame.work_self = (blame.add_self+blame.del_self) / dws if dws > 0.0 else 1.0
-    blame.work_others = 1.0 - blame.work_self
-    dst = (blame.add_self+blame.add_others+blame.del_others)
-    nst = (blame.add_self+blame.add_others+blame.del_others+blame.del_self)
-    blame.self_throughput = dst / nst if nst > 0 else 1.0
-    blame.self_churn = blame.del_self / nst if nst > 0 else 0.0
-
-    blame.net_avg = int(net / n) if n > 0 else 0
-
-    blame.raw_throughput = (blame.insertions+blame.deletions) / total_lines if total_lines > 0 else 0.0
-    blame.raw_churn = blame.deletions / total_lines if total_lines > 0 else 0.0
-
-    blame.churn = (blame.self_churn+numpy.ma.sqrt(blame.self_churn*blame.raw_churn)+blame.raw_churn)/3.0
-    blame.throughput = (blame.self_throughput+numpy.ma.sqrt(blame.self_throughput*blame.raw_throughput)
-                        + blame.raw_throughput)/3.0
-    blame.commits = commits
-    blame.changes = changes
-    blame.save()
+    log_impact = numpy.sqrt(impact)
+
+    delta_ins = numpy.maximum(c.insertions - c.blame_loc, 0)
+    raw_churn = divide(delta_ins, c.insertions + c.blame_loc, 0.0)
+    ownership = divide(c.blame_loc, c.total_blame, 0.0)
+    raw_throughput = divide(numpy.abs(c.net), c.lines, 1.0)
+
+    dsc = c.add_self + c.add_others + c.del_others + c.del_self
+    nsc = c.add_self + c.add_others + c.del_others
+    self_throughput = divide(nsc, dsc, 1.0)
+    self_churn = divide(c.del_self, dsc, 0.0)
+    work_self = divide(c.add_self + c.del_self, dsc, 1.0)
+    work_others = 1.0 - work_self
+
+    # the running totals go on from those of the last commit of every author before the first one computed
+    offsets = last_running_totals(branch, starts) if starts is not None else dict()
+    (acum_lines, acum_insertions, acum_deletions, net_result) = (
+        group_cumsum(c.authors, values) + numpy.array([offsets.get(author_id, (0, 0, 0, 0))[position]
+                                                       for author_id in c.authors.tolist()], dtype=numpy.int64)
+        for (position, values) in enumerate((c.lines, c.insertions, c.deletions, c.net)))
+
+    columns = {
+        'ownership': ownership, 'changes': c.changes, 'raw_throughput': raw_throughput, 'raw_churn': raw_churn,
+        'impact': impact, 'log_impact': log_impact, 'acum_lines': acum_lines, 'acum_insertions': acum_insertions,
+        'acum_deletions': acum_deletions, 'blame_loc': c.blame_loc, 'net_result': net_result,
+        'add_self': c.add_self, 'del_self': c.del_self, 'add_others': c.add_others, 'del_others': c.del_others,
+        'self_churn': self_churn, 'self_throughput': self_throughput,
+        'churn': RAW_FACTOR * raw_churn + SELF_FACTOR * self_churn,
+        'throughput': RAW_FACTOR * raw_throughput + SELF_FACTOR * self_throughput,
+        'work_self': work_self, 'work_others': work_others,
+    }
+    columns = {name: values.tolist() for (name, values) in columns.items()}
+    existing = dict(CommitStatistic.objects.filter(branch=branch, commit_id__in=c.ids.tolist())
+                    .values_list('commit_id', 'id'))
+    with BulkCreateManager(CommitStatistic) as created:
+        with BulkUpdateManager(CommitStatistic, COMMIT_STATISTIC_FIELDS) as updated:
+            for (position, commit_id) in enumerate(c.ids.tolist()):
+                cs = CommitStatistic(id=existing.get(commit_id), commit_id=commit_id, branch=branch,
+                                     date=c.dates[position],
+                                     **{name: values[position] for (name, values) in columns.items()})
+                if commit_id in existing:
+                    updated.add(cs)
+                else:
+                    created.add(cs)
+
+    # per author totals, of the new commits in an update
+    counted = numpy.isin(c.ids, list(new_commit_ids)) if new_commit_ids is not None else numpy.ones(c.size, bool)
+    (authors, groups) = numpy.unique(c.authors[counted], return_inverse=True)
+    author_index = {author_id: position for (position, author_id) in enumerate(authors.tolist())}
+    totals = {name: sum_of_groups(groups, values[counted], len(authors)) for (name, values) in (
+        ('analyzed_commits', numpy.ones(c.size)), ('lines', c.lines), ('insertions', c.insertions),
+        ('deletions', c.deletions), ('net', c.net), ('changes', c.changes), ('edited', c.edited),
+        ('files_changed', c.files_changed), ('files_added', c.files_added), ('files_removed', c.files_removed),
+        ('interesting_lines', interesting_lines), ('add_self', c.add_self), ('add_others', c.add_others),
+        ('del_self', c.del_self), ('del_others', c.del_others))}
+    commits = Commit.objects.filter(repository=repository, branches=branch)
+    if new_commit_ids is not None:
+        commits = commits.filter(id__in=list(new_commit_ids))
+    commits = dict(commits.values('author_id').annotate(n=Count('id')).values_list('author_id', 'n'))
+
+    total_lines = (total_insertions or 0) + (total_deletions or 0)
+    total_blame = total_blame or 0
+    with BulkUpdateManager(Blame, BLAME_FIELDS) as bulk:
+        for blame in blames:
+            position = author_index.get(blame.author_id)
+            t = {name: (int(values[position]) if position is not None else 0) for (name, values) in totals.items()}
+            if new_commit_ids is not None:
+                t = {name: (getattr(blame, name) or 0) + value for (name, value) in t.items()}
+                blame.commits += commits.get(blame.author_id, 0)
+            else:
+                blame.commits = commits.get(blame.author_id, 0)
+            for name in TOTAL_FIELDS:
+                setattr(blame, name, t[name])
+            old_code_weighting = t['edited'] / total_lines if total_lines else 0.0
+            base_score = 10.0 * t['files_changed'] + 3.0 * t['files_added'] + t['files_removed'] \
+                + t['interesting_lines']
+            impact = base_score + base_score * old_code_weighting
+            blame.impact = impact
+            blame.log_impact = numpy.sqrt(impact)
+            blame.ownership = blame.loc / total_blame if total_blame > 0.0 else 0.0
+            dws = blame.add_self + blame.add_others + blame.del_self + blame.del_others
+            blame.work_self = (blame.add_self + blame.del_self) / dws if dws > 0.0 else 1.0
+            blame.work_others = 1.0 - blame.work_self
+            dst = (blame.add_self + blame.add_others + blame.del_others)
+            nst = (blame.add_self + blame.add_others + blame.del_others + blame.del_self)
+            blame.self_throughput = dst / nst if nst > 0 else 1.0
+            blame.self_churn = blame.del_self / nst if nst > 0 else 0.0
+
+            blame.net_avg = int(t['net'] / t['analyzed_commits']) if t['analyzed_commits'] > 0 else 0
+
+            blame.raw_throughput = (blame.insertions + blame.deletions) / total_lines if total_lines > 0 else 0.0
+            blame.raw_churn = blame.deletions / total_lines if total_lines > 0 else 0.0
+
+            blame.churn = (blame.self_churn + numpy.sqrt(blame.self_churn * blame.raw_churn) + blame.raw_churn) / 3.0
+            blame.throughput = (blame.self_throughput + numpy.sqrt(blame.self_throughput * blame.raw_throughput)
+                                + blame.raw_throughput) / 3.0
+            bulk.add(blame)
+
+
+def has_stored_totals(repository, branch, blames, new_commit_ids):
+    """True if the totals of every author are stored, those of an author without commits before the new ones are 0
+
+    totals are cleared when the aliases of an author change
+    """
+    missing = [blame.author_id for blame in blames if blame.analyzed_commits is None]
+    return not Commit.objects.filter(repository=repository, branches=branch, author_id__in=missing)\
+        .exclude(id__in=list(new_commit_ids)).exists()
+
+
+def first_commits(authors, commit_ids):
+    """:return the (date, id) of the first non merge commit of every author among commit_ids"""
+    starts = dict()
+    for (author_id, date, commit_id) in Commit.objects.filter(id__in=list(commit_ids), is_merge=False,
+                                                               author_id__in=authors)\
+            .order_by('author_id', 'date', 'id').values_list('author_id', 'date', 'id'):
+        starts.setdefault(author_id, (date, commit_id))
+    return starts
+
+
+def last_running_totals(branch, starts):
+    """:return the running totals of the last commit of every author before its (date, id) in starts"""
+    offsets = dict()
+    for (author_id, (date, commit_id)) in starts.items():
+        last = CommitStatistic.objects.filter(branch=branch, commit__author_id=author_id, commit__is_merge=False)\
+            .filter(Q(date__lt=date) | Q(date=date, commit_id__lt=commit_id))\
+            .order_by('-date', '-commit_id').values_list(*ACUM_FIELDS).first()
+        if last is not None:
+            offsets[author_id] = last
+    return offsets
@@ -1,3 +1,52 @@
+import io
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+def copy_value(value):
+    """a value in the CSV format of COPY, NULL is the only unquoted empty value"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def next_ids(model_class, count):
+    """reserve count values of the primary key sequence of a model"""
+    meta = model_class._meta
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                       [meta.db_table, meta.pk.column, count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def copy_objects(model_class, objs):
+    """insert objs with COPY FROM STDIN, objects without primary key get one from its sequence"""
+    meta = model_class._meta
+    fields = meta.concrete_fields
+    without_pk = [obj for obj in objs if obj.pk is None]
+    if without_pk:
+        for (obj, pk) in zip(without_pk, next_ids(model_class, len(without_pk))):
+            obj.pk = pk
+
+    data = io.StringIO()
+    for obj in objs:
+        values = (field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+        data.write(','.join(copy_value(value) for value in values))
+        data.write('\n')
+    data.seek(0)
+
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(connection.ops.quote_name(meta.db_table), columns)
+    with transaction.atomic(savepoint=False):
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, data)
+    for obj in objs:
+        obj._state.adding = False
+        obj._state.db = connection.alias
+
 
 class BulkOperationManager(object):
 
@@ -30,8 +79,16 @@ class BulkOperationManager(object):
 
 class BulkCreateManager(BulkOperationManager):
 
+    """with use_copy the objects are loaded with COPY on PostgreSQL, their ids are taken from the sequence first"""
+    def __init__(self, model_class, chunk_size=500, use_copy=False):
+        super().__init__(model_class, chunk_size)
+        self._use_copy = use_copy and settings.CODICE_BULK_COPY
+
     def _commit(self):
-        self._model_class.objects.bulk_create(self._chunk)
+        if self._use_copy and connection.vendor == 'postgresql':
+            copy_objects(self._model_class, self._chunk)
+        else:
+            self._model_class.objects.bulk_create(self._chunk)
         self._chunk = []
 
 
@@ -1,42 +1,38 @@
 # based on https://github.com/adamtornhill/maat-scripts/blob/master/miner/complexity_calculations.py
-import re
-
 import numpy
 
-from tools.encoding import detect_encoding
-
-leading_tabs_expr =  re.compile(r'^(\t+)')
-leading_spaces_expr = re.compile(r'^( +)')
-empty_line_expr = re.compile(r'^\s*$')
-
-
-def n_log_tabs(line):
-    pattern = re.compile(r' +')
-    wo_spaces = re.sub(pattern, '', line)
-    m = leading_tabs_expr.search(wo_spaces)
-    if m:
-        tabs = m.group()
-        return len(tabs)
-    return 0
-
-
-def n_log_spaces(line):
-    pattern = re.compile(r'\t+')
-    wo_tabs = re.sub(pattern, '', line)
-    m = leading_spaces_expr.search(wo_tabs)
-    if m:
-        spaces = m.group()
-        return len(spaces)
-    return 0
-
-
-def complexity_of(line):
-    return n_log_tabs(line) + (n_log_spaces(line) / 4) # hardcoded indentation
-
-
-def calculate_complexity_in(source):
-    encoding = detect_encoding(source)
-    with open(source, "r", newline='', encoding=encoding, errors='ignore') as file:
-        source = file.read()
-        lines_complexity = [complexity_of(line) for line in source.split("\n")]
-        return numpy.mean(lines_complexity)
\ No newline at end of file
+# spaces of an indentation level, a tab is always one level
+DEFAULT_INDENT_WIDTH = 4
+
+NEWLINE = ord('\n')
+SPACE = ord(' ')
+TAB = ord('\t')
+
+
+class IndentComplexity(object):
+
+    """The indentation of every line of a file, in levels, with its mean, maximum and standard deviation"""
+    def __init__(self, lines):
+        self.lines = lines
+        self.mean = float(numpy.mean(lines))
+        self.max = float(numpy.max(lines))
+        self.std = float(numpy.std(lines))
+
+
+def indent_complexity(data: bytes, indent_width=DEFAULT_INDENT_WIDTH):
+    """:return the IndentComplexity of an ascii compatible buffer, such as utf-8
+
+    the indentation of a line counts the tabs and spaces before its first other character, lines end at every
+    newline, so a buffer ending with a newline has a last empty line
+    """
+    buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(buffer == NEWLINE) + 1))
+    tabs = buffer == TAB
+    # every indentation ends at the first byte after the start of its line that isn't a space or a tab
+    others = numpy.flatnonzero((buffer != SPACE) & ~tabs)
+    others = numpy.append(others, len(buffer))
+    ends = others[numpy.searchsorted(others, starts)]
+    tabs_before = numpy.concatenate(([0], numpy.cumsum(tabs)))
+    line_tabs = tabs_before[ends] - tabs_before[starts]
+    line_spaces = (ends - starts) - line_tabs
+    return IndentComplexity(line_tabs + line_spaces / indent_width)
@@ -0,0 +1,41 @@
+from collections import Counter, defaultdict
+
+
+class CoChangeMatrix(object):
+
+    """Number of commits shared by every pair of files, built from the files changed by each commit
+
+    commits changing more than max_files files are ignored, they are usually moves or reformats and
+    would couple every file with every other one
+    """
+    def __init__(self, max_files=0):
+        self.max_files = max_files
+        self.revisions = Counter()
+        self.shared = defaultdict(Counter)
+
+    def add_commit(self, file_ids):
+        file_ids = set(file_ids)
+        if self.max_files and len(file_ids) > self.max_files:
+            return
+        for file_id in file_ids:
+            self.revisions[file_id] += 1
+            partners = self.shared[file_id]
+            for other_id in file_ids:
+                if other_id != file_id:
+                    partners[other_id] += 1
+
+    def degree(self, file_id, other_id):
+        """shared commits over the average revisions of both files, as defined by Tornhill"""
+        revisions = (self.revisions[file_id] + self.revisions[other_id]) / 2
+        return self.shared[file_id][other_id] / revisions if revisions else 0.0
+
+    def soc(self, file_id):
+        """sum of coupling, the commits shared with every other file"""
+        return sum(self.shared[file_id].values())
+
+    def coupled_files(self, file_id, min_shared=1):
+        """:return a list of (other_id, shared, degree) sorted by degree, with at least min_shared commits"""
+        result = [(other_id, shared, self.degree(file_id, other_id))
+                  for (other_id, shared) in self.shared[file_id].items() if shared >= min_shared]
+        result.sort(key=lambda item: (-item[2], -item[1], item[0]))
+        return result
@@ -0,0 +1,166 @@
+import codecs
+import logging
+import os
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from pathlib import Path
+
+from billiard.pool import Pool
+from pygount import SourceAnalysis
+from pygount.analysis import SourceState
+
+from analytics.complexity import indent_complexity, DEFAULT_INDENT_WIDTH
+from git_interface.gitcatfile import BlobReader
+from tools.encoding import detect_encoding_of
+
+logger = logging.getLogger(__name__)
+
+# state of the files pygount failed to analyze
+ERROR_STATE = 'error'
+# state of the files larger than the maximum size, they are never read
+SKIPPED_STATE = 'skipped'
+
+# binary contents are recognized as pygount does, by a NUL in their first bytes
+BINARY_SNIFF_SIZE = 8192
+TEXT_BOMS = (codecs.BOM_UTF16_BE, codecs.BOM_UTF16_LE, codecs.BOM_UTF32_BE, codecs.BOM_UTF32_LE, codecs.BOM_UTF8)
+
+# encodings pygount would choose itself after reading the file
+PYGOUNT_ENCODINGS = ('ascii', 'utf-8', 'UTF-8-SIG')
+
+_readers = dict()
+_readers_lock = threading.Lock()
+
+
+def get_reader(base_directory):
+    """the blob reader of a repository for this process, forked processes start their own"""
+    key = (os.getpid(), base_directory)
+    with _readers_lock:
+        if key not in _readers:
+            _readers[key] = BlobReader(base_directory)
+        return _readers[key]
+
+
+def close_readers():
+    with _readers_lock:
+        for (pid, base_directory) in list(_readers.keys()):
+            if pid == os.getpid():
+                _readers.pop((pid, base_directory)).close()
+
+
+def is_binary(data):
+    prefix = data[:BINARY_SNIFF_SIZE]
+    return b'\0' in prefix and not prefix.startswith(TEXT_BOMS)
+
+
+def count_lines(buffer):
+    """the lines of an utf-8 buffer as read by a file opened with newline=''"""
+    lines = buffer.count(b'\n') + buffer.count(b'\r') - buffer.count(b'\r\n')
+    if buffer and not buffer.endswith((b'\n', b'\r')):
+        lines += 1
+    return lines
+
+
+def measure_file(base_directory, group, filename, blob, indent_widths=None, max_size=0):
+    """:return the metrics of the blob of a file as a
+    (language, code, doc, blanks, strings, state, indent_complexity, lines, encoding) tuple,
+    None if the file doesn't exist
+
+    indent_widths maps a language to the spaces of its indentation levels, blobs larger than max_size bytes
+    are skipped and binary ones are never given to pygount.
+    the blob is read once, its encoding, lines and complexity come from that buffer. pygount only analyzes paths,
+    so the blob is written to a temporary file with the same name, pygount is given the encoding when it is one
+    it would find by itself. only plain values are returned, so it can run in another process
+    """
+    try:
+        (size, data) = get_reader(base_directory).read_limited(blob, max_size) if blob else (None, None)
+        if size is None:
+            return None
+        if data is None:
+            return ('', 0, 0, 0, 0, SKIPPED_STATE, 0.0, 0, None)
+        if is_binary(data):
+            return ('__binary__', 0, 0, 0, 0, SourceState.binary.name, 0.0, 0, None)
+        encoding = detect_encoding_of(data)
+        with tempfile.TemporaryDirectory(prefix='codice') as directory:
+            path = Path(directory) / Path(filename).name
+            path.write_bytes(data)
+            pkey = str(path)
+            try:
+                analysis = SourceAnalysis.from_file(pkey, group,
+                                                    encoding=encoding if encoding in PYGOUNT_ENCODINGS else 'automatic')
+                state = analysis.state.name
+                empty = state == SourceState.empty.name
+                binary = state == SourceState.binary.name
+                complexity = 0.0
+                lines = 0
+                if binary:
+                    encoding = None
+                else:
+                    # ascii and utf-8 blobs are measured as they are, others are converted to utf-8 once
+                    buffer = data if encoding in ('ascii', 'utf-8') else \
+                        data.decode(encoding or 'utf-8', errors='ignore').encode('utf-8')
+                    lines = count_lines(buffer)
+                    if not empty:
+                        indent_width = (indent_widths or {}).get(analysis.language, DEFAULT_INDENT_WIDTH)
+                        complexity = indent_complexity(buffer, indent_width).mean
+                return (analysis.language, analysis.code, analysis.documentation, analysis.empty, analysis.string,
+                        state, complexity, lines, encoding)
+            except Exception:
+                logger.info('error on {}'.format(filename))
+                logger.info(traceback.format_exc())
+                return ('', 0, 0, 0, 0, ERROR_STATE, 0.0, 0, None)
+    except Exception:
+        logger.info(traceback.format_exc())
+        return None
+
+
+def measure_files(base_directory, group, files, indent_widths=None, max_size=0):
+    """:return the seconds spent and the result of measure_file for every (filename, blob) in files"""
+    start = time.perf_counter()
+    result = [measure_file(base_directory, group, filename, blob, indent_widths, max_size)
+              for (filename, blob) in files]
+    return time.perf_counter() - start, result
+
+
+class PoolExecutor(object):
+
+    """Run functions in a billiard pool of processes and return their futures, as concurrent.futures executors
+
+    the processes of multiprocessing can't have children inside daemonic processes, such as the prefork
+    workers of celery, billiard processes can
+    """
+    def __init__(self, workers):
+        self.pool = Pool(processes=workers)
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        # billiard wraps the exceptions of its workers in an ExceptionInfo
+        self.pool.apply_async(fn, args, callback=future.set_result,
+                              error_callback=lambda error: future.set_exception(getattr(error, 'exception', error)))
+        return future
+
+    def map(self, fn, *iterables):
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+        return (future.result() for future in futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None:
+            self.pool.close()
+        else:
+            self.pool.terminate()
+        self.pool.join()
+        return False
+
+
+def create_metrics_executor(workers):
+    """a pool of processes to measure files, pygount is bound by the GIL so threads would measure one file at a time
+
+    the workers are forked when the pool is created, so it must be created before the caller starts any thread
+    """
+    return PoolExecutor(max(1, workers))
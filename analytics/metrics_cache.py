@@ -0,0 +1,68 @@
+import hashlib
+import posixpath
+
+from analytics.metrics import ERROR_STATE, SKIPPED_STATE
+from files.models import FileMetrics
+
+METRICS_FIELDS = ['language', 'code', 'doc', 'blanks', 'strings', 'state', 'indent_complexity', 'lines', 'encoding']
+
+# changed whenever measure_file computes the metrics differently, so the cached ones are measured again
+METRICS_VERSION = 2
+
+# longest file name stored in the cache, longer names are always measured
+MAX_NAME_LENGTH = 255
+
+
+def metrics_version(indent_widths):
+    """the version of the metrics measured with indent_widths, the cache only returns metrics of that version"""
+    widths = ','.join('{}:{}'.format(language, width) for (language, width) in sorted((indent_widths or {}).items()))
+    return '{}-{}'.format(METRICS_VERSION, hashlib.sha1(widths.encode('utf-8')).hexdigest()[:16])
+
+
+class MetricsCache(object):
+
+    """Metrics of file contents stored by blob sha and file name, so every content is measured only once
+
+    pygount chooses the language of a content from its file name, so the same blob under another name is measured
+    again. blobs maps the path of every file of the analyzed tree to its blob sha, paths not in blobs don't exist
+    """
+    def __init__(self, blobs, indent_widths=None, chunk_size=1000):
+        self.blobs = blobs
+        self.version = metrics_version(indent_widths)
+        self.known = dict()
+        self.new = dict()
+        shas = list(set(blobs.values()))
+        for i in range(0, len(shas), chunk_size):
+            for row in FileMetrics.objects.filter(blob__in=shas[i:i + chunk_size], version=self.version)\
+                    .values_list('blob', 'name', *METRICS_FIELDS):
+                self.known[(row[0], row[1])] = tuple(row[2:])
+
+    def get_key(self, filename):
+        return self.blobs[filename], posixpath.basename(filename)
+
+    def get(self, filename):
+        """:return (found, metrics), metrics is None for paths that don't exist"""
+        if filename not in self.blobs:
+            return True, None
+        key = self.get_key(filename)
+        if key in self.known:
+            return True, self.known[key]
+        return False, None
+
+    def add(self, filename, metrics):
+        if filename not in self.blobs:
+            return
+        key = self.get_key(filename)
+        # skipped contents are measured if the maximum size grows
+        if metrics is None or metrics[5] in (ERROR_STATE, SKIPPED_STATE) or key in self.known:
+            return
+        self.known[key] = metrics
+        if len(key[1]) <= MAX_NAME_LENGTH:
+            self.new[key] = metrics
+
+    def save(self):
+        FileMetrics.objects.bulk_create(
+            [FileMetrics(blob=sha, name=name, version=self.version, **dict(zip(METRICS_FIELDS, metrics)))
+             for ((sha, name), metrics) in self.new.items()],
+            ignore_conflicts=True)
+        self.new = dict()
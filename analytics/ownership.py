@@ -0,0 +1,276 @@
+import json
+import zlib
+from collections import Counter, defaultdict
+
+
+def count_owners(runs):
+    """:return a Counter with the lines of every owner in a run-length list"""
+    result = Counter()
+    for (owner, lines) in runs:
+        result[owner] += lines
+    return result
+
+
+def append_run(runs, owner, lines):
+    if lines <= 0:
+        return
+    if runs and runs[-1][0] == owner:
+        runs[-1] = (owner, runs[-1][1] + lines)
+    else:
+        runs.append((owner, lines))
+
+
+def apply_hunks(runs, hunks, owner):
+    """replace the lines of the hunks of a diff without context, the new lines are given to owner
+
+    :return the new run-length list and a Counter of the deleted lines by owner"""
+    result = []
+    deleted = Counter()
+    pending = list(reversed(runs))
+    position = 0
+
+    def take(lines, keep):
+        nonlocal position
+        while lines > 0 and pending:
+            (run_owner, run_lines) = pending.pop()
+            used = min(lines, run_lines)
+            if run_lines > used:
+                pending.append((run_owner, run_lines - used))
+            if keep:
+                append_run(result, run_owner, used)
+            else:
+                deleted[run_owner] += used
+            lines -= used
+            position += used
+
+    for (old_start, old_count, new_start, new_count) in hunks:
+        # with no deleted lines old_start is the line after which the new lines go
+        take((old_start - 1 if old_count else old_start) - position, True)
+        take(old_count, False)
+        append_run(result, owner, new_count)
+    while pending:
+        (run_owner, run_lines) = pending.pop()
+        append_run(result, run_owner, run_lines)
+    return tuple(result), deleted
+
+
+def apply_hunks_to_lines(runs, hunks):
+    """:return the owner of every line after the hunks, None for the new lines"""
+    result = []
+    for (owner, lines) in runs:
+        result.extend([owner] * lines)
+    # from the last hunk so the line numbers of the previous ones stay valid
+    for (old_start, old_count, new_start, new_count) in reversed(hunks):
+        start = old_start - 1 if old_count else old_start
+        result[start:start + old_count] = [None] * new_count
+    return result
+
+
+def lines_to_runs(lines, owner):
+    """:return the run-length list of the owners of every line, None lines are given to owner"""
+    runs = []
+    for line_owner in lines:
+        append_run(runs, line_owner if line_owner is not None else owner, 1)
+    return tuple(runs)
+
+
+class OwnershipState(object):
+
+    """Owners of the lines of every file at one commit, files map a path to (blob, runs)"""
+    def __init__(self, files=None, totals=None):
+        self.files = files if files is not None else dict()
+        self.totals = totals if totals is not None else Counter()
+
+    def copy(self):
+        return OwnershipState(dict(self.files), Counter(self.totals))
+
+    @staticmethod
+    def from_tree(tree):
+        """the state of the lines of a tree, as returned by GitRepository.tree_lines, they have no owner"""
+        files = {path: (blob, ((None, lines),) if lines else ()) for (path, (blob, lines)) in tree.items()}
+        return OwnershipState(files, Counter({None: sum(lines for (blob, lines) in tree.values())}))
+
+    def to_bytes(self):
+        """the state compressed, owners must be ids or None"""
+        data = {'files': {path: [blob, runs] for (path, (blob, runs)) in self.files.items()},
+                'totals': list(self.totals.items())}
+        return zlib.compress(json.dumps(data).encode('utf-8'))
+
+    @staticmethod
+    def from_bytes(data):
+        data = json.loads(zlib.decompress(data).decode('utf-8'))
+        files = {path: (blob, tuple((owner, lines) for (owner, lines) in runs))
+                 for (path, (blob, runs)) in data['files'].items()}
+        return OwnershipState(files, Counter(dict((owner, lines) for (owner, lines) in data['totals'])))
+
+
+class CommitOwnership(object):
+
+    """Line ownership changes made by a commit and the lines of its author after it"""
+    def __init__(self, hexsha, owner, is_merge):
+        self.hexsha = hexsha
+        self.owner = owner
+        self.is_merge = is_merge
+        self.add_self = 0
+        self.add_others = 0
+        self.del_self = 0
+        self.del_others = 0
+        self.loc = 0
+        self.file_lines = dict()
+
+
+class LineOwnership(object):
+
+    """Walk the history once, parents first, applying the hunks of every commit to the owners of each line
+
+    owners maps a commit hexsha to the owner of its lines, children maps a hexsha to its number of children,
+    the state of a commit is kept only until all its children have been processed. diff(rev, rev, path) returns
+    the hunks between two revisions, it is used for files changed on both sides of a merge. states are the known
+    states of the parents of the first commits, when the history doesn't start at the root
+    """
+    def __init__(self, owners, children, diff=None, states=None):
+        self.owners = owners
+        self.children = dict(children)
+        self.states = dict(states) if states is not None else dict()
+        self.diff = diff
+
+    def process(self, records):
+        """:return a generator of CommitOwnership, one for every GitPatchRecord in records"""
+        for record in records:
+            yield self.process_commit(record)
+
+    def process_commit(self, record):
+        owner = self.owners.get(record.hexsha)
+        result = CommitOwnership(record.hexsha, owner, len(record.parents) > 1)
+        state = self.__take_state(record.parents[0]) if record.parents else OwnershipState()
+        others = [self.__peek_state(parent) for parent in record.parents[1:]]
+
+        for change in record.changes.values():
+            if change.change_type == 'D':
+                (blob, runs) = state.files.pop(change.path, (None, ()))
+                deleted = count_owners(runs)
+                state.totals.subtract(deleted)
+                self.__count_deleted(result, deleted)
+                continue
+
+            source = change.source if change.source else change.path
+            if change.change_type == 'R':
+                (blob, runs) = state.files.pop(source, (None, ()))
+            else:
+                (blob, runs) = state.files.get(source, (None, ()))
+
+            merged_runs = self.__find_in_other_parents(others, change)
+            if merged_runs is None and others:
+                merged_runs = self.__merge_with_other_parents(record, others, change, runs, owner)
+            if merged_runs is not None:
+                # a merge taking the file from another parent keeps the owners of that parent
+                state.totals.subtract(count_owners(runs))
+                state.totals.update(count_owners(merged_runs))
+                state.files[change.path] = (change.blob, merged_runs)
+                continue
+
+            before = count_owners(runs)
+            (new_runs, deleted) = apply_hunks(runs, change.hunks, owner)
+            added = sum(hunk[3] for hunk in change.hunks)
+            state.totals.subtract(deleted)
+            state.totals[owner] += added
+            state.files[change.path] = (change.blob, new_runs)
+
+            file_owner = before.most_common(1)[0][0] if before else owner
+            if file_owner == owner:
+                result.add_self += added
+            else:
+                result.add_others += added
+            self.__count_deleted(result, deleted)
+            result.file_lines[change.path] = count_owners(new_runs)[owner]
+
+        result.loc = state.totals[owner]
+        for parent in record.parents[1:]:
+            self.__release_state(parent)
+        if self.children.get(record.hexsha, 0) > 0:
+            self.states[record.hexsha] = state
+        return result
+
+    @staticmethod
+    def __count_deleted(result, deleted):
+        for (line_owner, lines) in deleted.items():
+            if line_owner == result.owner:
+                result.del_self += lines
+            else:
+                result.del_others += lines
+
+    @staticmethod
+    def __find_in_other_parents(others, change):
+        for other in others:
+            (blob, runs) = other.files.get(change.path, (None, None))
+            if blob == change.blob:
+                return runs
+        return None
+
+    def __merge_with_other_parents(self, record, others, change, runs, owner):
+        """the owners of a file changed on both sides of a merge, lines new to all parents are given to owner"""
+        if self.diff is None:
+            return None
+        lines = apply_hunks_to_lines(runs, change.hunks)
+        for (parent, other) in zip(record.parents[1:], others):
+            if change.path in other.files:
+                (blob, other_runs) = other.files[change.path]
+                other_lines = apply_hunks_to_lines(other_runs, self.diff(parent, record.hexsha, change.path))
+                if len(other_lines) == len(lines):
+                    lines = [line if line is not None else other_line
+                             for (line, other_line) in zip(lines, other_lines)]
+        return lines_to_runs(lines, owner)
+
+    def __take_state(self, parent):
+        """the state of a parent, copied unless this is its last child"""
+        if parent not in self.states:
+            # parent out of the analyzed history, e.g. a shallow clone
+            return OwnershipState()
+        self.children[parent] -= 1
+        if self.children[parent] <= 0:
+            return self.states.pop(parent)
+        return self.states[parent].copy()
+
+    def __peek_state(self, parent):
+        return self.states.get(parent, OwnershipState())
+
+    def __release_state(self, parent):
+        if parent in self.states:
+            self.children[parent] -= 1
+            if self.children[parent] <= 0:
+                del self.states[parent]
+
+
+class OwnershipMatrix(object):
+
+    """Approximate lines of every author in every file, from the insertions and deletions of file changes
+
+    only the (file, author) pairs with lines are stored, totals keeps the lines of every author in all files
+    """
+    def __init__(self):
+        self.files = defaultdict(Counter)
+        self.totals = Counter()
+
+    def owner(self, file_id):
+        """:return the author with most lines in the file, the lowest id on ties, None if it has no lines"""
+        lines = self.files.get(file_id)
+        if not lines:
+            return None
+        return min(lines.items(), key=lambda item: (-item[1], item[0]))[0]
+
+    def add(self, file_id, author_id, insertions):
+        if insertions > 0:
+            self.files[file_id][author_id] += insertions
+            self.totals[author_id] += insertions
+
+    def delete(self, file_id, deletions):
+        """deleted lines are taken from the owners of the file, largest first"""
+        lines = self.files.get(file_id)
+        while deletions > 0 and lines:
+            owner = self.owner(file_id)
+            removed = min(deletions, lines[owner])
+            lines[owner] -= removed
+            self.totals[owner] -= removed
+            deletions -= removed
+            if lines[owner] <= 0:
+                del lines[owner]
@@ -0,0 +1,139 @@
+import threading
+import time
+from queue import Full
+
+from django.db import connection
+
+# marks the end of the items of a queue
+END = object()
+
+# seconds a stopped stage may stay blocked on a full queue
+STOP_POLL = 0.1
+
+
+class StageCounter(object):
+
+    """Items processed by a pipeline stage, with the seconds spent working and waiting on its queues"""
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, busy, waiting=0.0, items=1):
+        with self.lock:
+            self.items += items
+            self.busy += busy
+            self.waiting += waiting
+
+    def __str__(self):
+        rate = self.items / self.busy if self.busy > 0 else 0.0
+        return '{}: {} items, {:.2f}s busy ({:.1f} items/s), {:.2f}s waiting'.format(
+            self.name, self.items, self.busy, rate, self.waiting)
+
+
+def timed_get(queue, counter):
+    start = time.perf_counter()
+    item = queue.get()
+    counter.waiting += time.perf_counter() - start
+    return item
+
+
+def timed_put(queue, item, counter):
+    start = time.perf_counter()
+    queue.put(item)
+    counter.waiting += time.perf_counter() - start
+
+
+def drain(queue, counter):
+    """yield the items of a queue until END"""
+    while True:
+        item = timed_get(queue, counter)
+        if item is END:
+            return
+        yield item
+
+
+class Producer(threading.Thread):
+
+    """Put every item of an iterable in a bounded queue, blocking while the queue is full
+
+    once stopped no more items are read, and an iterable with a close method, such as a generator, is closed
+    by the thread, which ends the processes behind it
+    """
+    def __init__(self, name, iterable, outbox):
+        super().__init__(name=name, daemon=True)
+        self.iterable = iterable
+        self.outbox = outbox
+        self.counter = StageCounter(name)
+        self.error = None
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def put(self, item):
+        """put item in the queue unless the stage is stopped while it is full"""
+        while not self.stopped.is_set():
+            try:
+                self.outbox.put(item, timeout=STOP_POLL)
+                return
+            except Full:
+                continue
+
+    def run(self):
+        items = None
+        try:
+            items = iter(self.iterable)
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                item = next(items, END)
+                if item is END:
+                    break
+                busy = time.perf_counter() - start
+                start = time.perf_counter()
+                self.put(item)
+                self.counter.add(busy, time.perf_counter() - start)
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                if hasattr(items, 'close'):
+                    items.close()
+            except Exception as e:
+                self.error = self.error or e
+            finally:
+                self.put(END)
+
+
+class Consumer(threading.Thread):
+
+    """Call func with every item of a queue until END, the database connection of the thread is closed at the end
+
+    after an error, or once stopped, the remaining items are discarded so the producers are never blocked
+    """
+    def __init__(self, name, func, inbox):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.counter = StageCounter(name)
+        self.error = None
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        try:
+            for item in drain(self.inbox, self.counter):
+                if self.error is not None or self.stopped.is_set():
+                    continue
+                start = time.perf_counter()
+                try:
+                    self.func(item)
+                except Exception as e:
+                    self.error = e
+                self.counter.add(time.perf_counter() - start)
+        finally:
+            connection.close()
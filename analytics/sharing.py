@@ -0,0 +1,228 @@
+import logging
+from collections import defaultdict, Counter
+from pathlib import Path
+
+from django.db import transaction
+
+from analytics.analyzer import RepoAnalyzer
+from analytics.bulk import BulkCreateManager
+from analytics.ownership import OwnershipState
+from commits.models import Commit, BranchCommit, BranchOwnership, CommitBlame, CommitStatistic
+from developers.models import Developer, Blame
+from files.models import File, FilePath, FileChange, FileBlame, FileKnowledge, FileCoupling
+from repos.models import Repository, Branch
+
+logger = logging.getLogger(__name__)
+
+
+def find_analysis_source(repo: Repository):
+    """:return an analyzed repository with the same url, analysis window and path rules that tracks every branch of repo, None if there is none
+
+    only repositories without credentials share their analysis
+    """
+    if repo.has_credentials():
+        return None
+    branch_names = set(repo.get_branches_to_track())
+    candidates = Repository.objects.filter(normalized_url=repo.normalized_url, username='', password='',
+                                           status=Repository.Status.OK, analysis_source=None,
+                                           analysis_since=repo.analysis_since,
+                                           analysis_max_commits=repo.analysis_max_commits,
+                                           include_paths=repo.include_paths, exclude_paths=repo.exclude_paths)\
+        .exclude(id=repo.id)
+    for candidate in candidates.order_by('id'):
+        # a token in the url is a credential too
+        if candidate.has_credentials():
+            continue
+        analyzed = set(candidate.branch_set.exclude(last_commit='').values_list('name', flat=True))
+        if branch_names <= analyzed:
+            return candidate
+    return None
+
+
+def copy_repo_analysis(repo: Repository):
+    """analyze a repository from the analysis of its source"""
+    logger.info("copying analysis of {} to repo: {}".format(repo.analysis_source, repo))
+    AnalysisCopy(repo.analysis_source, repo).copy()
+
+
+class AnalysisCopy(object):
+
+    """Copy the analysis of a repository to a repository of another owner with the same url
+
+    commits, files, knowledge, ownership, coupling and statistics are copied as they are, their authors are the
+    developers of the new owner with the same email. When the aliases of the new owner group the authors of a branch
+    differently, its knowledge, ownership and statistics are computed again from the copied commits and files.
+    Branches unchanged since the last copy are kept, and the copy is a single transaction, so the repository shows
+    its previous analysis until the new one is complete
+    """
+    def __init__(self, source: Repository, repo: Repository):
+        self.source = source
+        self.repo = repo
+        self.developers = dict()
+        self.principals = dict()
+        self.commits = dict()
+
+    def copy(self):
+        with transaction.atomic():
+            heads = self.copy_branches()
+            # commits shared with the branches kept or copied are still used
+            Commit.objects.filter(repository=self.repo, branches=None).delete()
+            if heads:
+                # one analyzer for every branch, as the analysis of the source
+                analyzer = RepoAnalyzer(self.repo)
+                for (name, head) in heads.items():
+                    analyzer.merge_branch(name, head)
+
+    def copy_branches(self):
+        """copy the branches changed since the last copy, :return the head of those whose authors differ"""
+        names = list(dict.fromkeys(self.repo.get_branches_to_track()))
+        sources = {branch.name: branch for branch in
+                   self.source.branch_set.filter(name__in=names).exclude(last_commit='')}
+        branches = {branch.name: branch for branch in self.repo.branch_set.all()}
+        for (name, branch) in branches.items():
+            source_branch = sources.get(name)
+            if source_branch is None or self.analysis_of(branch) != self.analysis_of(source_branch):
+                branch.delete()
+            else:
+                sources.pop(name)
+        # the copies of the commits kept, by the id of their source
+        copies = dict(Commit.objects.filter(repository=self.repo).values_list('hexsha', 'id'))
+        self.commits = {commit_id: copies[hexsha] for (commit_id, hexsha) in
+                        Commit.objects.filter(repository=self.source).values_list('id', 'hexsha')
+                        if hexsha in copies}
+        heads = dict()
+        for name in names:
+            if name not in sources:
+                continue
+            source_branch = sources[name]
+            branch = Branch.objects.create(name=name, repository=self.repo)
+            self.copy_branch(source_branch, branch)
+            if self.same_authors(source_branch, branch):
+                self.copy_analysis(source_branch, branch)
+            else:
+                logger.info("BRANCH {} HAS OTHER AUTHORS, ANALYZING ITS COPY".format(name))
+                heads[name] = source_branch.last_commit
+        return heads
+
+    @staticmethod
+    def analysis_of(branch: Branch):
+        return branch.last_commit, branch.window, branch.path_rules
+
+    def copy_branch(self, source_branch: Branch, branch: Branch):
+        """copy the commits, files and file changes of a branch"""
+        logger.info("COPY BRANCH {}".format(branch.name))
+        source_commits = Commit.objects.filter(repository=self.source, branches=source_branch)
+        # commits shared with a branch copied before are copied only once
+        self.commits.update(self.copy_rows(Commit, (commit for commit in source_commits.iterator()
+                                                    if commit.id not in self.commits), self.copy_commit))
+        with BulkCreateManager(BranchCommit, use_copy=True) as bulk:
+            for commit_id in source_commits.values_list('id', flat=True).iterator():
+                bulk.add(BranchCommit(branch=branch, commit_id=self.commits[commit_id]))
+
+        paths = dict()
+        levels = defaultdict(list)
+        for file_path in FilePath.objects.filter(repository=self.source, branch=source_branch):
+            levels[len(Path(file_path.path).parts)].append(file_path)
+        # parents are copied before their children
+        for depth in sorted(levels.keys()):
+            paths.update(self.copy_rows(FilePath, levels[depth],
+                                        lambda file_path: self.in_branch(file_path, branch, parent_id=paths)))
+        self.files = self.copy_rows(File, File.objects.filter(repository=self.source, branch=source_branch).iterator(),
+                                    lambda file: self.in_branch(file, branch, path_id=paths))
+        self.copy_rows(FileChange, FileChange.objects.filter(repository=self.source, branch=source_branch).iterator(),
+                       lambda change: self.in_branch(change, branch, file_id=self.files, commit_id=self.commits))
+
+    def same_authors(self, source_branch: Branch, branch: Branch):
+        """:return True if the author of every copied commit is the developer with the email of its source author"""
+        copies = dict(Commit.objects.filter(repository=self.repo, branches=branch).values_list('hexsha', 'author_id'))
+        for (hexsha, author_id) in Commit.objects.filter(repository=self.source, branches=source_branch)\
+                .values_list('hexsha', 'author_id').iterator():
+            if self.get_developer(author_id).id != copies[hexsha]:
+                return False
+        return True
+
+    def copy_analysis(self, source_branch: Branch, branch: Branch):
+        """copy what the analysis computed from the commits and files of a branch"""
+        files = self.files
+        self.copy_rows(FileBlame, FileBlame.objects.filter(file__branch=source_branch).iterator(),
+                       lambda blame: self.with_ids(blame, file_id=files, commit_id=self.commits))
+        self.copy_rows(FileKnowledge, FileKnowledge.objects.filter(file__branch=source_branch).iterator(),
+                       lambda knowledge: self.with_ids(knowledge, file_id=files))
+        self.copy_rows(FileCoupling, FileCoupling.objects.filter(file__branch=source_branch).iterator(),
+                       lambda coupling: self.with_ids(coupling, file_id=files, coupled_file_id=files))
+        self.copy_rows(CommitBlame, CommitBlame.objects.filter(branch=source_branch).iterator(),
+                       lambda blame: self.in_branch(blame, branch, commit_id=self.commits))
+        self.copy_rows(CommitStatistic, CommitStatistic.objects.filter(branch=source_branch).iterator(),
+                       lambda statistic: self.in_branch(statistic, branch, commit_id=self.commits))
+        self.copy_rows(Blame, Blame.objects.filter(repository=self.source, branch=source_branch).iterator(),
+                       lambda blame: self.in_branch(blame, branch))
+        ownership = BranchOwnership.objects.filter(branch=source_branch).first()
+        if ownership is not None:
+            state = OwnershipState.from_bytes(ownership.state)
+            state.files = {path: (blob, tuple((self.get_author_id(owner), lines) for (owner, lines) in runs))
+                           for (path, (blob, runs)) in state.files.items()}
+            state.totals = Counter({self.get_author_id(owner): lines for (owner, lines) in state.totals.items()})
+            BranchOwnership.objects.create(branch=branch, hexsha=ownership.hexsha, state=state.to_bytes())
+        branch.last_commit = source_branch.last_commit
+        branch.window = source_branch.window
+        branch.window_start = source_branch.window_start
+        branch.path_rules = source_branch.path_rules
+        branch.save()
+
+    def copy_commit(self, commit):
+        original = self.get_developer(commit.original_author_id or commit.author_id)
+        commit.repository = self.repo
+        commit.original_author = original
+        commit.author = self.get_principal(original)
+        return commit
+
+    def in_branch(self, obj, branch: Branch, **foreign_keys):
+        """move an object of the source to the branch, replacing the ids of its foreign keys with those of the copies"""
+        if hasattr(obj, 'repository_id'):
+            obj.repository = self.repo
+        obj.branch = branch
+        return self.with_ids(obj, **foreign_keys)
+
+    def with_ids(self, obj, **foreign_keys):
+        """replace the ids of the foreign keys of an object with those of the copies, and its author with the
+        developer of the owner with the same email"""
+        for (field, ids) in foreign_keys.items():
+            value = getattr(obj, field)
+            setattr(obj, field, ids[value] if value is not None else None)
+        if hasattr(obj, 'author_id'):
+            obj.author_id = self.get_author_id(obj.author_id)
+        return obj
+
+    def copy_rows(self, model, rows, copy):
+        """create a copy of every row, :return a dict with the id of the copy of every row"""
+        ids = dict()
+        pending = []
+        with BulkCreateManager(model, chunk_size=1000, use_copy=True) as bulk:
+            for row in rows:
+                row_id = row.id
+                obj = copy(row)
+                obj.id = None
+                pending.append((row_id, obj))
+                if bulk.add(obj):
+                    ids.update((row_id, obj.id) for (row_id, obj) in pending)
+                    pending = []
+        ids.update((row_id, obj.id) for (row_id, obj) in pending)
+        return ids
+
+    def get_author_id(self, developer_id):
+        return self.get_developer(developer_id).id if developer_id is not None else None
+
+    def get_principal(self, developer: Developer):
+        if developer.id not in self.principals:
+            self.principals[developer.id] = developer.get_principal()
+        return self.principals[developer.id]
+
+    def get_developer(self, developer_id):
+        """:return the developer of the owner of the repository with the email of a developer of the source"""
+        if developer_id not in self.developers:
+            source_developer = Developer.objects.get(id=developer_id)
+            developer, created = Developer.objects.get_or_create(email=source_developer.email, owner=self.repo.owner,
+                                                                 defaults={'name': source_developer.name})
+            developer.repos.add(self.repo)
+            self.developers[developer_id] = developer
+        return self.developers[developer_id]
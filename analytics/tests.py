@@ -0,0 +1,279 @@
+from collections import Counter
+from queue import Queue
+
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from analytics.bulk import BulkCreateManager, copy_value
+from analytics.metrics import ERROR_STATE, SKIPPED_STATE
+from analytics.metrics_cache import MetricsCache, MAX_NAME_LENGTH
+from analytics.pipeline import Producer, END
+from analytics.ownership import apply_hunks, apply_hunks_to_lines, count_owners, lines_to_runs, LineOwnership, \
+    OwnershipState
+from git_interface.gitobjects import GitRepository
+from files.models import FileMetrics
+from git_interface.tests import FixtureRepository
+
+
+def expand(runs):
+    """the owner of every line of a run-length list"""
+    return [owner for (owner, lines) in runs for _ in range(lines)]
+
+
+class ApplyHunksTest(SimpleTestCase):
+
+    def test_insert_before_the_first_line(self):
+        (runs, deleted) = apply_hunks((('a', 2),), [(0, 0, 1, 1)], 'b')
+        self.assertEqual(runs, (('b', 1), ('a', 2)))
+        self.assertEqual(deleted, Counter())
+
+    def test_insert_after_a_line(self):
+        (runs, deleted) = apply_hunks((('a', 3),), [(2, 0, 3, 2)], 'b')
+        self.assertEqual(expand(runs), ['a', 'a', 'b', 'b', 'a'])
+
+    def test_replace_lines_of_two_owners(self):
+        (runs, deleted) = apply_hunks((('a', 2), ('b', 2)), [(2, 2, 2, 1)], 'c')
+        self.assertEqual(runs, (('a', 1), ('c', 1), ('b', 1)))
+        self.assertEqual(deleted, Counter({'a': 1, 'b': 1}))
+
+    def test_delete_the_last_lines(self):
+        (runs, deleted) = apply_hunks((('a', 2), ('b', 2)), [(3, 2, 2, 0)], 'c')
+        self.assertEqual(runs, (('a', 2),))
+        self.assertEqual(deleted, Counter({'b': 2}))
+
+    def test_many_hunks_use_the_old_line_numbers(self):
+        # a b c d e -> z b d e z
+        runs = (('a', 1), ('b', 1), ('c', 1), ('d', 1), ('e', 1))
+        (runs, deleted) = apply_hunks(runs, [(1, 1, 1, 1), (3, 1, 2, 0), (5, 0, 5, 1)], 'z')
+        self.assertEqual(expand(runs), ['z', 'b', 'd', 'e', 'z'])
+        self.assertEqual(deleted, Counter({'a': 1, 'c': 1}))
+
+    def test_new_file(self):
+        (runs, deleted) = apply_hunks((), [(0, 0, 1, 3)], 'a')
+        self.assertEqual(runs, (('a', 3),))
+
+    def test_runs_of_the_same_owner_are_joined(self):
+        (runs, deleted) = apply_hunks((('a', 1), ('b', 1), ('a', 1)), [(2, 1, 2, 1)], 'a')
+        self.assertEqual(runs, (('a', 3),))
+
+    def test_lines_of_a_merge(self):
+        lines = apply_hunks_to_lines((('a', 2), ('b', 2)), [(1, 1, 1, 2), (4, 0, 6, 1)])
+        self.assertEqual(lines, [None, None, 'a', 'b', 'b', None])
+        self.assertEqual(lines_to_runs(lines, 'c'), (('c', 2), ('a', 1), ('b', 2), ('c', 1)))
+        self.assertEqual(count_owners((('a', 2), ('b', 1), ('a', 3))), Counter({'a': 5, 'b': 1}))
+
+
+class OwnershipStateTest(SimpleTestCase):
+
+    def test_bytes(self):
+        state = OwnershipState({'a.py': ('111', ((1, 2), (None, 3))), 'b.py': ('222', ())}, Counter({1: 2, None: 3}))
+        copy = OwnershipState.from_bytes(state.to_bytes())
+        self.assertEqual(copy.files, state.files)
+        self.assertEqual(copy.totals, state.totals)
+
+    def test_from_tree(self):
+        state = OwnershipState.from_tree({'a.py': ('111', 3), 'image.png': ('222', 0)})
+        self.assertEqual(state.files, {'a.py': ('111', ((None, 3),)), 'image.png': ('222', ())})
+        self.assertEqual(state.totals, Counter({None: 3}))
+
+
+class LineOwnershipTest(SimpleTestCase):
+
+    def setUp(self):
+        self.fixture = FixtureRepository()
+        self.repo = GitRepository(self.fixture.path)
+        self.authors = dict()
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def commit(self, author, files=None, removed=()):
+        hexsha = self.fixture.commit('by {}'.format(author), author, files, removed)
+        self.authors[hexsha] = author
+        return hexsha
+
+    def replay(self, *revs, states=None):
+        """:return the LineOwnership and the CommitOwnership of every commit of the history of revs"""
+        parents = self.repo.rev_parents(revs[0])
+        children = Counter(parent for commit_parents in parents.values() for parent in commit_parents)
+        # the state of the last commit is kept
+        children[self.fixture.git('rev-parse', revs[0]).strip()] += 1
+        ownership = LineOwnership(self.authors, children, self.repo.diff_hunks, states)
+        return ownership, {result.hexsha: result for result in ownership.process(self.repo.log_patches(*revs))}
+
+    def blame(self, path):
+        """the author of every line of a file at the head, as git blame finds it"""
+        authors = []
+        for line in self.fixture.git('blame', '--line-porcelain', 'HEAD', '--', path).splitlines():
+            if line.startswith('author '):
+                authors.append(line[len('author '):])
+        return authors
+
+    def test_linear_history_matches_blame(self):
+        self.commit('ana', {'a.txt': ''.join('line {}\n'.format(i) for i in range(10))})
+        self.commit('bob', {'a.txt': 'new\n' + ''.join('line {}\n'.format(i) for i in range(10) if i % 3)})
+        self.commit('eva', {'a.txt': 'new\n' + ''.join('changed {}\n'.format(i) if i == 4 else 'line {}\n'.format(i)
+                                                        for i in range(10) if i % 3) + 'end\n'})
+        (ownership, results) = self.replay('master')
+        runs = ownership.states[self.fixture.head()].files['a.txt'][1]
+        self.assertEqual(expand(runs), self.blame('a.txt'))
+
+    def test_counts_of_a_commit(self):
+        self.commit('ana', {'a.txt': 'a\nb\nc\n'})
+        self.commit('bob', {'a.txt': 'a\nB\nc\nd\n', 'b.txt': 'x\n'})
+        head = self.commit('ana', {'a.txt': 'a\nd\n'}, removed=['b.txt'])
+        result = self.replay('master')[1][head]
+        self.assertEqual((result.add_self, result.add_others, result.del_self, result.del_others), (0, 0, 1, 2))
+        self.assertEqual(result.loc, 1)
+        self.assertEqual(result.file_lines, {'a.txt': 1})
+
+    def test_rename_keeps_the_owners(self):
+        self.commit('ana', {'a.txt': 'a\nb\nc\nd\n'})
+        self.fixture.git('mv', 'a.txt', 'b.txt')
+        self.commit('bob', {'b.txt': 'a\nb\nc\nd\ne\n'})
+        (ownership, results) = self.replay('master')
+        state = ownership.states[self.fixture.head()]
+        self.assertEqual(list(state.files.keys()), ['b.txt'])
+        self.assertEqual(state.files['b.txt'][1], (('ana', 4), ('bob', 1)))
+
+    def test_merge_takes_the_lines_of_both_parents(self):
+        self.commit('ana', {'a.txt': 'a\nb\nc\n', 'b.txt': 'x\n'})
+        self.fixture.git('checkout', '-q', '-b', 'side')
+        self.commit('bob', {'b.txt': 'x\ny\n'})
+        self.fixture.git('checkout', '-q', 'master')
+        self.commit('eva', {'a.txt': 'a\nb\nc\nd\n'})
+        self.fixture.git('merge', '-q', '--no-ff', '-m', 'merge', 'side')
+        self.fixture.commits += 1
+        head = self.fixture.head()
+        self.authors[head] = 'eva'
+        (ownership, results) = self.replay('master')
+        state = ownership.states[head]
+        self.assertTrue(results[head].is_merge)
+        self.assertEqual(state.files['a.txt'][1], (('ana', 3), ('eva', 1)))
+        self.assertEqual(state.files['b.txt'][1], (('ana', 1), ('bob', 1)))
+
+    def test_resume_from_a_stored_state(self):
+        self.commit('ana', {'a.txt': 'a\nb\nc\n'})
+        middle = self.commit('bob', {'a.txt': 'a\nB\nc\nd\n'})
+        self.commit('eva', {'a.txt': 'a\nd\ne\n', 'b.txt': 'x\n'})
+        self.commit('ana', {'b.txt': 'x\ny\n'})
+        (ownership, results) = self.replay('master')
+        stored = OwnershipState.from_bytes(self.replay(middle)[0].states[middle].to_bytes())
+        (resumed, resumed_results) = self.replay('master', '^' + middle, states={middle: stored})
+        self.assertEqual(set(resumed_results.keys()), set(results.keys()) - set(self.replay(middle)[1].keys()))
+        for (hexsha, result) in resumed_results.items():
+            self.assertEqual(vars(result), vars(results[hexsha]))
+        head = self.fixture.head()
+        self.assertEqual(resumed.states[head].files, ownership.states[head].files)
+
+
+class ProducerTest(SimpleTestCase):
+
+    def test_end_is_put_when_closing_the_items_fails(self):
+        def items():
+            try:
+                yield 1
+                yield 2
+            finally:
+                raise RuntimeError('git failed')
+
+        queue = Queue(maxsize=1)
+        producer = Producer('reader', items(), queue)
+        producer.start()
+        self.assertEqual(queue.get(timeout=5), 1)
+        producer.stop()
+        producer.join(timeout=5)
+        self.assertFalse(producer.is_alive())
+        self.assertIsInstance(producer.error, RuntimeError)
+
+
+def metrics(state='analyzed', language='Python'):
+    return language, 10, 2, 3, 0, state, 1.5, 15, 'utf-8'
+
+
+class CopyValueTest(SimpleTestCase):
+
+    def test_values(self):
+        self.assertEqual(copy_value(None), '')
+        self.assertEqual(copy_value(''), '""')
+        self.assertEqual(copy_value(True), 't')
+        self.assertEqual(copy_value(3), '"3"')
+        self.assertEqual(copy_value('a "b", c'), '"a ""b"", c"')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'COPY is only used on PostgreSQL')
+@override_settings(CODICE_BULK_COPY=True)
+class BulkCopyTest(TestCase):
+
+    def test_objects_get_ids_from_the_sequence(self):
+        first = FileMetrics.objects.create(blob='0' * 40, name='a.py', version='1', state='analyzed')
+        objs = [FileMetrics(blob='{:040d}'.format(i), name='a.py', version='1', state='analyzed')
+                for i in range(1, 6)]
+        with BulkCreateManager(FileMetrics, chunk_size=2, use_copy=True) as manager:
+            for obj in objs:
+                manager.add(obj)
+        ids = [obj.id for obj in objs]
+        self.assertEqual(len(set(ids)), 5)
+        self.assertTrue(all(pk > first.id for pk in ids))
+        self.assertFalse(objs[0]._state.adding)
+        self.assertEqual(sorted(FileMetrics.objects.exclude(id=first.id).values_list('id', flat=True)), sorted(ids))
+        last = FileMetrics.objects.create(blob='9' * 40, name='a.py', version='1', state='analyzed')
+        self.assertGreater(last.id, max(ids))
+
+    def test_values_round_trip(self):
+        obj = FileMetrics(blob='a' * 40, name='say "hi", bye\n.py', version='', language=None, code=-1,
+                          state='analyzed', indent_complexity=0.25, encoding=None)
+        with BulkCreateManager(FileMetrics, use_copy=True) as manager:
+            manager.add(obj)
+        stored = FileMetrics.objects.get(id=obj.id)
+        self.assertEqual(stored.name, 'say "hi", bye\n.py')
+        self.assertEqual(stored.version, '')
+        self.assertIsNone(stored.language)
+        self.assertIsNone(stored.encoding)
+        self.assertEqual(stored.code, -1)
+        self.assertEqual(stored.indent_complexity, 0.25)
+
+
+class MetricsCacheTest(TestCase):
+
+    def setUp(self):
+        self.blobs = {'src/a.py': '1' * 40, 'lib/a.py': '1' * 40, 'src/b.txt': '1' * 40, 'c.py': '2' * 40}
+
+    def test_metrics_are_kept_by_blob_and_name(self):
+        cache = MetricsCache(self.blobs)
+        cache.add('src/a.py', metrics())
+        cache.save()
+        cache = MetricsCache(self.blobs)
+        self.assertEqual(cache.get('src/a.py'), (True, metrics()))
+        # the same blob and file name in another directory
+        self.assertEqual(cache.get('lib/a.py'), (True, metrics()))
+        # pygount could choose another language for another name
+        self.assertEqual(cache.get('src/b.txt'), (False, None))
+        self.assertEqual(cache.get('c.py'), (False, None))
+        self.assertEqual(cache.get('removed.py'), (True, None))
+
+    def test_other_indent_widths_are_measured_again(self):
+        cache = MetricsCache(self.blobs, indent_widths={'Python': 4})
+        cache.add('src/a.py', metrics())
+        cache.save()
+        self.assertEqual(MetricsCache(self.blobs, indent_widths={'Python': 4}).get('src/a.py'), (True, metrics()))
+        self.assertEqual(MetricsCache(self.blobs, indent_widths={'Python': 2}).get('src/a.py'), (False, None))
+        self.assertEqual(MetricsCache(self.blobs).get('src/a.py'), (False, None))
+
+    def test_errors_and_skipped_contents_are_not_kept(self):
+        cache = MetricsCache(self.blobs)
+        cache.add('src/a.py', metrics(state=ERROR_STATE))
+        cache.add('c.py', metrics(state=SKIPPED_STATE))
+        cache.add('removed.py', metrics())
+        cache.save()
+        self.assertEqual(FileMetrics.objects.count(), 0)
+
+    def test_long_names_are_not_saved(self):
+        name = 'x' * (MAX_NAME_LENGTH + 1) + '.py'
+        cache = MetricsCache({name: '3' * 40})
+        cache.add(name, metrics())
+        self.assertEqual(cache.get(name), (True, metrics()))
+        cache.save()
+        self.assertEqual(FileMetrics.objects.count(), 0)
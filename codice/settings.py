@@ -214,6 +214,38 @@ AUTH_USER_MODEL = 'authentication.User'
 ### Codice Params
 
 CODICE_HOT_SPOTS_THRESHOLD = 30
+CODICE_BLAME_WORKERS = int(os.environ.get('CODICE_BLAME_WORKERS', os.cpu_count() or 1))
+# 'history' computes line ownership from the diffs of one pass over the history,
+# 'blame' runs git blame on every changed file and approximates ownership from file changes
+CODICE_OWNERSHIP = os.environ.get('CODICE_OWNERSHIP', 'history')
+# temporal coupling ignores commits changing more files than CODICE_COUPLING_MAX_FILES (0 for no limit)
+# and keeps the CODICE_COUPLING_TOP files sharing at least CODICE_COUPLING_MIN_SHARED commits with each file
+CODICE_COUPLING_MAX_FILES = int(os.environ.get('CODICE_COUPLING_MAX_FILES', 50))
+CODICE_COUPLING_MIN_SHARED = int(os.environ.get('CODICE_COUPLING_MIN_SHARED', 1))
+CODICE_COUPLING_TOP = int(os.environ.get('CODICE_COUPLING_TOP', 20))
+# load the bulk created rows of the analysis with COPY when the database is PostgreSQL
+CODICE_BULK_COPY = os.environ.get('CODICE_BULK_COPY', 'true').lower() in ('true', '1', 'yes')
+# overlap reading the git history, measuring files and writing to the database
+CODICE_PIPELINE = os.environ.get('CODICE_PIPELINE', 'true').lower() in ('true', '1', 'yes')
+CODICE_PIPELINE_QUEUE_SIZE = int(os.environ.get('CODICE_PIPELINE_QUEUE_SIZE', 2000))
+# files are measured by CODICE_METRICS_WORKERS processes in batches of CODICE_METRICS_BATCH_SIZE paths
+CODICE_METRICS_WORKERS = int(os.environ.get('CODICE_METRICS_WORKERS', os.cpu_count() or 1))
+CODICE_METRICS_BATCH_SIZE = int(os.environ.get('CODICE_METRICS_BATCH_SIZE', 32))
+# histories longer than CODICE_PARTITION_COMMITS are ingested in ranges of that size by many workers, 0 disables it
+CODICE_PARTITION_COMMITS = int(os.environ.get('CODICE_PARTITION_COMMITS', 0))
+# spaces of an indentation level of the languages that don't use 4, as 'Ruby:2,YAML:2'
+CODICE_INDENT_WIDTHS = {language: int(width) for (language, width) in
+                        (item.rsplit(':', 1) for item in os.environ.get('CODICE_INDENT_WIDTHS', '').split(',') if item)}
+# files larger than CODICE_MAX_FILE_SIZE bytes are not measured, commits changing more than CODICE_MAX_COMMIT_FILES
+# files don't analyze their files and files longer than CODICE_MAX_BLAME_LINES are not blamed, 0 for no limit.
+# CODICE_MAX_BLAME_LINES only applies to the 'blame' CODICE_OWNERSHIP, 'history' never runs git blame
+CODICE_MAX_FILE_SIZE = int(os.environ.get('CODICE_MAX_FILE_SIZE', 5 * 1024 * 1024))
+CODICE_MAX_COMMIT_FILES = int(os.environ.get('CODICE_MAX_COMMIT_FILES', 5000))
+CODICE_MAX_BLAME_LINES = int(os.environ.get('CODICE_MAX_BLAME_LINES', 20000))
+# clones reuse the objects of a mirror of their url kept in the codice home
+CODICE_CLONE_MIRRORS = os.environ.get('CODICE_CLONE_MIRRORS', 'true').lower() in ('true', '1', 'yes')
+# filter of partial clones, such as 'blob:none', blobs are fetched when the analyzer reads them
+CODICE_CLONE_FILTER = os.environ.get('CODICE_CLONE_FILTER', '')
 CODICE_VERSION = "0.1.0"
 
 DEFAULT_ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
@@ -0,0 +1,66 @@
+# Generated by Django 3.1.14 on 2026-10-18 21:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repos', '0006_branch_last_commit'),
+        ('commits', '0004_commitblame'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchCommit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='repos.branch')),
+                ('commit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='commits.commit')),
+            ],
+            options={
+                'db_table': 'codice_branchcommit',
+                'unique_together': {('branch', 'commit')},
+            },
+        ),
+        migrations.AddField(
+            model_name='commitblame',
+            name='branch',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='repos.branch'),
+        ),
+        # statistics are kept by commit and branch, so they move to a table with its own primary key
+        migrations.CreateModel(
+            name='BranchCommitStatistic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('blame_loc', models.IntegerField()),
+                ('impact', models.FloatField(default=0.0)),
+                ('log_impact', models.FloatField(default=0.0)),
+                ('raw_churn', models.FloatField(default=0.0)),
+                ('self_churn', models.FloatField(default=0.0)),
+                ('churn', models.FloatField(default=0.0)),
+                ('raw_throughput', models.FloatField(default=0.0)),
+                ('self_throughput', models.FloatField(default=0.0)),
+                ('throughput', models.FloatField(default=0.0)),
+                ('ownership', models.FloatField(default=0.0)),
+                ('acum_lines', models.IntegerField()),
+                ('acum_insertions', models.IntegerField()),
+                ('acum_deletions', models.IntegerField()),
+                ('net_result', models.IntegerField()),
+                ('changes', models.IntegerField()),
+                ('add_self', models.IntegerField(default=0)),
+                ('del_self', models.IntegerField(default=0)),
+                ('add_others', models.IntegerField(default=0)),
+                ('del_others', models.IntegerField(default=0)),
+                ('work_self', models.FloatField(default=0.0)),
+                ('work_others', models.FloatField(default=0.0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='repos.branch')),
+                ('commit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='commits.commit')),
+            ],
+            options={
+                'db_table': 'codice_branchcommitstatistic',
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 3.1.14 on 2026-10-18 21:12
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+STATISTIC_FIELDS = ['date', 'blame_loc', 'impact', 'log_impact', 'raw_churn', 'self_churn', 'churn', 'raw_throughput',
+                    'self_throughput', 'throughput', 'ownership', 'acum_lines', 'acum_insertions', 'acum_deletions',
+                    'net_result', 'changes', 'add_self', 'del_self', 'add_others', 'del_others', 'work_self',
+                    'work_others']
+
+
+def share_commits(apps, schema_editor):
+    """keep one commit per repository and hexsha, the branches of the repeated ones become memberships"""
+    Commit = apps.get_model('commits', 'Commit')
+    BranchCommit = apps.get_model('commits', 'BranchCommit')
+    CommitBlame = apps.get_model('commits', 'CommitBlame')
+    CommitStatistic = apps.get_model('commits', 'CommitStatistic')
+    BranchCommitStatistic = apps.get_model('commits', 'BranchCommitStatistic')
+    FileChange = apps.get_model('files', 'FileChange')
+    FileBlame = apps.get_model('files', 'FileBlame')
+
+    CommitBlame.objects.update(branch_id=Subquery(Commit.objects.filter(id=OuterRef('commit_id')).values('branch_id')))
+    statistics = []
+    for cs in CommitStatistic.objects.select_related('commit').iterator():
+        statistics.append(BranchCommitStatistic(commit_id=cs.commit_id, branch_id=cs.commit.branch_id,
+                                                **{field: getattr(cs, field) for field in STATISTIC_FIELDS}))
+    BranchCommitStatistic.objects.bulk_create(statistics, batch_size=1000)
+
+    rows = Commit.objects.order_by('id').values_list('id', 'repository_id', 'hexsha', 'branch_id').iterator()
+    (memberships, repeated, duplicated) = merge_commits(rows)
+    BranchCommit.objects.bulk_create([BranchCommit(branch_id=branch_id, commit_id=keeper)
+                                      for (branch_id, keeper) in memberships], batch_size=1000)
+
+    for (keeper, commit_ids) in repeated.items():
+        for model in (CommitBlame, BranchCommitStatistic, FileChange, FileBlame):
+            model.objects.filter(commit_id__in=commit_ids).update(commit_id=keeper)
+        Commit.objects.filter(id__in=commit_ids).delete()
+    # with their changes, blames and statistics, the branch has those of the commit kept
+    for i in range(0, len(duplicated), 1000):
+        Commit.objects.filter(id__in=duplicated[i:i + 1000]).delete()
+
+
+def merge_commits(rows):
+    """merge the (id, repository_id, hexsha, branch_id) rows of commits, the first commit of every hexsha is kept
+
+    :return the (branch_id, kept id) memberships, the ids of the commits repeated in other branches by the id kept
+    and the ids of the commits a branch stored twice, for instance when a clone was retried
+    """
+    kept = dict()
+    memberships = []
+    seen = set()
+    repeated = dict()
+    duplicated = []
+    for (commit_id, repository_id, hexsha, branch_id) in rows:
+        keeper = kept.setdefault((repository_id, hexsha), commit_id)
+        if (branch_id, keeper) in seen:
+            duplicated.append(commit_id)
+            continue
+        seen.add((branch_id, keeper))
+        memberships.append((branch_id, keeper))
+        if keeper != commit_id:
+            repeated.setdefault(keeper, []).append(commit_id)
+    return memberships, repeated, duplicated
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_filemetrics'),
+        ('commits', '0005_branchcommit'),
+    ]
+
+    operations = [
+        migrations.RunPython(share_commits, migrations.RunPython.noop),
+    ]
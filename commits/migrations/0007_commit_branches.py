@@ -0,0 +1,48 @@
+# Generated by Django 3.1.14 on 2026-10-18 21:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repos', '0006_branch_last_commit'),
+        ('commits', '0006_share_commits'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CommitStatistic',
+        ),
+        migrations.RenameModel(
+            old_name='BranchCommitStatistic',
+            new_name='CommitStatistic',
+        ),
+        migrations.AlterModelTable(
+            name='commitstatistic',
+            table='codice_commitstatistic',
+        ),
+        migrations.AlterUniqueTogether(
+            name='commitstatistic',
+            unique_together={('commit', 'branch')},
+        ),
+        migrations.AlterField(
+            model_name='commitblame',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='repos.branch'),
+        ),
+        migrations.RemoveField(
+            model_name='commit',
+            name='branch',
+        ),
+        migrations.AddField(
+            model_name='commit',
+            name='branches',
+            field=models.ManyToManyField(related_name='commits', through='commits.BranchCommit', to='repos.Branch'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='commit',
+            unique_together={('repository', 'hexsha')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commits', '0007_commit_branches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commit',
+            name='skipped',
+            field=models.BooleanField(default=False),
+        ),
+    ]
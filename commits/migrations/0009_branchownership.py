@@ -0,0 +1,27 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repos', '0009_path_rules'),
+        ('commits', '0008_skipped'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BranchOwnership',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hexsha', models.CharField(max_length=40)),
+                ('state', models.BinaryField()),
+                ('branch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='repos.branch')),
+            ],
+            options={
+                'db_table': 'codice_branchownership',
+            },
+        ),
+    ]
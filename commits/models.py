@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Min
 
 from developers.models import Developer
 from repos.models import Branch, Repository
@@ -13,7 +14,9 @@ class Commit(models.Model):
     deletions = models.IntegerField()
     net = models.IntegerField()
     is_merge = models.BooleanField(default=False)
-    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    # the commit changed too many files to analyze them
+    skipped = models.BooleanField(default=False)
+    branches = models.ManyToManyField(Branch, through='BranchCommit', related_name='commits')
     author = models.ForeignKey(Developer, on_delete=models.CASCADE)
     repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
     original_author = models.ForeignKey(Developer, related_name='original_author',
@@ -24,14 +27,35 @@ class Commit(models.Model):
 
     class Meta:
         db_table = 'codice_commit'
+        unique_together = (('repository', 'hexsha'),)
 
     def __str__(self):
         return "{} @ {}: {}".format(self.hexsha[-6:], self.date,  self.message[:20])
 
+    def get_file_changes(self):
+        """the changes of the commit, one per file, a commit shared by branches has the changes of every branch"""
+        first_changes = self.filechange_set.order_by().values('file__filename').annotate(first=Min('id'))\
+            .values('first')
+        return self.filechange_set.filter(id__in=first_changes).select_related('file').order_by('id')
+
+    def count_file_changes(self):
+        return self.filechange_set.order_by().values('file__filename').distinct().count()
+
+
+class BranchCommit(models.Model):
+    """a commit belongs to every branch it is reachable from, commits shared by branches are stored once"""
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
+    commit = models.ForeignKey(Commit, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'codice_branchcommit'
+        unique_together = (('branch', 'commit'),)
+
 
 class CommitStatistic(models.Model):
     date = models.DateTimeField()
-    commit = models.OneToOneField(Commit, on_delete=models.CASCADE, primary_key=True)
+    commit = models.ForeignKey(Commit, on_delete=models.CASCADE)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
     blame_loc = models.IntegerField()
     impact = models.FloatField(default=0.0)
     log_impact = models.FloatField(default=0.0)
@@ -56,6 +80,7 @@ class CommitStatistic(models.Model):
 
     class Meta:
         db_table = 'codice_commitstatistic'
+        unique_together = (('commit', 'branch'),)
 
     def author(self):
         return self.commit.author
@@ -70,6 +95,17 @@ class CommitBlame(models.Model):
     date = models.DateTimeField()
     author = models.ForeignKey(Developer, on_delete=models.CASCADE)
     commit = models.ForeignKey(Commit, on_delete=models.CASCADE)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
 
     class Meta:
         db_table = 'codice_commitblame'
+
+
+class BranchOwnership(models.Model):
+    """the owners of the lines of every file at the last analyzed commit of a branch, so updates resume from it"""
+    branch = models.OneToOneField(Branch, on_delete=models.CASCADE)
+    hexsha = models.CharField(max_length=40)
+    state = models.BinaryField()
+
+    class Meta:
+        db_table = 'codice_branchownership'
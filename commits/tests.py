@@ -1,3 +1,22 @@
-from django.test import TestCase
+import importlib
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+share_commits = importlib.import_module('commits.migrations.0006_share_commits')
+
+
+class MergeCommitsTest(SimpleTestCase):
+
+    def test_commits_of_many_branches_are_kept_once(self):
+        rows = [(1, 1, 'aaa', 10), (2, 1, 'bbb', 10), (3, 1, 'aaa', 20), (4, 2, 'aaa', 30)]
+        (memberships, repeated, duplicated) = share_commits.merge_commits(rows)
+        self.assertEqual(memberships, [(10, 1), (10, 2), (20, 1), (30, 4)])
+        self.assertEqual(repeated, {1: [3]})
+        self.assertEqual(duplicated, [])
+
+    def test_commits_stored_twice_by_a_branch_are_dropped(self):
+        rows = [(1, 1, 'aaa', 10), (2, 1, 'aaa', 20), (3, 1, 'aaa', 20), (4, 1, 'aaa', 10)]
+        (memberships, repeated, duplicated) = share_commits.merge_commits(rows)
+        self.assertEqual(memberships, [(10, 1), (20, 1)])
+        self.assertEqual(repeated, {1: [2]})
+        self.assertEqual(duplicated, [3, 4])
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('developers', '0003_auto_20210216_2326'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blame',
+            name='analyzed_commits',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='blame',
+            name='edited',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='blame',
+            name='files_added',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='blame',
+            name='files_changed',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='blame',
+            name='files_removed',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='blame',
+            name='interesting_lines',
+            field=models.IntegerField(null=True),
+        ),
+    ]
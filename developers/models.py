@@ -53,6 +53,13 @@ class Blame(models.Model):
     throughput = models.FloatField(default=0.0)
     work_self = models.FloatField(default=0.0)
     work_others = models.FloatField(default=0.0)
+    # totals of the analyzed commits of the author, updates add those of new commits, None until computed
+    analyzed_commits = models.IntegerField(null=True)
+    edited = models.IntegerField(null=True)
+    files_changed = models.IntegerField(null=True)
+    files_added = models.IntegerField(null=True)
+    files_removed = models.IntegerField(null=True)
+    interesting_lines = models.IntegerField(null=True)
     author = models.ForeignKey(Developer, on_delete=models.CASCADE)
     repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE)
@@ -2,9 +2,10 @@ import numpy
 from django.db.models import Sum, Max, Value, Avg, F, Count, Min
 from django.db.models.functions import TruncDate
 
-from commits.models import CommitBlame, Commit, CommitStatistic
+from commits.models import CommitBlame, Commit, CommitStatistic, BranchOwnership
 from developers.models import Blame
 from files.models import FileChange
+from repos.models import Branch
 
 
 def change_alias_of(dev, alias):
@@ -16,6 +17,11 @@ def change_alias_of(dev, alias):
 
     dev.is_alias_of = alias
     dev.save()
+    # the stored owners of the lines and totals of the authors are those of the previous authors, the next update
+    # reads the whole history again and computes the statistics of every commit
+    branches = Branch.objects.filter(commits__original_author=dev)
+    BranchOwnership.objects.filter(branch__in=branches).delete()
+    Blame.objects.filter(branch__in=branches).update(analyzed_commits=None)
 
     if alias:
         blames = alias.blame_set.all()
@@ -24,12 +30,12 @@ def change_alias_of(dev, alias):
             branch = blame.branch
 
             # change for original
-            commits = blame.repository.commit_set.filter(branch=branch, author=dev).order_by('-date')
+            commits = blame.repository.commit_set.filter(branches=branch, author=dev).order_by('-date')
             total_blame, total_insertions, total_deletions = calc_total_blame(repo, branch)
             update_blame_object(blame, commits, total_blame, total_insertions, total_deletions)
 
             # change for alias
-            commits = blame.repository.commit_set.filter(branch=branch, author=alias).order_by('-date')
+            commits = blame.repository.commit_set.filter(branches=branch, author=alias).order_by('-date')
             total_blame, total_insertions, total_deletions = calc_total_blame(repo, branch)
             update_blame_object(blame, commits, total_blame, total_insertions, total_deletions)
 
@@ -40,7 +46,7 @@ def calc_total_blame(repository, branch):
     """return the total blame for a repository"""
     blames = Blame.objects.filter(repository=repository, branch=branch)\
         .aggregate(total=Sum('loc'))
-    commits = Commit.objects.filter(repository=repository, branch=branch)\
+    commits = Commit.objects.filter(repository=repository, branches=branch)\
         .aggregate(insertions=Sum('insertions'), deletions=Sum('deletions'))
     return blames['total'], commits['insertions'], commits['deletions']
 
@@ -80,7 +86,7 @@ def update_blame_object(blame, commits, total_blame, total_insertions, total_del
         edited = 0
         added = 0
         removed = 0
-        for fc in com.filechange_set.all():
+        for fc in com.filechange_set.filter(branch=blame.branch):
             if fc.change_type == 'A' or fc.change_type == 'C':
                 added = fc.insertions
                 files_added += 1
@@ -112,13 +118,14 @@ def update_blame_object(blame, commits, total_blame, total_insertions, total_del
         insertions = insertions + com.insertions
         deletions = deletions + com.deletions
         net = net + com.net
-        commit_total_blame = com.commitblame_set.aggregate(total=Sum('loc'))['total'] or 0
-        nc = com.filechange_set.count()
+        commit_blames = com.commitblame_set.filter(branch=blame.branch)
+        commit_total_blame = commit_blames.aggregate(total=Sum('loc'))['total'] or 0
+        nc = com.filechange_set.filter(branch=blame.branch).count()
         b = None
         pb = None
         try:
-            b = com.commitblame_set.get(author=com.author)
-            pb = CommitBlame.objects.filter(date__lt=b.date, author=com.author).order_by('-date').first() if b else None
+            b = commit_blames.get(author=com.author)
+            pb = CommitBlame.objects.filter(date__lt=b.date, author=com.author, branch=blame.branch).order_by('-date').first() if b else None
         except CommitBlame.DoesNotExist:
             pass
         bloc = b.loc if b else 0
@@ -136,7 +143,7 @@ def update_blame_object(blame, commits, total_blame, total_insertions, total_del
         ownership = bloc / commit_total_blame if commit_total_blame else 0.0
         raw_throughput = abs(com.net) / com.lines if com.lines else 1.0
 
-        rcb = com.commitblame_set.aggregate(sum_add_self=Sum('add_self'), sum_add_others=Sum('add_others'),
+        rcb = commit_blames.aggregate(sum_add_self=Sum('add_self'), sum_add_others=Sum('add_others'),
                                             sum_del_self=Sum('del_self'), sum_del_others=Sum('del_others'))
         sum_add_self = rcb['sum_add_self']
         sum_del_self = rcb['sum_del_self']
@@ -155,7 +162,7 @@ def update_blame_object(blame, commits, total_blame, total_insertions, total_del
         work_self = (sum_add_self+sum_del_self) / dsc if dsc > 0 else 1.0
         work_others = 1.0 - work_self
         try:
-            cs = CommitStatistic.objects.get(commit=com)
+            cs = CommitStatistic.objects.get(commit=com, branch=blame.branch)
             cs.raw_throughput = raw_throughput
             cs.raw_churn = raw_churn
             cs.impact = impact
@@ -177,7 +184,7 @@ def update_blame_object(blame, commits, total_blame, total_insertions, total_del
             cs.throughput = (0.3*cs.raw_throughput + 0.7*cs.self_throughput)
 
         except CommitStatistic.DoesNotExist:
-            CommitStatistic.objects.create(commit=com, date=com.date, ownership=ownership, changes=nc,
+            CommitStatistic.objects.create(commit=com, branch=blame.branch, date=com.date, ownership=ownership, changes=nc,
                                            raw_throughput=raw_throughput, raw_churn=raw_churn, impact=impact,
                                            log_impact=log_impact, acum_lines=lines, acum_insertions=insertions,
                                            acum_deletions=deletions, blame_loc=bloc, net_result=net,
@@ -320,7 +327,7 @@ def get_developer_blame_summary(dev, repos, branches, total_blame, enabled_only=
 
 
 def get_developer_commits(dev, repos, branches):
-    commits = Commit.objects.filter(repository__in=repos, author=dev, branch__in=branches)
+    commits = Commit.objects.filter(repository__in=repos, author=dev, branches__in=branches)
     return commits
 
 
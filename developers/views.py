@@ -50,12 +50,12 @@ class DeveloperList(DeveloperMixin, ListView):
         if 'repo_id' in self.kwargs:
             self.repos = Repository.objects.filter(id=self.kwargs['repo_id'])
             self.branches = get_default_branches_for_repos(self.repos)
-            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branch__in=self.branches,
+            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branches__in=self.branches,
                                                  is_alias_of__isnull=True, enabled=True).distinct()
         else:
             self.repos = Repository.objects.filter(owner=self.owner)
             self.branches = get_default_branches_for_repos(self.repos)
-            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branch__in=self.branches,
+            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branches__in=self.branches,
                                                  is_alias_of__isnull=True, enabled=True).distinct()
 
         blame_aggregate = Blame.objects.filter(author__in=self.devs.all(), repository__in=self.repos,
@@ -167,13 +167,13 @@ class DeveloperDashboard(DeveloperMixin, ListView):
             self.repo = Repository.objects.get(pk=self.kwargs['repo_id'])
             self.repos = [self.repo]
             self.branches = get_default_branches_for_repos(self.repos)
-            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branch__in=self.branches,
+            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branches__in=self.branches,
                                                  is_alias_of__isnull=True, enabled=True).distinct()
         else:
             self.repo = None
             self.repos = Repository.objects.filter(owner=self.owner)
             self.branches = get_default_branches_for_repos(self.repos)
-            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branch__in=self.branches,
+            self.devs = Developer.objects.filter(commit__repository__in=self.repos, commit__branches__in=self.branches,
                                                  is_alias_of__isnull=True, enabled=True).distinct()
 
         blame_aggregate = Blame.objects.filter(author__in=self.devs.all(), repository__in=self.repos,
@@ -285,7 +285,7 @@ class DeveloperProfile(DeveloperMixin, DetailView):
             fd = FileChange.objects.filter(repository=repo, branch=branch, commit__author=self.object,
                                            change_type__in=["D"]).distinct().count()
             files_deleted += fd
-            co = Commit.objects.filter(repository=repo, author=self.object, branch=branch).count()
+            co = Commit.objects.filter(repository=repo, author=self.object, branches=branch).count()
             cod = Blame.objects.filter(repository=repo, author=self.object, branch=branch) \
                 .aggregate(commits=Sum('commits'), changes=Sum('changes'),
 
@@ -307,7 +307,7 @@ class DeveloperProfile(DeveloperMixin, DetailView):
 
         context['commits_per_day'] = commit_count / active_days if active_days > 0 else 0
 
-        context['total_days'] = Commit.objects.filter(repository__in=self.repos, branch__in=self.branches) \
+        context['total_days'] = Commit.objects.filter(repository__in=self.repos, branches__in=self.branches) \
             .annotate(only_date=TruncDate('date')) \
             .aggregate(days=Count('only_date', distinct=True))['days']
 
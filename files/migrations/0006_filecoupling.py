@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_fileknowledge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileCoupling',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shared_commits', models.IntegerField()),
+                ('degree', models.FloatField()),
+                ('coupled_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='files.file')),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='couplings', to='files.file')),
+            ],
+            options={
+                'db_table': 'codice_filecoupling',
+                'unique_together': {('file', 'coupled_file')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0006_filecoupling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileMetrics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blob', models.CharField(max_length=40, unique=True)),
+                ('language', models.CharField(max_length=40, null=True)),
+                ('code', models.IntegerField(default=0)),
+                ('doc', models.IntegerField(default=0)),
+                ('blanks', models.IntegerField(default=0)),
+                ('strings', models.IntegerField(default=0)),
+                ('state', models.CharField(max_length=20)),
+                ('indent_complexity', models.FloatField(default=0)),
+                ('lines', models.IntegerField(default=0)),
+                ('encoding', models.CharField(max_length=40, null=True)),
+            ],
+            options={
+                'db_table': 'codice_filemetrics',
+            },
+        ),
+    ]
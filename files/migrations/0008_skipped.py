@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_filemetrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='skipped',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.1.14 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+
+def clear_metrics(apps, schema_editor):
+    # metrics were cached by blob only, some of them with the pygount state stored as 'SourceState.<name>',
+    # they are measured again with the name and version of the new key
+    FileMetrics = apps.get_model('files', 'FileMetrics')
+    FileMetrics.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_skipped'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_metrics, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='filemetrics',
+            name='blob',
+            field=models.CharField(max_length=40),
+        ),
+        migrations.AddField(
+            model_name='filemetrics',
+            name='name',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='filemetrics',
+            name='version',
+            field=models.CharField(default='', max_length=40),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='filemetrics',
+            unique_together={('blob', 'name', 'version')},
+        ),
+    ]
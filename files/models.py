@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models import Count, F
+from django.db.models import Count
 from django.utils.functional import cached_property
 
 from commits.models import Commit
@@ -39,6 +39,8 @@ class File(models.Model):
     binary = models.BooleanField(default=False)
     empty = models.BooleanField(default=False)
     exists = models.BooleanField(default=True)
+    # the file was too large to measure
+    skipped = models.BooleanField(default=False)
     lines = models.IntegerField(default=0)
     coupled_files = models.IntegerField(default=0)
     soc = models.IntegerField(default=0)
@@ -78,23 +80,8 @@ class File(models.Model):
             .order_by('-date').all()
         return commits
 
-    def calc_temporal_coupling(self, commits):
-        return self.get_coupled_files(commits).count()
-
-    def get_coupled_files(self, commits):
-        return File.objects.filter(
-            filechange__commit__in=commits
-        ).exclude(
-            pk=self.pk
-        ).annotate(
-            num_commits=Count(F('filechange__commit') / len(commits)),
-        ).order_by(
-            '-num_commits'
-        )
-
-    # sum of temporal coupling, as defined by Tornhill, chapter 8, page 78
-    def calc_soc(self, commits):
-        return File.objects.filter(filechange__commit__in=commits).exclude(pk=self.pk).count()
+    def get_coupled_files(self):
+        return self.couplings.select_related('coupled_file').order_by('-degree', '-shared_commits')
 
     def get_last_change(self):
         return self.filechange_set.last()
@@ -161,3 +148,33 @@ class FileKnowledge(models.Model):
     knowledge = models.FloatField()
     file = models.ForeignKey(File, on_delete=models.CASCADE)
     author = models.ForeignKey(Developer, on_delete=models.CASCADE)
+
+
+class FileCoupling(models.Model):
+    shared_commits = models.IntegerField()
+    degree = models.FloatField()
+    file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='couplings')
+    coupled_file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        db_table = 'codice_filecoupling'
+        unique_together = (('file', 'coupled_file'),)
+
+
+class FileMetrics(models.Model):
+    blob = models.CharField(max_length=40)
+    name = models.CharField(max_length=255)
+    version = models.CharField(max_length=40)
+    language = models.CharField(max_length=40, null=True)
+    code = models.IntegerField(default=0)
+    doc = models.IntegerField(default=0)
+    blanks = models.IntegerField(default=0)
+    strings = models.IntegerField(default=0)
+    state = models.CharField(max_length=20)
+    indent_complexity = models.FloatField(default=0)
+    lines = models.IntegerField(default=0)
+    encoding = models.CharField(max_length=40, null=True)
+
+    class Meta:
+        db_table = 'codice_filemetrics'
+        unique_together = (('blob', 'name', 'version'),)
@@ -1,15 +1,18 @@
 from pathlib import Path
 
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
 from django.db.models import Count
 from django.views.generic import ListView, DetailView
+from git import GitError
 
 from developers.models import Developer
+from git_interface.gitobjects import GitRepository
 from files.models import File
 from repos.models import Repository
 from repos.services import get_default_branches_for_repos
-from tools.encoding import detect_encoding
+from tools.encoding import detect_encoding_of
 
 
 class FileMixin(LoginRequiredMixin):
@@ -99,17 +102,17 @@ class FileView(FileMixin, DetailView):
             raise PermissionDenied
 
         repo = file.repository
-        path = Path(repo.base_directory) / Path(file.filename)
         context['path'] = Path(file.filename)
         try:
-            encoding = detect_encoding(path)
-            with open(path, 'r', newline='', encoding=encoding, errors='ignore') as source:
-                context['content'] = source.read()
-        except IOError:
+            git_repo = GitRepository(repo.base_directory)
+            rev = file.branch.last_commit or git_repo.resolve_branch(file.branch.name)
+            data = git_repo.read_file(rev, file.filename)
+            context['content'] = data.decode(detect_encoding_of(data) or 'utf-8', errors='ignore')
+        except (GitError, LookupError):
             context['content'] = "ERROR"
-        coupled_files = file.get_coupled_files(file.commits)
-        context['count_coupled_files'] = len(coupled_files)
-        context['coupled_files'] = coupled_files
+        context['count_coupled_files'] = file.coupled_files
+        context['coupled_files'] = file.get_coupled_files()
+        context['coupled_files_limit'] = settings.CODICE_COUPLING_TOP
         context['authors'] = file.get_authors
         context['creator'] = file.get_creator
 
@@ -0,0 +1,52 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from git import Git, GitCommandError
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_incremental_blame(output):
+    """count the lines of each author email in the output of `git blame --incremental`"""
+    emails = dict()
+    counts = Counter()
+    sha = None
+    num_lines = 0
+    for line in output.splitlines():
+        if sha is None:
+            # group header: '<sha> <source line> <result line> <num lines>'
+            parts = line.split()
+            sha = parts[0]
+            num_lines = int(parts[3])
+        elif line.startswith('author-mail '):
+            emails[sha] = line[len('author-mail '):].strip('<>')
+        elif line.startswith('filename '):
+            # last line of every group
+            counts[emails.get(sha, '')] += num_lines
+            sha = None
+    return counts
+
+
+class BlameService(object):
+
+    """Run git blame for many (rev, filename) pairs on a bounded pool of workers"""
+    def __init__(self, base_dir: str, workers=1):
+        self.git = Git(base_dir)
+        self.workers = max(1, workers)
+
+    def count_lines(self, rev, filename):
+        """:return a Counter of lines by author email, or None if the file can't be blamed"""
+        try:
+            output = self.git.blame(rev, '--incremental', '--', filename)
+        except GitCommandError:
+            return None
+        return parse_incremental_blame(output)
+
+    def count_lines_of_all(self, requests):
+        """:return the result of count_lines for every (rev, filename) in requests, in the same order"""
+        if self.workers == 1 or len(requests) < 2:
+            return [self.count_lines(rev, filename) for (rev, filename) in requests]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda request: self.count_lines(*request), requests))
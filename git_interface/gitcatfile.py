@@ -0,0 +1,58 @@
+import subprocess
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobReader(object):
+
+    """Read objects from the object database of a repository through one long-lived `git cat-file --batch`
+
+    objects are named by sha or by '<rev>:<path>', the same reader can be shared by many threads
+    """
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.process = None
+        self.lock = threading.Lock()
+
+    def read_limited(self, name, max_size=0):
+        """:return (size, content) of an object, content is None if it is larger than max_size bytes,
+        both are None if it doesn't exist. 0 means no limit
+        """
+        with self.lock:
+            if self.process is None:
+                self.process = subprocess.Popen(['git', '-C', self.base_dir, 'cat-file', '--batch'],
+                                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            self.process.stdin.write(name.encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+            # '<sha> <type> <size>' or '<name> missing'
+            header = self.process.stdout.readline().split()
+            if len(header) != 3:
+                return None, None
+            size = int(header[2])
+            if max_size and size > max_size:
+                # the content is in the pipe anyway, it is discarded without keeping it in memory
+                remaining = size + 1
+                while remaining > 0:
+                    chunk = self.process.stdout.read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                return size, None
+            data = self.process.stdout.read(size)
+            self.process.stdout.read(1)
+            return size, data
+
+    def close(self):
+        with self.lock:
+            if self.process is not None:
+                self.process.stdin.close()
+                self.process.wait()
+                self.process.stdout.close()
+                self.process = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
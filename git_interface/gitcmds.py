@@ -1,3 +1,5 @@
+import fcntl
+import hashlib
 import os
 import shutil
 from pathlib import Path
@@ -11,26 +13,80 @@ else:
 
 codice_home = home / Path('.codice')
 users_home = codice_home / Path('users')
+mirrors_home = codice_home / Path('mirrors')
+shared_home = codice_home / Path('shared')
 
+GIT_ENV = {'GIT_SSL_NO_VERIFY': '1'}
 
-def clone_repository(owner_id, repository_name, repository_url):
-    """clone a remote repository"""
-    base_path = users_home / Path(str(owner_id))
+
+def update_mirror(mirror_key, repository_url):
+    """fetch the branches and tags of a remote repository into its mirror, :return the path of the mirror
+
+    mirrors are shared by every clone of the same url through alternates, so they never store credentials
+    and never collect garbage, objects unreachable in the mirror could still be used by a clone
+    """
+    mirror_path = mirrors_home / Path(hashlib.sha1(mirror_key.encode('utf-8')).hexdigest())
+    if not mirrors_home.exists():
+        mirrors_home.mkdir(parents=True, exist_ok=True)
+    with open(str(mirror_path) + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if mirror_path.exists():
+            mirror = Repo(str(mirror_path))
+        else:
+            mirror = Repo.init(str(mirror_path), bare=True)
+            with mirror.config_writer() as config:
+                config.set_value('gc', 'auto', '0')
+                config.set_value('gc', 'pruneExpire', 'never')
+        mirror.git.fetch(repository_url, '+refs/heads/*:refs/heads/*', '+refs/tags/*:refs/tags/*', env=GIT_ENV)
+    return str(mirror_path)
+
+
+def shared_repository_path(shared_key):
+    """the path of the clone shared by every repository of the same url, it doesn't depend on any owner"""
+    return shared_home / Path(hashlib.sha1(shared_key.encode('utf-8')).hexdigest())
+
+
+def clone_repository(owner_id, repository_name, repository_url, mirror_key=None, blob_filter=None, shared_key=None):
+    """clone a remote repository
+
+    with a mirror_key the objects are fetched once into a mirror shared by the clones of the same url,
+    blob_filter makes a partial clone, for instance 'blob:none', and blobs are fetched when they are read.
+    With a shared_key the clone is shared by the repositories of every owner with that key, it must not store
+    credentials
+    """
+    if shared_key:
+        base_path = shared_home
+        repository_path = shared_repository_path(shared_key)
+    else:
+        base_path = users_home / Path(str(owner_id))
+        repository_path = base_path / Path('repos') / Path(repository_name)
     print(base_path)
     if not base_path.exists():
-        base_path.mkdir(parents=True)
-    repository_path = base_path / Path('repos') / Path(repository_name)
+        base_path.mkdir(parents=True, exist_ok=True)
     print("repository_path = {}".format(repository_path))
     print("repository_url = {}".format(repository_url))
-    if not repository_path.exists():
-        Repo.clone_from(repository_url, str(repository_path), env={'GIT_SSL_NO_VERIFY': '1'})
+    with open(str(repository_path) + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not repository_path.exists():
+            options = dict()
+            if mirror_key:
+                options['reference'] = update_mirror(mirror_key, repository_url)
+            if blob_filter:
+                options['filter'] = blob_filter
+            # files are read from the object database, the working tree is never checked out
+            Repo.clone_from(repository_url, str(repository_path), no_checkout=True, env=GIT_ENV, **options)
     return str(repository_path)
 
 
-def remove_local_repository(owner_id, repository_name):
-    """remove a local repository"""
-    base_path = users_home / Path(str(owner_id))
-    repository_path = base_path / Path('repos') / Path(repository_name)
+def remove_local_repository(owner_id, repository_name, repository_path=None):
+    """remove a local repository, shared clones are removed by their repository_path"""
+    if repository_path and Path(repository_path).parent == shared_home:
+        repository_path = Path(repository_path)
+    else:
+        repository_path = users_home / Path(str(owner_id)) / Path('repos') / Path(repository_name)
     if repository_path.exists():
         shutil.rmtree(str(repository_path), ignore_errors=False)
+    lock_path = Path(str(repository_path) + '.lock')
+    if lock_path.exists():
+        lock_path.unlink()
     return str(repository_path)
\ No newline at end of file
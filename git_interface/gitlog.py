@@ -0,0 +1,229 @@
+import codecs
+from datetime import datetime
+
+# one `git log` record per commit: header fields are separated by US (0x1f) and each header starts
+# with RS (0x1e), raw and numstat entries that follow are NUL terminated because of -z
+LOG_FORMAT = '%x1e%H%x1f%P%x1f%an%x1f%ae%x1f%aI%x1f%B'
+LOG_OPTIONS = ['-z', '--raw', '--numstat', '--no-abbrev', '--diff-merges=first-parent']
+
+HEADER_MARK = '\x1e'
+FIELD_MARK = '\x1f'
+READ_SIZE = 64 * 1024
+
+
+class GitCommitRecord(object):
+
+    """A commit read from the git log stream, with the file changes against its first parent"""
+    def __init__(self, hexsha, parents, author_name, author_email, authored_datetime, message):
+        self.hexsha = hexsha
+        self.parents = parents
+        self.author_name = author_name
+        self.author_email = author_email
+        self.authored_datetime = authored_datetime
+        self.message = message
+        self.files = dict()
+        self.renamed_from = dict()
+
+    def __str__(self):
+        return self.hexsha
+
+    def add_change(self, filename, change_type):
+        fc = self.__get_file(filename)
+        fc['change_type'] = change_type
+
+    def add_stat(self, filename, insertions, deletions):
+        fc = self.__get_file(filename)
+        fc['insertions'] = insertions
+        fc['deletions'] = deletions
+        fc['lines'] = insertions + deletions
+
+    @property
+    def total(self):
+        """same totals as GitPython Stats.total"""
+        result = {'insertions': 0, 'deletions': 0, 'lines': 0, 'files': len(self.files)}
+        for fc in self.files.values():
+            result['insertions'] += fc['insertions']
+            result['deletions'] += fc['deletions']
+            result['lines'] += fc['lines']
+        return result
+
+    def keep_files(self, analyzed):
+        """drop the changes of the files not analyzed, so they don't count in the totals"""
+        self.files = {filename: fc for (filename, fc) in self.files.items() if analyzed(filename)}
+        self.renamed_from = {filename: source for (filename, source) in self.renamed_from.items()
+                             if filename in self.files}
+
+    def __get_file(self, filename):
+        if filename not in self.files:
+            self.files[filename] = {'insertions': 0, 'deletions': 0, 'lines': 0, 'change_type': ''}
+        return self.files[filename]
+
+
+def parse_header(token):
+    hexsha, parents, name, email, date, message = token.split(FIELD_MARK, 5)
+    return GitCommitRecord(
+        hexsha=hexsha,
+        parents=parents.split(),
+        author_name=name,
+        author_email=email,
+        authored_datetime=datetime.fromisoformat(date),
+        message=message
+    )
+
+
+def parse_count(value):
+    # binary files are reported as '-'
+    return int(value) if value.isdigit() else 0
+
+
+def read_tokens(stream):
+    """yield NUL separated tokens from a byte stream without reading it all in memory"""
+    pending = b''
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        pending += data
+        tokens = pending.split(b'\0')
+        pending = tokens.pop()
+        for token in tokens:
+            yield token.decode('utf-8', errors='replace')
+    if pending:
+        yield pending.decode('utf-8', errors='replace')
+
+
+def parse_log(stream):
+    """parse the output of `git log` run with LOG_FORMAT and LOG_OPTIONS, yield GitCommitRecord objects"""
+    tokens = read_tokens(stream)
+    record = None
+    for token in tokens:
+        token = token.lstrip('\n')
+        if token.startswith(HEADER_MARK):
+            if record is not None:
+                yield record
+            record = parse_header(token[1:])
+        elif record is None or token == '':
+            continue
+        elif token.startswith(':'):
+            # raw entry, ':<mode> <mode> <sha> <sha> <status>' followed by one or two paths
+            status = token.split()[-1]
+            change_type = status[0]
+            filename = next(tokens)
+            if change_type in ('R', 'C'):
+                source = filename
+                filename = next(tokens)
+                if change_type == 'R':
+                    record.renamed_from[filename] = source
+            record.add_change(filename, change_type)
+        else:
+            # numstat entry, '<insertions>\t<deletions>\t<path>', path is empty for renames and copies
+            insertions, deletions, filename = token.split('\t', 2)
+            if filename == '':
+                next(tokens)
+                filename = next(tokens)
+            record.add_stat(filename, parse_count(insertions), parse_count(deletions))
+    if record is not None:
+        yield record
+
+
+# `git log -p` records with hunks and without context lines, read line by line. Each header is
+# '<RS><sha> <parents>', followed by the raw entries and then the patches of the commit
+PATCH_FORMAT = '%x1e%H %P'
+PATCH_OPTIONS = ['--raw', '-p', '--unified=0', '--no-abbrev', '--no-color', '--diff-merges=first-parent',
+                 '--find-renames']
+
+NULL_PATH = '/dev/null'
+
+
+class GitFilePatch(object):
+
+    """The change of one file in a commit, hunks are (old_start, old_count, new_start, new_count) tuples"""
+    def __init__(self, path, change_type, blob, source=None):
+        self.path = path
+        self.change_type = change_type
+        self.blob = blob
+        self.source = source
+        self.hunks = []
+
+
+class GitPatchRecord(object):
+
+    """A commit read from the git log patch stream"""
+    def __init__(self, hexsha, parents):
+        self.hexsha = hexsha
+        self.parents = parents
+        self.changes = dict()
+
+    def __str__(self):
+        return self.hexsha
+
+    def keep_files(self, analyzed):
+        """drop the changes of the files not analyzed"""
+        self.changes = {path: change for (path, change) in self.changes.items() if analyzed(path)}
+
+
+def unquote_path(path):
+    """undo the C style quoting git applies to unusual paths"""
+    if len(path) > 1 and path.startswith('"') and path.endswith('"'):
+        raw = path[1:-1].encode('latin-1', errors='backslashreplace')
+        return codecs.escape_decode(raw)[0].decode('utf-8', errors='replace')
+    return path
+
+
+def parse_hunk_header(line):
+    # '@@ -<old start>[,<old count>] +<new start>[,<new count>] @@ ...'
+    old_range, new_range = line.split(' ', 3)[1:3]
+    old_start, _, old_count = old_range[1:].partition(',')
+    new_start, _, new_count = new_range[1:].partition(',')
+    return (int(old_start), int(old_count) if old_count else 1,
+            int(new_start), int(new_count) if new_count else 1)
+
+
+def parse_raw_entry(line):
+    # ':<mode> <mode> <sha> <sha> <status>\t<path>[\t<path>]'
+    info, *paths = line.rstrip('\n').split('\t')
+    fields = info.split()
+    change_type = fields[4][0]
+    paths = [unquote_path(p) for p in paths]
+    source = paths[0] if len(paths) > 1 else None
+    return GitFilePatch(paths[-1], change_type, fields[3], source)
+
+
+def parse_patch_log(stream):
+    """parse the output of `git log` run with PATCH_FORMAT and PATCH_OPTIONS, yield GitPatchRecord objects"""
+    record = None
+    patch = None
+    pending_lines = 0
+    for raw_line in stream:
+        if pending_lines > 0:
+            # hunk content, its size is known from the hunk header so it is never parsed
+            if not raw_line.startswith(b'\\'):
+                pending_lines -= 1
+            continue
+        line = raw_line.decode('utf-8', errors='replace').rstrip('\n')
+        if line.startswith(HEADER_MARK):
+            if record is not None:
+                yield record
+            fields = line[1:].split()
+            record = GitPatchRecord(fields[0], fields[1:])
+            patch = None
+        elif record is None:
+            continue
+        elif line.startswith(':'):
+            change = parse_raw_entry(line)
+            record.changes[change.path] = change
+        elif line.startswith('diff '):
+            patch = None
+        elif line.startswith('+++ '):
+            path = unquote_path(line[4:].rstrip('\t'))
+            if path != NULL_PATH:
+                patch = record.changes.get(path[2:])
+        elif line.startswith('@@ ') and patch is not None:
+            hunk = parse_hunk_header(line)
+            patch.hunks.append(hunk)
+            pending_lines = hunk[1] + hunk[3]
+        elif line.startswith('@@ '):
+            hunk = parse_hunk_header(line)
+            pending_lines = hunk[1] + hunk[3]
+    if record is not None:
+        yield record
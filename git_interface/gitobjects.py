@@ -1,5 +1,10 @@
-from git import Repo, GitCommandError, CheckoutError
+from git import Repo, GitCommandError
+import fcntl
 import logging
+import os
+
+from git_interface.gitlog import parse_log, parse_patch_log, parse_hunk_header, parse_count, LOG_FORMAT, LOG_OPTIONS, \
+    PATCH_FORMAT, PATCH_OPTIONS
 
 
 logger = logging.getLogger(__name__)
@@ -7,26 +12,150 @@ logger = logging.getLogger(__name__)
 
 class GitRepository(object):
 
-    """The local repository"""
-    def __init__(self, base_dir: str):
+    """The local repository, path_filter(path) leaves the files it rejects out of logs and trees"""
+    def __init__(self, base_dir: str, path_filter=None):
         self.git_repo = Repo(base_dir)
+        self.path_filter = path_filter
+
+    def fetch(self):
+        # a clone shared by repositories of many owners is fetched by one of them at a time
+        with open(os.path.join(self.git_repo.git_dir, 'codice-fetch.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.git_repo.git.fetch('--prune', 'origin')
+
+    def resolve_branch(self, branch_name):
+        """:return the ref of the fetched remote branch, or of the local one, None if the branch doesn't exist"""
+        for ref in ('origin/{}'.format(branch_name), branch_name):
+            try:
+                self.git_repo.git.rev_parse('--verify', '--quiet', '{}^{{commit}}'.format(ref))
+                return ref
+            except GitCommandError:
+                continue
+        return None
+
+    def head_commit(self, rev='HEAD'):
+        return self.git_repo.commit(rev).hexsha
+
+    def read_file(self, rev, path):
+        """:return the content of a file in a revision as bytes"""
+        return self.git_repo.git.show('{}:{}'.format(rev, path), stdout_as_string=False)
 
-    def checkout(self, branch_name):
+    def read_attributes(self, rev):
+        """:return the content of the .gitattributes at the root of a revision, empty if there is none"""
         try:
-            self.git_repo.git.checkout(branch_name)
-            return True
+            return self.git_repo.git.show('{}:.gitattributes'.format(rev))
+        except GitCommandError:
+            return ''
+
+    def is_ancestor(self, ancestor_rev, rev):
+        try:
+            return self.git_repo.is_ancestor(ancestor_rev, rev)
         except GitCommandError:
-            return False
-        except CheckoutError:
             return False
 
-    def get_commits(self, branch):
-        return self.git_repo.iter_commits(branch)
+    def log(self, branch, skip=0, max_count=None, numstat=True, since=None):
+        """stream the history of a branch as GitCommitRecord objects using a single git process
 
-    def blame(self, rev, filename):
+        skip and max_count select a contiguous range of the history, since limits it to the commits after a date,
+        without numstat the file changes have no lines
+        """
+        options = [option for option in LOG_OPTIONS if numstat or option != '--numstat']
+        if since is not None:
+            options.append('--since={}'.format(since))
+        if skip:
+            options.append('--skip={}'.format(skip))
+        if max_count is not None:
+            options.append('--max-count={}'.format(max_count))
+        process = self.git_repo.git.log(branch, '--format={}'.format(LOG_FORMAT), *options, '--',
+                                        as_process=True)
+        finished = False
         try:
-            return self.git_repo.blame(rev, filename, incremental=False)
-        except GitCommandError:
-            return None
-        except KeyError:
-            return None
\ No newline at end of file
+            for record in parse_log(process.proc.stdout):
+                if self.path_filter is not None:
+                    record.keep_files(self.path_filter)
+                yield record
+            finished = True
+        finally:
+            self.end_process(process, finished)
+
+    def log_patches(self, *revs):
+        """stream the history of revs, parents first, as GitPatchRecord objects with the hunks of every file
+
+        revs are given to git log, so '^<rev>' leaves out the history of rev
+        """
+        process = self.git_repo.git(c='core.quotepath=off').log(
+            *revs, '--reverse', '--topo-order', '--format={}'.format(PATCH_FORMAT), *PATCH_OPTIONS, '--',
+            as_process=True)
+        finished = False
+        try:
+            for record in parse_patch_log(process.proc.stdout):
+                if self.path_filter is not None:
+                    record.keep_files(self.path_filter)
+                yield record
+            finished = True
+        finally:
+            self.end_process(process, finished)
+
+    @staticmethod
+    def end_process(process, finished):
+        """close the output of a git process, its exit status is checked only if its output was read to the end,
+        a process closed early is killed"""
+        process.proc.stdout.close()
+        if finished:
+            process.wait()
+        else:
+            process.proc.kill()
+            process.proc.wait()
+
+    def diff_hunks(self, rev_a, rev_b, path):
+        """:return the hunks of a file between two revisions, without context lines"""
+        output = self.git_repo.git.diff(rev_a, rev_b, '--unified=0', '--no-color', '--', path)
+        return [parse_hunk_header(line) for line in output.splitlines() if line.startswith('@@ ')]
+
+    def tree_blobs(self, rev='HEAD'):
+        """:return a dict with the blob sha of every regular file in the tree of rev"""
+        blobs = dict()
+        for entry in self.git_repo.git.ls_tree('-r', '-z', '--full-tree', rev).split('\0'):
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            mode, kind, sha = info.split()
+            # symbolic links and submodules have no content of their own
+            if kind == 'blob' and mode != '120000' and (self.path_filter is None or self.path_filter(path)):
+                blobs[path] = sha
+        return blobs
+
+    def count_commits(self, rev='HEAD', since=None):
+        options = ['--since={}'.format(since)] if since is not None else []
+        return int(self.git_repo.git.rev_list('--count', *options, rev))
+
+    def rev_parents(self, rev, max_count=None, since=None):
+        """:return a dict with the parents of every commit of rev, with the commits selected as git log does"""
+        options = []
+        if since is not None:
+            options.append('--since={}'.format(since))
+        if max_count is not None:
+            options.append('--max-count={}'.format(max_count))
+        parents = dict()
+        for line in self.git_repo.git.rev_list('--parents', *options, rev).splitlines():
+            hexsha, *commit_parents = line.split()
+            parents[hexsha] = commit_parents
+        return parents
+
+    def tree_lines(self, rev):
+        """:return a dict with the (sha, lines) of every entry in the tree of rev, lines as counted by git diff,
+        so binary files have none"""
+        lines = dict()
+        empty_tree = self.git_repo.git.hash_object('-t', 'tree', '/dev/null')
+        for entry in self.git_repo.git.diff('--numstat', '-z', '--no-renames', empty_tree, rev).split('\0'):
+            if entry:
+                insertions, deletions, path = entry.split('\t', 2)
+                lines[path] = parse_count(insertions)
+        result = dict()
+        for entry in self.git_repo.git.ls_tree('-r', '-z', '--full-tree', rev).split('\0'):
+            if not entry:
+                continue
+            info, path = entry.split('\t', 1)
+            if path in lines and (self.path_filter is None or self.path_filter(path)):
+                result[path] = (info.split()[2], lines[path])
+        return result
\ No newline at end of file
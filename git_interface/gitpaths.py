@@ -0,0 +1,92 @@
+import re
+
+# attributes of .gitattributes that leave a path out of the analysis, as in github linguist
+EXCLUDING_ATTRIBUTES = ('linguist-vendored', 'linguist-generated')
+
+
+def glob_to_regex(pattern):
+    """the regular expression of a gitignore like glob
+
+    a pattern without '/' matches a name at any depth, '**' matches any number of directories
+    and a pattern matching a directory matches everything inside it
+    """
+    anchored = '/' in pattern.rstrip('/')
+    pattern = pattern.strip('/')
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            chars = pattern[i + 1:end]
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            regex += '[{}]'.format(chars.replace('\\', '\\\\'))
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return ('' if anchored else '(?:.*/)?') + regex + '(?:/.*)?'
+
+
+def compile_globs(patterns):
+    """:return one regular expression matching any of the patterns, None if there are none"""
+    if not patterns:
+        return None
+    return re.compile('|'.join('(?:{})'.format(glob_to_regex(pattern)) for pattern in patterns))
+
+
+def parse_attributes(text):
+    """:return the (pattern, excluded) rules of the linguist attributes in the content of a .gitattributes"""
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        pattern, *attributes = line.split()
+        for attribute in attributes:
+            name, _, value = attribute.lstrip('-!').partition('=')
+            if name in EXCLUDING_ATTRIBUTES:
+                rules.append((pattern, not attribute.startswith(('-', '!')) and value not in ('false', '0')))
+    return rules
+
+
+class PathFilter(object):
+
+    """Decide which paths of a repository are analyzed
+
+    a path is analyzed when it matches an include glob, or there are none, it matches no exclude glob
+    and it isn't vendored or generated. As in git, the last line of .gitattributes matching a path wins
+    """
+    def __init__(self, include=(), exclude=(), attributes=''):
+        self.include = compile_globs(include)
+        self.exclude = compile_globs(exclude)
+        self.attributes = [(re.compile(glob_to_regex(pattern)), excluded)
+                           for (pattern, excluded) in reversed(parse_attributes(attributes))]
+        self.cache = dict()
+
+    def __call__(self, path):
+        if path not in self.cache:
+            self.cache[path] = self.analyzed(path)
+        return self.cache[path]
+
+    def analyzed(self, path):
+        if self.include is not None and not self.include.fullmatch(path):
+            return False
+        if self.exclude is not None and self.exclude.fullmatch(path):
+            return False
+        for (regex, excluded) in self.attributes:
+            if regex.fullmatch(path):
+                return not excluded
+        return True
@@ -1,5 +1,9 @@
+import re
 from urllib.parse import urlparse, urlunparse
 
+# scp like syntax of ssh urls, '[user@]host:path'
+SCP_URL = re.compile(r'^(?:[^@/]+@)?([^:/]+):(?!//)(.*)$')
+
 
 def build_repo_url(url: str, username, password):
     """add credentials to url if url is http"""
@@ -14,3 +18,24 @@ def build_repo_url(url: str, username, password):
         return str(urlunparse((u.scheme, netloc, u.path, u.params, u.query, u.fragment)))
     else:
         return url
+
+
+def normalize_repo_url(url: str):
+    """the host and path of a git url, without scheme, user, .git suffix or trailing slashes
+
+    'git@github.com:lnds/codice.git' and 'https://github.com/lnds/codice/' are both 'github.com/lnds/codice'
+    """
+    url = url.strip()
+    scp = SCP_URL.match(url) if '://' not in url else None
+    if scp:
+        host, path = scp.group(1), scp.group(2)
+    else:
+        u = urlparse(url)
+        host = u.hostname or ''
+        if u.port:
+            host = '{}:{}'.format(host, u.port)
+        path = u.path
+    path = path.strip('/')
+    if path.endswith('.git'):
+        path = path[:-len('.git')]
+    return '{}/{}'.format(host.lower(), path) if host else path
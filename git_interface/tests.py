@@ -0,0 +1,246 @@
+import io
+import os
+import re
+import subprocess
+import tempfile
+
+from django.test import SimpleTestCase
+
+from git_interface.gitlog import parse_hunk_header, parse_log, parse_patch_log, unquote_path
+from git_interface.gitobjects import GitRepository
+from git_interface.gitpaths import glob_to_regex, parse_attributes, PathFilter
+
+
+class FixtureRepository(object):
+
+    """A git repository in a temporary directory, commits get increasing dates so their order is stable"""
+    def __init__(self):
+        self.directory = tempfile.TemporaryDirectory(prefix='codice-test')
+        self.path = self.directory.name
+        self.commits = 0
+        self.git('init', '-q', '-b', 'master')
+
+    def git(self, *args):
+        date = '2020-01-01T00:00:{:02d}+00:00'.format(self.commits)
+        env = dict(os.environ, GIT_AUTHOR_DATE=date, GIT_COMMITTER_DATE=date, GIT_CONFIG_NOSYSTEM='1',
+                   HOME=self.path)
+        return subprocess.run(['git', '-c', 'user.name=tester', '-c', 'user.email=tester@codice',
+                               '-c', 'commit.gpgsign=false', *args],
+                              cwd=self.path, env=env, check=True, capture_output=True).stdout.decode('utf-8')
+
+    def write(self, path, content):
+        full_path = os.path.join(self.path, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as file:
+            file.write(content.encode('utf-8') if isinstance(content, str) else content)
+
+    def commit(self, message, author='tester', files=None, removed=()):
+        """commit the files, a dict of path and content, and the removed paths, :return the hexsha"""
+        for (path, content) in (files or {}).items():
+            self.write(path, content)
+        for path in removed:
+            self.git('rm', '-q', path)
+        self.git('add', '-A')
+        self.git('commit', '-q', '--allow-empty', '-m', message, '--author', '{0} <{0}@codice>'.format(author))
+        self.commits += 1
+        return self.head()
+
+    def head(self):
+        return self.git('rev-parse', 'HEAD').strip()
+
+    def close(self):
+        self.directory.cleanup()
+
+
+class ParseTest(SimpleTestCase):
+
+    def test_hunk_header_counts_default_to_one(self):
+        self.assertEqual(parse_hunk_header('@@ -3 +3,2 @@ def f():'), (3, 1, 3, 2))
+        self.assertEqual(parse_hunk_header('@@ -0,0 +1,4 @@'), (0, 0, 1, 4))
+        self.assertEqual(parse_hunk_header('@@ -5,2 +4,0 @@'), (5, 2, 4, 0))
+
+    def test_unquote_path(self):
+        self.assertEqual(unquote_path('plain.txt'), 'plain.txt')
+        self.assertEqual(unquote_path('"tab\\there.txt"'), 'tab\there.txt')
+        self.assertEqual(unquote_path('"\\303\\261and\\303\\272.txt"'), 'ñandú.txt')
+
+    def test_parse_log_stream(self):
+        stream = io.BytesIO(
+            b'\x1eaaa\x1fppp\x1fAna\x1fana@codice\x1f2020-01-01T00:00:00+00:00\x1ffirst line\n\nbody\n\0'
+            b'\n:100644 100644 111 222 M\0src/a.py\0:000000 100644 000 333 A\0bin.dat\0'
+            b'3\t1\tsrc/a.py\0-\t-\tbin.dat\0'
+            b'\x1ebbb\x1faaa\x1fBob\x1fbob@codice\x1f2020-01-02T00:00:00+00:00\x1fmove\n\0'
+            b'\n:100644 100644 222 222 R100\0src/a.py\0src/b.py\0'
+            b'0\t0\t\0src/a.py\0src/b.py\0')
+        (first, second) = list(parse_log(stream))
+        self.assertEqual((first.hexsha, first.parents, first.author_name, first.author_email),
+                         ('aaa', ['ppp'], 'Ana', 'ana@codice'))
+        self.assertEqual(first.message, 'first line\n\nbody\n')
+        self.assertEqual(first.files['src/a.py'], {'insertions': 3, 'deletions': 1, 'lines': 4, 'change_type': 'M'})
+        self.assertEqual(first.files['bin.dat'], {'insertions': 0, 'deletions': 0, 'lines': 0, 'change_type': 'A'})
+        self.assertEqual(first.total, {'insertions': 3, 'deletions': 1, 'lines': 4, 'files': 2})
+        self.assertEqual(second.parents, ['aaa'])
+        self.assertEqual(list(second.files.keys()), ['src/b.py'])
+        self.assertEqual(second.files['src/b.py']['change_type'], 'R')
+        self.assertEqual(second.renamed_from, {'src/b.py': 'src/a.py'})
+
+    def test_parse_patch_log_stream(self):
+        stream = io.BytesIO(
+            b'\x1eaaa ppp\n'
+            b'\n'
+            b':100644 100644 111 222 M\tsrc/a.py\n'
+            b':100644 000000 333 000 D\told.py\n'
+            b'\n'
+            b'diff --git a/src/a.py b/src/a.py\n'
+            b'--- a/src/a.py\n'
+            b'+++ b/src/a.py\n'
+            b'@@ -0,0 +1,2 @@\n'
+            b'+@@ -1 +1 @@ looks like a header\n'
+            b'+--- and like a path\n'
+            b'@@ -4 +5,0 @@\n'
+            b'-x\n'
+            b'\\ No newline at end of file\n'
+            b'diff --git a/old.py b/old.py\n'
+            b'--- a/old.py\n'
+            b'+++ /dev/null\n'
+            b'@@ -1 +0,0 @@\n'
+            b'-y\n'
+            b'\x1ebbb aaa ccc\n')
+        (first, second) = list(parse_patch_log(stream))
+        self.assertEqual((first.hexsha, first.parents), ('aaa', ['ppp']))
+        self.assertEqual(first.changes['src/a.py'].hunks, [(0, 0, 1, 2), (4, 1, 5, 0)])
+        self.assertEqual(first.changes['src/a.py'].blob, '222')
+        self.assertEqual(first.changes['old.py'].change_type, 'D')
+        self.assertEqual(first.changes['old.py'].hunks, [])
+        self.assertEqual((second.hexsha, second.parents, second.changes), ('bbb', ['aaa', 'ccc'], {}))
+
+
+class PathRulesTest(SimpleTestCase):
+
+    def matches(self, pattern, path):
+        return re.fullmatch(glob_to_regex(pattern), path) is not None
+
+    def test_name_matches_at_any_depth(self):
+        self.assertTrue(self.matches('*.min.js', 'app.min.js'))
+        self.assertTrue(self.matches('*.min.js', 'static/js/app.min.js'))
+        self.assertFalse(self.matches('*.min.js', 'app.js'))
+        self.assertTrue(self.matches('node_modules', 'web/node_modules/lib/index.js'))
+
+    def test_pattern_with_a_slash_is_anchored(self):
+        self.assertTrue(self.matches('docs/*.md', 'docs/index.md'))
+        self.assertFalse(self.matches('docs/*.md', 'src/docs/index.md'))
+        self.assertFalse(self.matches('docs/*.md', 'docs/api/index.md'))
+        self.assertTrue(self.matches('/build/', 'build/out.o'))
+
+    def test_double_star(self):
+        self.assertTrue(self.matches('src/**/test_*.py', 'src/test_a.py'))
+        self.assertTrue(self.matches('src/**/test_*.py', 'src/a/b/test_a.py'))
+        self.assertTrue(self.matches('vendor/**', 'vendor/a/b.c'))
+        self.assertFalse(self.matches('vendor/**', 'src/vendor.c'))
+
+    def test_character_classes(self):
+        self.assertTrue(self.matches('file?.[ch]', 'file1.c'))
+        self.assertFalse(self.matches('file?.[ch]', 'file1.o'))
+        self.assertTrue(self.matches('[!a]*.txt', 'b.txt'))
+        self.assertFalse(self.matches('[!a]*.txt', 'a.txt'))
+        self.assertTrue(self.matches('a+b(1).txt', 'a+b(1).txt'))
+
+    def test_parse_attributes(self):
+        text = '# comment\n\nvendor/** linguist-vendored\n*.pb.go linguist-generated=true text\n' \
+               'vendor/ours/** -linguist-vendored\nlib/** linguist-vendored=false\n*.c text eol=lf\n'
+        self.assertEqual(parse_attributes(text), [('vendor/**', True), ('*.pb.go', True),
+                                                  ('vendor/ours/**', False), ('lib/**', False)])
+
+    def test_path_filter(self):
+        path_filter = PathFilter(include=['src/**', '*.md'], exclude=['*_test.go', 'src/generated'],
+                                 attributes='src/third_party/** linguist-vendored\n'
+                                            'src/third_party/ours/** -linguist-vendored\n')
+        self.assertTrue(path_filter('src/main.go'))
+        self.assertTrue(path_filter('README.md'))
+        self.assertFalse(path_filter('build.sh'))
+        self.assertFalse(path_filter('src/main_test.go'))
+        self.assertFalse(path_filter('src/generated/api.go'))
+        self.assertFalse(path_filter('src/third_party/lib.go'))
+        # the last matching line of .gitattributes wins
+        self.assertTrue(path_filter('src/third_party/ours/lib.go'))
+
+    def test_without_rules_every_path_is_analyzed(self):
+        self.assertTrue(PathFilter()('any/path.py'))
+
+
+class GitRepositoryTest(SimpleTestCase):
+
+    def setUp(self):
+        self.fixture = FixtureRepository()
+        self.first = self.fixture.commit('add', 'ana', {'a.txt': 'one\ntwo\nthree\n', 'dir/b b.txt': 'b\n',
+                                                        'ñ.txt': 'ñ\n', 'bin.dat': b'\0\1\2'})
+        self.second = self.fixture.commit('change', 'bob', {'a.txt': 'zero\none\nthree\nfour'})
+        self.fixture.git('mv', 'dir/b b.txt', 'dir/c.txt')
+        self.third = self.fixture.commit('move and remove', 'ana', removed=['bin.dat'])
+        self.repo = GitRepository(self.fixture.path)
+
+    def tearDown(self):
+        self.fixture.close()
+
+    def test_log(self):
+        (third, second, first) = list(self.repo.log('master'))
+        self.assertEqual([c.hexsha for c in (first, second, third)], [self.first, self.second, self.third])
+        self.assertEqual(first.author_email, 'ana@codice')
+        self.assertEqual(set(first.files.keys()), {'a.txt', 'dir/b b.txt', 'ñ.txt', 'bin.dat'})
+        self.assertEqual(first.files['bin.dat']['lines'], 0)
+        self.assertEqual(second.files['a.txt'], {'insertions': 2, 'deletions': 1, 'lines': 3, 'change_type': 'M'})
+        self.assertEqual(third.renamed_from, {'dir/c.txt': 'dir/b b.txt'})
+        self.assertEqual(third.files['bin.dat']['change_type'], 'D')
+
+    def test_log_leaves_out_vendored_files(self):
+        self.fixture.commit('vendor', 'ana', {'.gitattributes': 'vendor/** linguist-vendored\n',
+                                              'vendor/lib.js': 'x\n', 'app.js': 'y\n'})
+        self.repo.path_filter = PathFilter(exclude=['*.dat'], attributes=self.repo.read_attributes('master'))
+        (last, *older) = list(self.repo.log('master'))
+        self.assertEqual(set(last.files.keys()), {'.gitattributes', 'app.js'})
+        self.assertNotIn('bin.dat', older[-1].files)
+        self.assertEqual(set(self.repo.tree_lines('master').keys()),
+                         {'.gitattributes', 'app.js', 'a.txt', 'dir/c.txt', 'ñ.txt'})
+
+    def test_log_closed_early(self):
+        for i in range(50):
+            self.fixture.commit('change {}'.format(i), 'eva', {'a.txt': 'line\n' * (i + 1) * 100})
+        history = self.repo.log('master')
+        self.assertEqual(next(history).author_email, 'eva@codice')
+        history.close()
+        patches = self.repo.log_patches('master')
+        next(patches)
+        patches.close()
+
+    def test_log_range_and_filter(self):
+        self.assertEqual([c.hexsha for c in self.repo.log('master', skip=1, max_count=1)], [self.second])
+        self.repo.path_filter = lambda path: path != 'a.txt'
+        self.assertEqual([set(c.files.keys()) for c in self.repo.log('master', max_count=2)],
+                         [{'dir/c.txt', 'bin.dat'}, set()])
+
+    def test_log_patches(self):
+        (first, second, third) = list(self.repo.log_patches('master'))
+        self.assertEqual(first.changes['a.txt'].hunks, [(0, 0, 1, 3)])
+        self.assertEqual(first.changes['ñ.txt'].hunks, [(0, 0, 1, 1)])
+        self.assertEqual(first.changes['dir/b b.txt'].hunks, [(0, 0, 1, 1)])
+        self.assertEqual(first.changes['bin.dat'].hunks, [])
+        self.assertEqual(second.changes['a.txt'].hunks, [(0, 0, 1, 1), (2, 1, 2, 0), (3, 0, 4, 1)])
+        self.assertEqual(second.parents, [self.first])
+        moved = third.changes['dir/c.txt']
+        self.assertEqual((moved.change_type, moved.source, moved.hunks), ('R', 'dir/b b.txt', []))
+        self.assertEqual(third.changes['bin.dat'].change_type, 'D')
+
+    def test_log_patches_leaving_out_a_history(self):
+        self.assertEqual([c.hexsha for c in self.repo.log_patches('master', '^' + self.first)],
+                         [self.second, self.third])
+
+    def test_rev_parents(self):
+        self.assertEqual(self.repo.rev_parents('master'),
+                         {self.first: [], self.second: [self.first], self.third: [self.second]})
+        self.assertEqual(self.repo.rev_parents('master', max_count=1), {self.third: [self.second]})
+
+    def test_tree_lines(self):
+        tree = self.repo.tree_lines(self.second)
+        self.assertEqual({path: lines for (path, (blob, lines)) in tree.items()},
+                         {'a.txt': 4, 'dir/b b.txt': 1, 'ñ.txt': 1, 'bin.dat': 0})
+        self.assertEqual(tree['a.txt'][0], self.fixture.git('rev-parse', self.second + ':a.txt').strip())
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repos', '0005_auto_20200315_1919'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='last_commit',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from git_interface.giturls import normalize_repo_url
+
+
+def normalize_urls(apps, schema_editor):
+    Repository = apps.get_model('repos', 'Repository')
+    for repo in Repository.objects.all():
+        repo.normalized_url = normalize_repo_url(repo.url)
+        repo.save(update_fields=['normalized_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repos', '0006_branch_last_commit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='repository',
+            name='analysis_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='followers', to='repos.repository'),
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='normalized_url',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=200),
+        ),
+        migrations.RunPython(normalize_urls, migrations.RunPython.noop),
+    ]
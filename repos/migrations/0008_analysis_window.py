@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repos', '0007_analysis_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='window',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='window_start',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='analysis_max_commits',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='analysis_since',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
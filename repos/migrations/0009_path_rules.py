@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-18 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repos', '0008_analysis_window'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='path_rules',
+            field=models.CharField(blank=True, default='', max_length=1100),
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='exclude_paths',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='repository',
+            name='include_paths',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
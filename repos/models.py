@@ -1,9 +1,12 @@
+from urllib.parse import urlparse
+
 from django.core.validators import RegexValidator
 from django.db import models
 from django.db.models import Count, ExpressionWrapper, fields, Sum, Min, Max, F, OuterRef
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from codice import settings
+from git_interface.giturls import normalize_repo_url
 from tools.models import SQCount
 
 
@@ -28,9 +31,19 @@ class Repository(models.Model):
     password = models.CharField(max_length=200, blank=True)
     public = models.BooleanField(default=False)
     base_directory = models.CharField(max_length=300, null=True)
+    # only the commits since analysis_since and the last analysis_max_commits are analyzed, 0 for no limit
+    analysis_since = models.DateField(null=True, blank=True)
+    analysis_max_commits = models.PositiveIntegerField(default=0)
+    # globs of the paths analyzed and of those left out, besides the vendored and generated ones in .gitattributes
+    include_paths = models.CharField(max_length=500, blank=True, default='')
+    exclude_paths = models.CharField(max_length=500, blank=True, default='')
 
     status = models.IntegerField(choices=Status.choices)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # repositories without credentials and the same normalized url share the clone and analysis of their source
+    normalized_url = models.CharField(max_length=200, blank=True, default='', db_index=True)
+    analysis_source = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='followers')
 
     class Meta:
         db_table = 'codice_repository'
@@ -39,6 +52,10 @@ class Repository(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.normalized_url = normalize_repo_url(self.url)
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('repository-detail', kwargs={'pk': self.pk})
 
@@ -61,15 +78,15 @@ class Repository(models.Model):
         return result[self.status]
 
     def commits_count(self):
-        return self.commit_set.filter(branch=self.get_default_branch()).count()
+        return self.commit_set.filter(branches=self.get_default_branch()).count()
 
     def devs_count(self):
-        result = self.commit_set.filter(branch=self.get_default_branch()) \
+        result = self.commit_set.filter(branches=self.get_default_branch()) \
             .aggregate(devs=Count('author__id', distinct=True))
         return result['devs']
 
     def devs_count_of_branch(self, branch):
-        result = self.commit_set.filter(branch=branch) \
+        result = self.commit_set.filter(branches=branch) \
             .aggregate(devs=Count('author__id', distinct=True))
         return result['devs']
 
@@ -79,6 +96,53 @@ class Repository(models.Model):
     def branches_count(self):
         return self.branch_set.count()
 
+    def get_branches_to_track(self):
+        branches = self.branches_to_track.strip()
+        if branches == '':
+            return [self.default_branch if self.default_branch else 'master']
+        return branches.replace(';', ',').replace(' ', ',').split(',')
+
+    def get_analysis_window(self):
+        """a label of the part of the history analyzed, empty for the whole history"""
+        window = []
+        if self.analysis_since:
+            window.append('since {}'.format(self.analysis_since.isoformat()))
+        if self.analysis_max_commits:
+            window.append('last {} commits'.format(self.analysis_max_commits))
+        return ', '.join(window)
+
+    def get_include_paths(self):
+        return [glob for glob in self.include_paths.replace(';', ',').replace(' ', ',').split(',') if glob]
+
+    def get_exclude_paths(self):
+        return [glob for glob in self.exclude_paths.replace(';', ',').replace(' ', ',').split(',') if glob]
+
+    def get_path_rules(self):
+        """a label of the include and exclude globs, empty if every path is analyzed"""
+        rules = []
+        if self.get_include_paths():
+            rules.append('include {}'.format(', '.join(self.get_include_paths())))
+        if self.get_exclude_paths():
+            rules.append('exclude {}'.format(', '.join(self.get_exclude_paths())))
+        return '; '.join(rules)
+
+    def has_credentials(self):
+        """True if the repository is cloned with a username or password, its own or one in the url"""
+        url = urlparse(self.url)
+        return bool(self.username or self.password or url.username or url.password)
+
+    def hand_over_followers(self):
+        """before deleting an analysis source, make its first follower the source of the others
+
+        :return True if the clone of the repository is still used by a follower
+        """
+        followers = list(self.followers.order_by('id').values_list('id', flat=True))
+        if not followers:
+            return False
+        Repository.objects.filter(id=followers[0]).update(analysis_source=None)
+        Repository.objects.filter(id__in=followers[1:]).update(analysis_source_id=followers[0])
+        return True
+
     def get_default_branch(self):
 
         if self.default_branch > '':
@@ -106,7 +170,7 @@ class Repository(models.Model):
             repository=self, branch=branch,
             commit__author=OuterRef("author")).order_by()
         file_changes_count = file_changes.annotate(changes=Count('*')).values('changes')
-        q = Commit.objects.filter(repository=self, branch=branch,
+        q = Commit.objects.filter(repository=self, branches=branch,
                                   author__is_alias_of__isnull=True, author__enabled=True,
                                   author__blame__repository=self, author__blame__branch=branch) \
             .values('author', 'author__name', 'author__email', 'author__blame__loc') \
@@ -126,6 +190,12 @@ class Repository(models.Model):
 class Branch(models.Model):
     name = models.CharField(max_length=200)
     repository = models.ForeignKey(Repository, on_delete=models.CASCADE)
+    last_commit = models.CharField(max_length=40, blank=True, default='')
+    # the analysis window of the last run and the date of the oldest commit analyzed, empty for the whole history
+    window = models.CharField(max_length=100, blank=True, default='')
+    window_start = models.DateTimeField(null=True, blank=True)
+    # the path rules of the last run
+    path_rules = models.CharField(max_length=1100, blank=True, default='')
 
     class Meta:
         db_table = 'codice_branch'
@@ -8,7 +8,7 @@ days = ['X', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', '
 
 
 def get_repos_week_punchcard(repos, branches):
-    stats = Commit.objects.filter(repository__in=repos, branch__in=branches)\
+    stats = Commit.objects.filter(repository__in=repos, branches__in=branches)\
         .annotate(wd=ExtractWeekDay('date'), h=ExtractHour('date'))\
         .values('wd', 'h').annotate(total=Count('id', distinct=True)).order_by('wd')
     result = dict()
@@ -56,7 +56,7 @@ def get_repos_hour_punchcard(repos):
 
 
 def get_dev_punchcard(dev, repos, branches):
-    stats = Commit.objects.filter(repository__in=repos, branch__in=branches, author=dev)\
+    stats = Commit.objects.filter(repository__in=repos, branches__in=branches, author=dev)\
         .annotate(wd=ExtractWeekDay('date'), h=ExtractHour('date'))\
         .values('wd', 'h').annotate(total=Count('id', distinct=True), ).order_by('wd')
     result = dict()
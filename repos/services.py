@@ -26,7 +26,7 @@ def get_lang_participation_for_repo(repo, branch):
 
 def get_developers_contribution(repo, branch):
     duration = ExpressionWrapper(F('max_date') - F('min_date'), output_field=fields.DurationField())
-    return Commit.objects.filter(repository=repo, branch=branch, author__blame__isnull=False,
+    return Commit.objects.filter(repository=repo, branches=branch, author__blame__isnull=False,
                                  author__is_alias_of__isnull=True, author__enabled=True)\
         .values('author', 'author__name', 'author__email')\
         .annotate(added=Sum('insertions'),
@@ -1,12 +1,15 @@
 import sys
 
-from celery import shared_task
+from celery import shared_task, chord
 from celery.utils.log import get_task_logger
+from django.conf import settings
 from git import GitCommandError
 
 from authentication.models import User
 from git_interface.giturls import build_repo_url
-from analytics.analyzer import process_repo_objects
+from analytics.analyzer import start_repo_analysis, analyze_repo_branch, partition_repo_branch, ingest_repo_range, \
+    merge_repo_branch
+from analytics.sharing import find_analysis_source, copy_repo_analysis
 from repos.models import Repository
 import git_interface.gitcmds as git
 
@@ -21,21 +24,31 @@ def clone_remote_repository(owner_id: int, repo_id: int):
         repo.status = Repository.Status.CLONING
         repo.save()
         logger.info("repo.url={}".format(repo.url))
+        source = find_analysis_source(repo)
+        if source is not None:
+            repo.analysis_source = source
+            repo.base_directory = source.base_directory
+            repo.status = Repository.Status.CLONED
+            repo.save()
+            share_analysis.delay(repo.id)
+            return "Repository {} shares the clone and analysis of {}".format(repo, source)
+
         repo_url = build_repo_url(repo.url, repo.username, repo.password)
         logger.info("repo_url: {}".format(repo_url))
 
-        path = git.clone_repository(owner.id, repo.name, repo_url)
+        mirror_key = repo.normalized_url if settings.CODICE_CLONE_MIRRORS else None
+        # clones without credentials can be shared, they never live in the directory of an owner
+        shared_key = repo.normalized_url if not repo.has_credentials() else None
+        path = git.clone_repository(owner.id, repo.name, repo_url, mirror_key, settings.CODICE_CLONE_FILTER,
+                                    shared_key)
 
         logger.info("repo cloned in {}".format(path))
         repo.base_directory = path
         repo.status = Repository.Status.CLONED
         repo.save()
 
-        process_repo_objects(repo)
-        repo.status = Repository.Status.OK
-        repo.save()
-
-        return "Repository {} cloned successfully".format(repo)
+        branch_names = queue_analysis(repo)
+        return "Repository {} cloned successfully, analyzing branches {}".format(repo, branch_names)
     except User.DoesNotExist:
         return "error cloning repository, user_id {} not found".format(owner_id)
     except Repository.DoesNotExist:
@@ -48,10 +61,118 @@ def clone_remote_repository(owner_id: int, repo_id: int):
 
 
 @shared_task
-def remove_local_repository(owner_id, repo_name):
+def update_remote_repository(repo_id: int):
+    try:
+        repo: Repository = Repository.objects.get(pk=repo_id)
+        if repo.status != Repository.Status.OK:
+            return "repository {} is not ready to update".format(repo)
+        if repo.analysis_source is not None:
+            return "repository {} is updated with {}".format(repo, repo.analysis_source)
+
+        branch_names = queue_analysis(repo, update=True)
+        return "Repository {} fetched, updating branches {}".format(repo, branch_names)
+    except Repository.DoesNotExist:
+        return "error updating repository, repository_id {} not found".format(repo_id)
+    except GitCommandError as cmd_err:
+        repo = Repository.objects.get(pk=repo_id)
+        repo.status = Repository.Status.ERROR
+        repo.save()
+        return "git error: {}".format(cmd_err)
+
+
+def queue_analysis(repo: Repository, update=False):
+    """analyze every branch in its own task, the repository is OK when all of them have finished"""
+    branch_names = start_repo_analysis(repo, fetch=update)
+    callback = finish_analysis.s(repo.id)
+    callback.link_error(fail_analysis.si(repo.id))
+    chord([analyze_branch.si(repo.id, branch_name, update) for branch_name in branch_names])(callback)
+    return branch_names
+
+
+@shared_task(bind=True)
+def analyze_branch(self, repo_id: int, branch_name: str, update=False):
+    repo: Repository = Repository.objects.get(pk=repo_id)
+    partitions = None if update else partition_repo_branch(repo, branch_name)
+    if partitions is None:
+        analyze_repo_branch(repo, branch_name, update)
+        return branch_name
+
+    # long histories are ingested by range in many workers, then merged
+    (head, ranges) = partitions
+    logger.info("branch {} of {} split in {} ranges".format(branch_name, repo, len(ranges)))
+    return self.replace(chord([ingest_range.si(repo_id, branch_name, head, skip, max_count)
+                               for (skip, max_count) in ranges],
+                              merge_branch.si(repo_id, branch_name, head)))
+
+
+@shared_task
+def ingest_range(repo_id: int, branch_name: str, head: str, skip: int, max_count: int):
+    repo: Repository = Repository.objects.get(pk=repo_id)
+    ingest_repo_range(repo, branch_name, head, skip, max_count)
+    return skip
+
+
+@shared_task
+def merge_branch(repo_id: int, branch_name: str, head: str):
+    repo: Repository = Repository.objects.get(pk=repo_id)
+    merge_repo_branch(repo, branch_name, head)
+    return branch_name
+
+
+@shared_task
+def finish_analysis(branch_names, repo_id: int):
+    repo: Repository = Repository.objects.get(pk=repo_id)
+    analyzed = set(repo.branch_set.filter(name__in=branch_names).exclude(last_commit='')
+                   .values_list('name', flat=True))
+    missing = [branch_name for branch_name in branch_names if branch_name not in analyzed]
+    for branch_name in missing:
+        logger.info("branch {} of {} not found".format(branch_name, repo))
+    repo.status = Repository.Status.OK
+    repo.save()
+    for follower_id in repo.followers.values_list('id', flat=True):
+        share_analysis.delay(follower_id)
+    return "Repository {} analyzed, {} of {} branches".format(repo, len(analyzed), len(branch_names))
+
+
+@shared_task
+def share_analysis(repo_id: int):
+    """analyze a repository from the analysis of the repository with the same url it follows"""
+    try:
+        repo: Repository = Repository.objects.get(pk=repo_id)
+        repo.status = Repository.Status.ANALYZING
+        repo.save()
+        copy_repo_analysis(repo)
+        repo.status = Repository.Status.OK
+        repo.save()
+        return "Repository {} analyzed with {}".format(repo, repo.analysis_source)
+    except Repository.DoesNotExist:
+        return "error sharing analysis, repository_id {} not found".format(repo_id)
+    except GitCommandError as cmd_err:
+        Repository.objects.filter(pk=repo_id).update(status=Repository.Status.ERROR)
+        return "git error: {}".format(cmd_err)
+
+
+@shared_task
+def fail_analysis(repo_id: int):
+    Repository.objects.filter(pk=repo_id).update(status=Repository.Status.ERROR)
+    return "error analyzing repository {}".format(repo_id)
+
+
+@shared_task
+def update_remote_repositories():
+    """queue an update of every analyzed repository, meant to be scheduled with celery beat"""
+    # followers are updated when their analysis source is
+    repo_ids = Repository.objects.filter(status=Repository.Status.OK, analysis_source=None).values_list('id', flat=True)
+    for repo_id in repo_ids:
+        update_remote_repository.delay(repo_id)
+    return "{} repositories queued for update".format(len(repo_ids))
+
+
+@shared_task
+def remove_local_repository(owner_id, repo_name, base_directory=None):
     try:
         logger.info('remove local repository')
-        git.remove_local_repository(owner_id, repo_name)
+        git.remove_local_repository(owner_id, repo_name, base_directory)
         return "Repository {} removed".format(repo_name)
     except:
         return "error removing local repository: {}".format(sys.exc_info()[0])
\ No newline at end of file
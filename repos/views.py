@@ -55,7 +55,8 @@ class RepositoryCreate(RepositoryMixin, CanAdminReposMixin, CreateView):
     """Add a new repo"""
     success_message = _('Repository was added successfully')
     template_name = 'repository/add.html'
-    fields = ['name', 'url', 'username', 'password', 'branches_to_track', 'default_branch', 'public']
+    fields = ['name', 'url', 'username', 'password', 'branches_to_track', 'default_branch', 'analysis_since',
+              'analysis_max_commits', 'include_paths', 'exclude_paths', 'public']
 
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
@@ -78,9 +79,9 @@ class RepositoryDetail(RepositoryMixin, CanSeeRepoMixin, DetailView):
 
         self.branch = self.object.find_branch(self.request.GET['filter'] if 'filter' in self.request.GET else None)
         context['branch'] = self.branch
-        commit_set = self.repo.commit_set.filter(branch=self.branch)
+        commit_set = self.repo.commit_set.filter(branches=self.branch)
 
-        context['file_changes_count'] = FileChange.objects.filter(commit__in=commit_set.all()).count()
+        context['file_changes_count'] = FileChange.objects.filter(repository=self.repo, branch=self.branch).count()
 
         qs = File.objects.filter(repository=self.repo, branch=self.branch, is_code=True, exists=True) \
             .aggregate(count=Count('id', distinct=True), loc=Sum('code'), avg=Avg('indent_complexity'))
@@ -122,9 +123,16 @@ class RepositoryDelete(RepositoryMixin, CanAdminReposMixin, DeleteView):
 
     def delete(self, request, *args, **kwargs):
         self.owner = request.user
+        # the clone of an analysis source is kept for its followers
+        shared = self.get_object().hand_over_followers()
         result = super(RepositoryDelete, self).delete(request, *args, **kwargs)
 
-        remove_local_repository.delay(self.object.owner.id, self.object.name)
+        # and the clones of the same url are kept for the other repositories using them
+        base_directory = self.object.base_directory
+        if base_directory and Repository.objects.filter(base_directory=base_directory).exists():
+            shared = True
+        if not shared:
+            remove_local_repository.delay(self.object.owner.id, self.object.name, base_directory)
         messages.success(self.request, self.success_message)
         return result
 
@@ -1,7 +1,21 @@
+import codecs
+
 import chardet
 
+# chardet only sees this prefix of the content, over a whole large file it is slower than the rest of the analysis
+SAMPLE_SIZE = 64 * 1024
+
 
-def detect_encoding(filename):
-    with open(filename, 'rb') as f:
-        result = chardet.detect(f.read())
-        return result['encoding']
+def detect_encoding_of(data):
+    """ascii and utf-8 are recognized without chardet, which guesses other encodings from a prefix of data"""
+    if not data:
+        return None
+    if data.isascii():
+        return 'ascii'
+    if data.startswith(codecs.BOM_UTF8):
+        return 'UTF-8-SIG'
+    try:
+        data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return chardet.detect(data[:SAMPLE_SIZE])['encoding']